@@ -62,15 +62,21 @@ TODO:
     - When should two bispecial extension type be equal? In graphs, we sometimes
       prefer when they are all different...
 """
-from collections import defaultdict, Counter
+from collections import defaultdict, Counter, namedtuple
 import itertools
+import operator
+import os
 from sage.misc.classcall_metaclass import ClasscallMetaclass
-from sage.misc.cachefunc import cached_method
+from sage.misc.cachefunc import cached_method, cached_function
 from sage.misc.table import table
 from sage.combinat.words.word import FiniteWord_class, Word
 from sage.combinat.words.morphism import WordMorphism
 from sage.graphs.digraph import DiGraph
 
+DepthStatistics = namedtuple('DepthStatistics',
+                             ['depth', 'size', 'information', 'multiplicity',
+                              'connected'])
+
 common_substitutions_dict = dict(
 ar1=WordMorphism({1:[1],      2:[2,1],   3:[3,1]}),
 ar2=WordMorphism({1:[1,2],   2:[2],     3:[3,2]}),
@@ -695,6 +701,97 @@ class ExtensionType(object):
             0
         """
         return self.cardinality() - self.left_valence() - self.right_valence() + 1
+
+    def n_components_fast(self, bipartite=True):
+        r"""
+        Return the number of connected components of the extension graph
+        computed with a union-find on the pairs, without building a graph.
+
+        INPUT:
+
+        - ``bipartite`` -- bool (default: ``True``), whether to consider
+          the bipartite graph on left and right extensions as
+          :meth:`extension_digraph` or the graph on letters as
+          :meth:`extension_graph`
+
+        EXAMPLES::
+
+            sage: from slabbe import ExtensionType1to1
+            sage: L = [(1,1), (1,2), (2,1), (3,3)]
+            sage: E = ExtensionType1to1(L, alphabet=(1,2,3))
+            sage: E.n_components_fast()
+            2
+            sage: E.n_components_fast(bipartite=False)
+            2
+            sage: E.extension_digraph().connected_components_number()
+            2
+
+        ::
+
+            sage: L = [(1,2), (2,1), (2,2)]
+            sage: E = ExtensionType1to1(L, alphabet=(1,2,3))
+            sage: E.n_components_fast()
+            1
+
+        ::
+
+            sage: from slabbe import ExtensionTypeLong
+            sage: L = [((2, 2), (1,)), ((2, 3), (1,)), ((2, 1), (2,)), ((1,
+            ....:    2), (1,)), ((1, 2), (2,)), ((1, 2), (3,)), ((3, 1), (2,))]
+            sage: E = ExtensionTypeLong(L, (1,2,3))
+            sage: E.n_components_fast()
+            1
+        """
+        parent = {}
+        def find(x):
+            root = x
+            while parent[root] != root:
+                root = parent[root]
+            while parent[x] != root:
+                parent[x], x = root, parent[x]
+            return root
+        n = 0
+        for a,b in self:
+            if bipartite:
+                u,v = (-1,a), (+1,b)
+            else:
+                u,v = a,b
+            for x in (u,v):
+                if x not in parent:
+                    parent[x] = x
+                    n += 1
+            ru = find(u)
+            rv = find(v)
+            if ru != rv:
+                parent[ru] = rv
+                n -= 1
+        return n
+
+    def is_connected_fast(self, bipartite=True):
+        r"""
+        Return whether the extension graph is connected, computed with a
+        union-find on the pairs.
+
+        INPUT:
+
+        - ``bipartite`` -- bool (default: ``True``), see
+          :meth:`n_components_fast`
+
+        EXAMPLES::
+
+            sage: from slabbe import ExtensionType1to1
+            sage: L = [(1,1), (1,2), (2,1), (3,3)]
+            sage: E = ExtensionType1to1(L, alphabet=(1,2,3))
+            sage: E.is_connected_fast()
+            False
+            sage: E.extension_graph().is_connected()
+            False
+            sage: L = [(1,3), (2,3), (3,1), (3,2), (3,3)]
+            sage: E = ExtensionType1to1(L, alphabet=(1,2,3))
+            sage: E.is_connected_fast()
+            True
+        """
+        return self.n_components_fast(bipartite=bipartite) <= 1
     def image(self, m):
         r"""
 
@@ -722,7 +819,7 @@ class ExtensionType(object):
         return L[0]
 
     def rec_enum_set_under_sadic(self, substitutions, substitutions_dict,
-            keep_equal_length=False, growth_limit=float('inf')):
+            keep_equal_length=False, growth_limit=float('inf'), roots=None):
         r"""
         Return the graded recursively enumerated set of all the extension type
         leading to those of age k generated by a finite sequence of
@@ -737,6 +834,10 @@ class ExtensionType(object):
           highest graded component.
         - ``growth_limit`` -- integer (default: ``float('inf')``), the
           maximal growth in length of the bispecial extended images
+        - ``roots`` -- list (default: ``None``), the nodes ``(E, factor,
+          history)`` to start from, where each history is a suffix of
+          ``substitutions`` of the same length; if None, the node of self
+          with empty history
 
         .. TODO::
 
@@ -803,6 +904,14 @@ class ExtensionType(object):
              (word: 22322322322322, 0),
              (word: 2322322322322322, 0),
              (word: 2322322322, 0)]
+
+        Starting from the nodes of a shorter sequence::
+
+            sage: R = E1.rec_enum_set_under_sadic([123]*6, S)
+            sage: roots = R.graded_component(6)
+            sage: R = E1.rec_enum_set_under_sadic([132]*2+[123]*6, S, roots=roots)
+            sage: [len(R.graded_component(i)) for i in range(3)]
+            [2, 2, 3]
         """
         def child(V):
             Y,w,history = V
@@ -815,20 +924,24 @@ class ExtensionType(object):
                 if keep_equal_length or not len(Y.factor()) == len(Z.factor()):
                     rep.append((Z,Z.factor(),(a,)+history))
             return rep
-        root = (self, self.factor(), tuple())
+        if roots is None:
+            roots = [(self, self.factor(), tuple())]
 
         from sage.sets.recursively_enumerated_set import RecursivelyEnumeratedSet
-        R = RecursivelyEnumeratedSet([root], child, structure='graded')
+        R = RecursivelyEnumeratedSet(roots, child, structure='graded')
         return R
 
     def rec_enum_set_under_sadic_joined(self, substitutions, 
             substitutions_dict, keep_equal_length=False, keep_unique=False,
-            growth_limit=float('inf'), filter_fn=None):
+            growth_limit=float('inf'), filter_fn=None, memo=None):
         r"""
         Return the recursively enumerated set of extension type generated
         by a language of substitutions where the extension type of the same
         age are joined.
 
+        The images of the extension types with the same canonical key are
+        computed only once, see :func:`apply_with_memo`.
+
         INPUT:
 
         - ``substitutions`` -- the sequence of substitutions
@@ -840,6 +953,8 @@ class ExtensionType(object):
         - ``growth_limit`` -- integer (default: ``float('inf')``), the
           maximal growth in length of the bispecial extended images
         - ``filter_fn`` -- function (default: ``None``)
+        - ``memo`` -- dict (default: ``None``), the images already
+          computed, if None, a new dict is used
 
         EXAMPLES::
 
@@ -863,7 +978,18 @@ class ExtensionType(object):
             sage: G = recursively_enumerated_set_to_digraph(R)
             sage: G
             Looped multi-digraph on 11 vertices
+
+        The images computed are stored in ``memo``::
+
+            sage: memo = {}
+            sage: R = E1.rec_enum_set_under_sadic_joined(seq, S, growth_limit=1, memo=memo)
+            sage: G == recursively_enumerated_set_to_digraph(R)
+            True
+            sage: len(memo) <= sum(len(ExtIN) for (ExtIN,h) in R)
+            True
         """
+        if memo is None:
+            memo = {}
         def child(V):
             ExtIN,history = V
             rep = []
@@ -873,8 +999,9 @@ class ExtensionType(object):
             if age >= len(substitutions):
                 return rep
             a = substitutions[-age-1]
+            m = substitutions_dict[a]
             ExtOUT = [Z for ext in ExtIN 
-                        for Z in ext.apply(substitutions_dict[a], growth_limit=growth_limit)
+                        for Z in apply_with_memo(ext, m, memo, growth_limit)
                         if keep_equal_length or not len(ext.factor())==len(Z.factor())]
             ExtOUT = remove_extension_types_subsets(ExtOUT)
             if keep_unique:
@@ -889,7 +1016,8 @@ class ExtensionType(object):
         return RecursivelyEnumeratedSet([root], child, structure='graded')
 
     def rec_enum_set_under_language(self, language, initial, substitutions_dict,
-            keep_empty=False, label='history', growth_limit=float('inf')):
+            keep_empty=False, label='history', growth_limit=float('inf'),
+            max_depth=float('inf')):
         r"""
         Return the recursively enumerated set of extension type generated
         by a language of substitutions.
@@ -906,6 +1034,10 @@ class ExtensionType(object):
           word or only the previous applied substitution
         - ``growth_limit`` -- integer (default: ``float('inf')``), the
           maximal growth in length of the bispecial extended images
+        - ``max_depth`` -- integer (default: ``float('inf')``), the nodes
+          at depth ``max_depth`` have no children; only for
+          ``label='history'``, use the ``max_depth`` argument of the
+          breadth first search iterator when ``label='previous'``
 
         EXAMPLES::
 
@@ -920,6 +1052,9 @@ class ExtensionType(object):
             sage: E = ExtensionType.from_factor(prefix.parent()(), prefix, nleft=2)
             sage: E.rec_enum_set_under_language(L, 123, S)
             An enumerated set with a forest structure
+            sage: R = E.rec_enum_set_under_language(L, 123, S, max_depth=1)
+            sage: max(len(w) for (X,w) in R)
+            2
 
         ::
 
@@ -935,25 +1070,32 @@ class ExtensionType(object):
             sage: R = E.rec_enum_set_under_language(L, 123, S, label='previous')
             sage: R
             A recursively enumerated set (breadth first search)
+
+        TESTS::
+
+            sage: E.rec_enum_set_under_language(L, 123, S, label='previous', max_depth=2)
+            Traceback (most recent call last):
+            ...
+            ValueError: max_depth(=2) is not supported when label='previous'
         """
-        # what can go before each letter
-        before = defaultdict(list)
-        for w in language.words_of_length_iterator(2): 
-            before[w[1]].append(w[0])
-        before = dict(before)
+        if label == 'previous' and max_depth != float('inf'):
+            raise ValueError("max_depth(={}) is not supported when "
+                             "label='previous'".format(max_depth))
+        before = letters_before(language)
 
         def child(V):
             Y,w = V
             rep = []
-            for a in before[w[0]]:
-                for Z in Y.apply(substitutions_dict[a], growth_limit=growth_limit):
-                    if keep_empty or not Z.is_empty():
-                        if label == 'previous':
-                            rep.append((Z,(a,)))
-                        elif label == 'history':
-                            rep.append((Z,(a,)+w))
-                        else:
-                            raise ValueError('when label={}'.format(label))
+            if label == 'history' and len(w) > max_depth:
+                return rep
+            for a,Z in children_under_language(Y, w[0], before,
+                    substitutions_dict, keep_empty, growth_limit):
+                if label == 'previous':
+                    rep.append((Z,(a,)))
+                elif label == 'history':
+                    rep.append((Z,(a,)+w))
+                else:
+                    raise ValueError('when label={}'.format(label))
             return rep
         root = (self,(initial,))
 
@@ -969,12 +1111,15 @@ class ExtensionType(object):
 
     def rec_enum_set_under_language_joined(self, language, initial,
             substitutions_dict, keep_equal_length=False, keep_unique=False,
-            label='history', growth_limit=float('inf')):
+            label='history', growth_limit=float('inf'), memo=None):
         r"""
         Return the recursively enumerated set of extension type generated
         by a language of substitutions where the extension type of the same
         age and joined.
 
+        The images of the extension types with the same canonical key are
+        computed only once, see :func:`apply_with_memo`.
+
         INPUT:
 
         - ``language`` -- the language of substitutions
@@ -989,6 +1134,8 @@ class ExtensionType(object):
           word or only the previous applied substitution
         - ``growth_limit`` -- integer (default: ``float('inf')``), the
           maximal growth in length of the bispecial extended images
+        - ``memo`` -- dict (default: ``None``), the images already
+          computed, if None, a new dict is used
 
         EXAMPLES::
 
@@ -1025,10 +1172,11 @@ class ExtensionType(object):
         return rec_enum_set_under_language_joined_from_pairs(pairs, language,
             substitutions_dict, keep_equal_length=keep_equal_length,
             keep_unique=keep_unique, label=label,
-            growth_limit=growth_limit)
+            growth_limit=growth_limit, memo=memo)
 
     def graph_under_sadic(self, substitutions, substitutions_dict,
-            keep_equal_length=False, raw=False, growth_limit=float('inf')):
+            keep_equal_length=False, raw=False, growth_limit=float('inf'),
+            cache=None):
         r"""
         Return the graph of extension types under the application of an
         s-adic word.
@@ -1044,6 +1192,10 @@ class ExtensionType(object):
           raw, i.e. including history and factors information
         - ``growth_limit`` -- integer (default: ``float('inf')``), the
           maximal growth in length of the bispecial extended images
+        - ``cache`` -- dict, :class:`BispecialCache` or None (default:
+          ``None``), where the whole graph is stored once computed; contrary
+          to :meth:`weakstrong_sublanguage`, an interrupted computation is
+          not resumed from the cache
 
         EXAMPLES::
 
@@ -1055,6 +1207,16 @@ class ExtensionType(object):
             sage: E1 = ExtensionTypeLong(data, (1,2,3))
             sage: E1.graph_under_sadic([132]*2+[123]*6, S)
             Looped multi-digraph on 9 vertices
+
+        Using a cache on disk::
+
+            sage: from slabbe.bispecial_extension_type import BispecialCache
+            sage: cache = BispecialCache(tmp_dir())
+            sage: G = E1.graph_under_sadic([132]*2+[123]*6, S, cache=cache)
+            sage: len(cache)
+            1
+            sage: G == E1.graph_under_sadic([132]*2+[123]*6, S, cache=cache)
+            True
             sage: E1.graph_under_sadic([132]*2+[123]*6, S, keep_equal_length=True)
             Looped multi-digraph on 19 vertices
             sage: E1.graph_under_sadic([132]*2+[123]*6, S, raw=True)
@@ -1068,15 +1230,21 @@ class ExtensionType(object):
             sage: from slabbe.tikz_picture import TikzPicture
             sage: _ = TikzPicture.from_graph(G).pdf(view=False) # long time (9s)
         """
+        if cache is not None:
+            key = cache_key('graph_sadic', self, tuple(substitutions),
+                    substitutions_dict, keep_equal_length, raw, growth_limit)
+            if key in cache:
+                return cache[key]
         R = self.rec_enum_set_under_sadic(substitutions,
                 substitutions_dict, keep_equal_length=keep_equal_length,
                 growth_limit=growth_limit)
         G = recursively_enumerated_set_to_digraph(R)
-        if raw:
-            return G
-        else:
+        if not raw:
             edges = set((u,v,history[0]) for ((u,_,_),(v,_,history),_) in G.edges())
-            return DiGraph(edges, format='list_of_edges', loops=True, multiedges=True)
+            G = DiGraph(edges, format='list_of_edges', loops=True, multiedges=True)
+        if cache is not None:
+            cache[key] = G
+        return G
 
     def graph_under_sadic_joined(self, substitutions, 
             substitutions_dict, keep_equal_length=False, keep_unique=False,
@@ -1125,7 +1293,7 @@ class ExtensionType(object):
 
     def graph_under_language(self, language, initial, substitutions_dict,
             keep_empty=False, max_depth=float('inf'),
-            growth_limit=float('inf')):
+            growth_limit=float('inf'), cache=None):
         r"""
         Return the recursively enumerated set of extension type generated
         by a language of substitutions.
@@ -1140,6 +1308,10 @@ class ExtensionType(object):
         - ``max_depth`` -- integer (default: ``float('inf')``), max depth
         - ``growth_limit`` -- integer (default: ``float('inf')``), the
           maximal growth in length of the bispecial extended images
+        - ``cache`` -- dict, :class:`BispecialCache` or None (default:
+          ``None``), where the whole graph is stored once computed; contrary
+          to :meth:`weakstrong_sublanguage`, an interrupted computation is
+          not resumed from the cache
 
         EXAMPLES::
 
@@ -1154,13 +1326,28 @@ class ExtensionType(object):
             sage: E = [E for E in E1.apply(S[123]) if E.factor().length() == 1][0]
             sage: E.graph_under_language(L, 123, S, max_depth=2)  # long time (3s)
             Looped multi-digraph on 41 vertices
+
+        Using a cache in memory::
+
+            sage: cache = {}
+            sage: G = E.graph_under_language(L, 123, S, max_depth=2, cache=cache)  # long time
+            sage: G is E.graph_under_language(L, 123, S, max_depth=2, cache=cache) # long time
+            True
         """
+        if cache is not None:
+            key = cache_key('graph_language', self, initial, language,
+                    substitutions_dict, keep_empty, max_depth, growth_limit)
+            if key in cache:
+                return cache[key]
         R = self.rec_enum_set_under_language(language, initial,
                 substitutions_dict, keep_empty, label='previous',
                 growth_limit=growth_limit)
         G = recursively_enumerated_set_to_digraph(R, max_depth=max_depth)
         edges = set((u,v,label) for ((u,_),(v,(label,)),_) in G.edges())
-        return DiGraph(edges, format='list_of_edges', loops=True, multiedges=True)
+        G = DiGraph(edges, format='list_of_edges', loops=True, multiedges=True)
+        if cache is not None:
+            cache[key] = G
+        return G
 
     def graph_under_language_joined(self, language, initial, substitutions_dict,
             keep_empty=False, max_depth=float('inf'),
@@ -1206,7 +1393,282 @@ class ExtensionType(object):
         edges = set((u,v,label) for ((u,_),(v,(label,)),_) in G.edges())
         return DiGraph(edges, format='list_of_edges', loops=True, multiedges=True)
 
-    def weakstrong_sublanguage(self, language, initial, substitutions_dict, depth, keep_empty=False):
+    def map_reduce_under_language(self, language, initial,
+            substitutions_dict, map_function=None, reduce_function=None,
+            reduce_init=None, keep_empty=False, max_depth=float('inf'),
+            growth_limit=float('inf'), max_proc=None):
+        r"""
+        Run a parallel map-reduce over the tree of extension types
+        generated by a language of substitutions.
+
+        The tree is the one of :meth:`rec_enum_set_under_language` with
+        ``label='history'``. It is explored with work stealing among
+        processes by Sage's parallel map-reduce.
+
+        INPUT:
+
+        - ``language`` -- the language of substitutions
+        - ``initial`` -- initial substitution
+        - ``substitutions_dict`` - dict of substitutions
+        - ``map_function`` -- function (default: ``None``), applied to the
+          nodes ``(E, history)``; if None, the nodes are counted
+        - ``reduce_function`` -- function (default: ``None``), if None,
+          the sum
+        - ``reduce_init`` -- (default: ``None``), if None, zero
+        - ``keep_empty`` -- bool (default: False) whether to keep images
+          that are empty
+        - ``max_depth`` -- integer (default: ``float('inf')``), max depth
+        - ``growth_limit`` -- integer (default: ``float('inf')``), the
+          maximal growth in length of the bispecial extended images
+        - ``max_proc`` -- integer or None (default: ``None``), maximal
+          number of processes, if None, the number of cpus
+
+        EXAMPLES::
+
+            sage: from slabbe.bispecial_extension_type import ExtensionTypeLong
+            sage: from slabbe.mult_cont_frac import Brun
+            sage: S = Brun().substitutions()
+            sage: data = [((2, 1), (2,)), ((3, 1), (2,)), ((2, 2), (3,)), ((1,
+            ....:     2), (1,)), ((1, 2), (2,)), ((1, 2), (3,)), ((2, 3), (1,))]
+            sage: E1 = ExtensionTypeLong(data, (1,2,3))
+            sage: from slabbe.language import languages
+            sage: L = languages.Brun()
+            sage: E = [E for E in E1.apply(S[123]) if E.factor().length() == 1][0]
+            sage: R = E.rec_enum_set_under_language(L, 123, S, max_depth=2)
+            sage: E.map_reduce_under_language(L, 123, S, max_depth=2) == R.cardinality()
+            True
+
+        Counting the bispecial factors by depth and type::
+
+            sage: from collections import Counter
+            sage: f = lambda node: Counter([(len(node[1])-1, node[0].information())])
+            sage: from operator import add
+            sage: C = E.map_reduce_under_language(L, 123, S, f, add, Counter(),
+            ....:                                 max_depth=2)
+            sage: C == Counter((len(w)-1, X.information()) for (X,w) in R)
+            True
+        """
+        from sage.parallel.map_reduce import RESetMapReduce
+        R = self.rec_enum_set_under_language(language, initial,
+                substitutions_dict, keep_empty=keep_empty, label='history',
+                growth_limit=growth_limit, max_depth=max_depth)
+        M = RESetMapReduce(forest=R, map_function=map_function,
+                reduce_function=reduce_function, reduce_init=reduce_init)
+        return M.run(max_proc=max_proc)
+
+    def graph_under_language_parallel(self, language, initial,
+            substitutions_dict, keep_empty=False, max_depth=float('inf'),
+            growth_limit=float('inf'), ncpus=None):
+        r"""
+        Return the graph of extension types generated by a language of
+        substitutions computed in parallel.
+
+        The output is the same as the one of :meth:`graph_under_language`.
+        The vertices ``(E, previous)`` are explored level by level as in
+        a breadth first search and the vertices already seen at a lower
+        level are not explored again. The vertices of a level are split
+        into ``ncpus`` chunks whose children are computed in parallel, one
+        process per chunk.
+
+        INPUT:
+
+        - ``language`` -- the language of substitutions
+        - ``initial`` -- initial substitution
+        - ``substitutions_dict`` - dict of substitutions
+        - ``keep_empty`` -- bool (default: False) whether to keep images
+          that are empty
+        - ``max_depth`` -- integer (default: ``float('inf')``), max depth
+        - ``growth_limit`` -- integer (default: ``float('inf')``), the
+          maximal growth in length of the bispecial extended images
+        - ``ncpus`` -- integer or None (default: ``None``), number of
+          cpus, if None, the number of cpus
+
+        EXAMPLES::
+
+            sage: from slabbe.bispecial_extension_type import ExtensionTypeLong
+            sage: from slabbe.mult_cont_frac import Brun
+            sage: S = Brun().substitutions()
+            sage: data = [((2, 1), (2,)), ((3, 1), (2,)), ((2, 2), (3,)), ((1,
+            ....:     2), (1,)), ((1, 2), (2,)), ((1, 2), (3,)), ((2, 3), (1,))]
+            sage: E1 = ExtensionTypeLong(data, (1,2,3))
+            sage: from slabbe.language import languages
+            sage: L = languages.Brun()
+            sage: E = [E for E in E1.apply(S[123]) if E.factor().length() == 1][0]
+            sage: G = E.graph_under_language_parallel(L, 123, S, max_depth=2)  # long time
+            sage: G == E.graph_under_language(L, 123, S, max_depth=2)         # long time
+            True
+            sage: G = E.graph_under_language_parallel(L, 123, S)   # not tested long time
+            sage: G == E.graph_under_language(L, 123, S)          # not tested long time
+            True
+        """
+        from sage.parallel.decorate import parallel
+        if ncpus is None:
+            from sage.parallel.ncpus import ncpus as number_of_cpus
+            ncpus = number_of_cpus()
+        before = letters_before(language)
+        @parallel(ncpus=ncpus)
+        def children(chunk):
+            return [(Y, children_under_language(Y, previous, before,
+                        substitutions_dict, keep_empty, growth_limit))
+                    for (Y, previous) in chunk]
+        root = (self, initial)
+        seen = set([root])
+        level = [root]
+        depth = 0
+        edges = set()
+        while level and depth <= max_depth:
+            chunks = [(level[i::ncpus],) for i in range(min(ncpus, len(level)))]
+            next_level = []
+            for (_, result) in children(chunks):
+                for Y,L in result:
+                    for a,Z in L:
+                        edges.add((Y,Z,a))
+                        if (Z,a) not in seen:
+                            seen.add((Z,a))
+                            next_level.append((Z,a))
+            level = next_level
+            depth += 1
+        return DiGraph(edges, format='list_of_edges', loops=True, multiedges=True)
+
+    def statistics_under_sadic(self, substitutions, substitutions_dict,
+            keep_equal_length=False, growth_limit=float('inf')):
+        r"""
+        Return an iterator of the statistics of the extension types of each
+        depth under the application of an s-adic word.
+
+        The nodes of :meth:`rec_enum_set_under_sadic` are visited level by
+        level and only the current level is kept in memory.
+
+        INPUT:
+
+        - ``substitutions`` -- the sequence of substitutions
+        - ``substitutions_dict`` - dict of substitutions
+        - ``keep_equal_length`` -- (default: False) whether to keep images
+          that have equal length
+        - ``growth_limit`` -- integer (default: ``float('inf')``), the
+          maximal growth in length of the bispecial extended images
+
+        OUTPUT:
+
+        iterator of ``DepthStatistics(depth, size, information,
+        multiplicity, connected)`` where ``information`` and
+        ``multiplicity`` are Counter of the values of :meth:`information`
+        and :meth:`multiplicity` and ``connected`` is the number of
+        extension types whose extension graph is connected, see
+        :meth:`is_connected_fast`
+
+        EXAMPLES::
+
+            sage: from slabbe.bispecial_extension_type import ExtensionTypeLong
+            sage: from slabbe.mult_cont_frac import Brun
+            sage: S = Brun().substitutions()
+            sage: data = [((2, 1), (2,)), ((3, 1), (2,)), ((2, 2), (3,)), ((1,
+            ....:     2), (1,)), ((1, 2), (2,)), ((1, 2), (3,)), ((2, 3), (1,))]
+            sage: E1 = ExtensionTypeLong(data, (1,2,3))
+            sage: seq = [132]*2+[123]*6
+            sage: [s.size for s in E1.statistics_under_sadic(seq, S)]
+            [1, 2, 2, 2, 2, 2, 2, 2, 3]
+            sage: it = E1.statistics_under_sadic(seq, S, keep_equal_length=True)
+            sage: s = list(it)[-1]
+            sage: s.depth, s.size
+            (8, 16)
+            sage: sorted(s.multiplicity.items())
+            [(-1, 1), (0, 14), (1, 1)]
+
+        It agrees with the enumerated set::
+
+            sage: R = E1.rec_enum_set_under_sadic(seq, S)
+            sage: from collections import Counter
+            sage: all(s.information == Counter(Z.information() for (Z,_,_)
+            ....:                              in R.graded_component(s.depth))
+            ....:     for s in E1.statistics_under_sadic(seq, S))
+            True
+            sage: all(s.connected == sum(1 for (Z,_,_) in R.graded_component(s.depth)
+            ....:                        if Z.is_connected_fast())
+            ....:     for s in E1.statistics_under_sadic(seq, S))
+            True
+        """
+        level = set([(self, self.factor())])
+        for depth in range(len(substitutions)+1):
+            yield depth_statistics(depth, [Y for (Y,_) in level])
+            if depth == len(substitutions):
+                break
+            a = substitutions[-depth-1]
+            m = substitutions_dict[a]
+            next_level = set()
+            for Y,_ in level:
+                for Z in Y.apply(m, growth_limit=growth_limit):
+                    if keep_equal_length or not len(Y.factor()) == len(Z.factor()):
+                        next_level.add((Z, Z.factor()))
+            level = next_level
+
+    def statistics_under_language(self, language, initial,
+            substitutions_dict, max_depth, keep_empty=False,
+            growth_limit=float('inf')):
+        r"""
+        Return an iterator of the statistics of the extension types of each
+        depth generated by a language of substitutions.
+
+        The nodes of :meth:`rec_enum_set_under_language` are visited level
+        by level and only the current level is kept in memory, each node
+        being reduced to its extension type and previous substitution.
+
+        INPUT:
+
+        - ``language`` -- the language of substitutions
+        - ``initial`` -- initial substitution
+        - ``substitutions_dict`` - dict of substitutions
+        - ``max_depth`` -- integer, max depth
+        - ``keep_empty`` -- bool (default: False) whether to keep images
+          that are empty
+        - ``growth_limit`` -- integer (default: ``float('inf')``), the
+          maximal growth in length of the bispecial extended images
+
+        OUTPUT:
+
+        iterator of ``DepthStatistics(depth, size, information,
+        multiplicity, connected)``, see :meth:`statistics_under_sadic`
+
+        EXAMPLES::
+
+            sage: from slabbe.bispecial_extension_type import ExtensionTypeLong
+            sage: from slabbe.mult_cont_frac import Brun
+            sage: S = Brun().substitutions()
+            sage: data = [((2, 1), (2,)), ((3, 1), (2,)), ((2, 2), (3,)), ((1,
+            ....:     2), (1,)), ((1, 2), (2,)), ((1, 2), (3,)), ((2, 3), (1,))]
+            sage: E1 = ExtensionTypeLong(data, (1,2,3))
+            sage: from slabbe.language import languages
+            sage: L = languages.Brun()
+            sage: E = [E for E in E1.apply(S[123]) if E.factor().length() == 1][0]
+            sage: it = E.statistics_under_language(L, 123, S, 3)
+            sage: [s.depth for s in it]
+            [0, 1, 2, 3]
+
+        It agrees with the enumerated set::
+
+            sage: R = E.rec_enum_set_under_language(L, 123, S)
+            sage: from collections import Counter
+            sage: all(s.multiplicity == Counter(Z.multiplicity() for (Z,_)
+            ....:                       in R.elements_of_depth_iterator(s.depth))
+            ....:     for s in E.statistics_under_language(L, 123, S, 3))
+            True
+            sage: all(s.size == len(list(R.elements_of_depth_iterator(s.depth)))
+            ....:     for s in E.statistics_under_language(L, 123, S, 3))
+            True
+        """
+        before = letters_before(language)
+        level = [(self, initial)]
+        for depth in range(max_depth+1):
+            yield depth_statistics(depth, [Y for (Y,_) in level])
+            if depth == max_depth:
+                break
+            level = [(Z,a) for (Y,previous) in level
+                           for (a,Z) in children_under_language(Y, previous,
+                               before, substitutions_dict, keep_empty,
+                               growth_limit)]
+
+    def weakstrong_sublanguage(self, language, initial, substitutions_dict,
+            depth, keep_empty=False, cache=None):
         r"""
         Return the word of length depth+1 ending with initial letter of the
         language that gives weak or strong bispecial factors.
@@ -1219,6 +1681,9 @@ class ExtensionType(object):
         - ``depth`` -- depth
         - ``keep_empty`` -- (default: False) whether to keep images that
           are empty
+        - ``cache`` -- dict, :class:`BispecialCache` or None (default: ``None``),
+          where the nodes of each positive depth are stored; the
+          exploration starts from the deepest stored depth
 
         EXAMPLES::
 
@@ -1244,13 +1709,39 @@ class ExtensionType(object):
              (231, 213, 231, 231, 123),
              (231, 231, 213, 231, 123),
              (312, 231, 213, 231, 123)}
+
+        Using a cache on disk::
+
+            sage: from slabbe.bispecial_extension_type import BispecialCache
+            sage: cache = BispecialCache(tmp_dir())
+            sage: E.weakstrong_sublanguage(L, 123, S, 3, cache=cache)
+            {(213, 213, 231, 123), (231, 213, 231, 123)}
+            sage: len(cache)
+            3
+            sage: E.weakstrong_sublanguage(L, 123, S, 3, cache=cache)
+            {(213, 213, 231, 123), (231, 213, 231, 123)}
+            sage: len(cache)
+            3
         """
         R = self.rec_enum_set_under_language(language, initial, substitutions_dict, keep_empty)
-        it = R.elements_of_depth_iterator(depth) 
+        if cache is None:
+            it = R.elements_of_depth_iterator(depth) 
+        else:
+            key = lambda d: cache_key('language', self, initial, language,
+                                      substitutions_dict, keep_empty, d)
+            d = depth
+            while d > 0 and key(d) not in cache:
+                d -= 1
+            it = cache.get(key(d), [(self,(initial,))])
+            while d < depth:
+                it = [V for U in it for V in R.children(U)]
+                d += 1
+                cache[key(d)] = it
         S = [w for (X,w) in it if X.multiplicity() != 0]
         return set(tuple(s) for s in S)
 
-    def weakstrong_poset(self, language, initial, substitutions_dict, depth):
+    def weakstrong_poset(self, language, initial, substitutions_dict,
+            depth, cache=None):
         r"""
         Return the Poset of words of the language ending with initial
         letter that gives weak or strong bispecial factors with the "is
@@ -1262,6 +1753,9 @@ class ExtensionType(object):
         - ``initial`` -- initial substitution
         - ``substitutions_dict`` - dict of substitutions
         - ``depth`` -- depth
+        - ``cache`` -- dict, :class:`BispecialCache` or None (default: ``None``),
+          see :meth:`weakstrong_sublanguage`; with a cache, each depth
+          starts from the previous one
 
         EXAMPLES::
 
@@ -1277,6 +1771,10 @@ class ExtensionType(object):
             sage: P = E.weakstrong_poset(L, 123, S, 4)
             sage: P
             Finite poset containing 2 elements
+            sage: from slabbe.bispecial_extension_type import BispecialCache
+            sage: cache = BispecialCache(tmp_dir())
+            sage: P == E.weakstrong_poset(L, 123, S, 4, cache=cache)
+            True
 
         ::
 
@@ -1286,14 +1784,15 @@ class ExtensionType(object):
         """
         from sage.combinat.posets.posets import Poset
         is_suffix = lambda w,u: Word(w).is_suffix(Word(u))
-        WS = [self.weakstrong_sublanguage(language, initial, substitutions_dict, depth) 
+        WS = [self.weakstrong_sublanguage(language, initial, substitutions_dict,
+                                          depth, cache=cache)
                                   for depth in range(depth)]
         F = reduce(lambda x,y: x.union(y), WS)
         P = Poset((F,is_suffix))
         return P
 
     def distinct_bispecial_factors_under_sadic(self, substitutions, substitutions_dict,
-            keep_empty=True):
+            keep_empty=True, cache=None):
         r"""
         Return the list of distinct bispecial factors obtain from this extension
         type after the application of substitutions.
@@ -1308,6 +1807,10 @@ class ExtensionType(object):
         - ``keep_empty`` -- (default: True) whether to keep images that are
           empty, thus it will include all bispecial factors of age <= k on the
           highest graded component.
+        - ``cache`` -- dict, :class:`BispecialCache` or None (default: ``None``),
+          where the last graded component is stored; the exploration
+          starts from the stored component of the longest suffix of
+          ``substitutions``
 
         EXAMPLES::
 
@@ -1336,13 +1839,39 @@ class ExtensionType(object):
              word: 22322322322322]
             sage: [Z.multiplicity() for Z in L]
             [0, 0, 0, 0, 0, 0, 0, 0, 1, -1, 0, 0, 0, 0, 0]
+
+        Using a cache on disk, the second computation starts from the
+        stored result of the first::
+
+            sage: from slabbe.bispecial_extension_type import BispecialCache
+            sage: cache = BispecialCache(tmp_dir())
+            sage: A = E1.distinct_bispecial_factors_under_sadic([123]*6, S, cache=cache)
+            sage: B = E1.distinct_bispecial_factors_under_sadic([132]*2+[123]*6, S, cache=cache)
+            sage: sorted(Z.factor() for Z in B) == sorted(Z.factor() for Z in L)
+            True
+            sage: len(cache)
+            2
         """
-        R = self.rec_enum_set_under_sadic(substitutions, substitutions_dict, keep_empty)
-        B = R.graded_component(len(substitutions))
+        n = len(substitutions)
+        if cache is None:
+            R = self.rec_enum_set_under_sadic(substitutions, substitutions_dict, keep_empty)
+            B = R.graded_component(n)
+        else:
+            key = lambda k: cache_key('sadic', self, substitutions_dict,
+                                      tuple(substitutions[n-k:]), keep_empty)
+            k = n
+            while k > 0 and key(k) not in cache:
+                k -= 1
+            roots = cache.get(key(k))
+            R = self.rec_enum_set_under_sadic(substitutions, substitutions_dict,
+                    keep_empty, roots=roots)
+            B = R.graded_component(n-k)
+            if k < n:
+                cache[key(n)] = list(B)
         return remove_extension_types_subsets(E for E,w,history in B)
 
     def bispecial_factors_table_under_sadic(self, substitutions,
-            substitutions_dict, keep_empty=True):
+            substitutions_dict, keep_empty=True, cache=None):
         r"""
         Return the summary table of bispecial factors obtain from this extension
         type after the application of substitutions.
@@ -1354,6 +1883,8 @@ class ExtensionType(object):
         - ``keep_empty`` -- (default: True) whether to keep images that are
           empty, thus it will include all bispecial factors of age <= k on the
           highest graded component.
+        - ``cache`` -- dict, :class:`BispecialCache` or None (default: ``None``),
+          see :meth:`distinct_bispecial_factors_under_sadic`
 
         EXAMPLES::
 
@@ -1382,7 +1913,8 @@ class ExtensionType(object):
               19    2322322322322322322    1      2        3         strong
               20    22322322322322322322   -1     2        2         weak
         """
-        B = self.distinct_bispecial_factors_under_sadic(substitutions, substitutions_dict, keep_empty)
+        B = self.distinct_bispecial_factors_under_sadic(substitutions,
+                substitutions_dict, keep_empty, cache=cache)
         rows = []
         for ext in B:
             mw = ext.multiplicity()
@@ -1605,6 +2137,95 @@ class ExtensionType1to1(ExtensionType):
         """
         return self._chignons + (self.multiplicity(),)
 
+    def canonical_key(self):
+        r"""
+        Return a compact hashable encoding of self made of the bitmask of
+        the pairs, the chignons, the multiplicity and the alphabet.
+
+        The pair `(a,b)` corresponds to the bit `i n + j` where `i` and `j`
+        are the indices of `a` and `b` in the alphabet of size `n`. The
+        images of two extension types having the same canonical key under
+        a substitution are equal up to their factor, see
+        :func:`apply_with_memo`.
+
+        EXAMPLES::
+
+            sage: from slabbe import ExtensionType1to1
+            sage: L = [(1,3), (2,3), (3,1), (3,2), (3,3)]
+            sage: E = ExtensionType1to1(L, [1,2,3])
+            sage: E.canonical_key()
+            (484, ((), ()), 0, (1, 2, 3))
+            sage: E = ExtensionType1to1(L, [1,2,3], ('a', 'b'))
+            sage: E.canonical_key()
+            (484, (('a',), ('b',)), 0, (1, 2, 3))
+
+        TESTS:
+
+        The same bitmask over another alphabet gives another key::
+
+            sage: F = ExtensionType1to1([(4,6), (5,6), (6,4), (6,5), (6,6)], [4,5,6])
+            sage: F.bitmask() == E.bitmask()
+            True
+            sage: F.canonical_key() == ExtensionType1to1(L, [1,2,3]).canonical_key()
+            False
+        """
+        n = len(self._alphabet)
+        mask = sum(row << (i * n) for (i,row) in enumerate(self.bitmask()))
+        chignons = tuple(tuple(c) for c in self._chignons)
+        return (mask, chignons, self.multiplicity(), tuple(self._alphabet))
+
+    @cached_method
+    def bitmask(self):
+        r"""
+        Return the rows of the extension type as integer bitmasks.
+
+        The `j`-th bit of the `i`-th row is set if and only if the pair
+        made of the `i`-th and `j`-th letters of the alphabet is in the
+        extension type.
+
+        EXAMPLES::
+
+            sage: from slabbe import ExtensionType1to1
+            sage: L = [(1,3), (2,3), (3,1), (3,2), (3,3)]
+            sage: E = ExtensionType1to1(L, [1,2,3])
+            sage: E.bitmask()
+            (4, 4, 7)
+        """
+        index = dict((a,i) for (i,a) in enumerate(self._alphabet))
+        rows = [0] * len(index)
+        for a,b in self._pairs:
+            rows[index[a]] |= 1 << index[b]
+        return tuple(rows)
+
+    def _image_copy(self, preimage, m):
+        r"""
+        Return a copy of self, an image of an extension type under ``m``,
+        as the image of ``preimage``.
+
+        INPUT:
+
+        - ``preimage`` -- extension type with the same canonical key as the
+          one self is the image of
+        - ``m`` -- substitution
+
+        EXAMPLES::
+
+            sage: from slabbe import ExtensionType1to1
+            sage: L = [(1,3), (2,3), (3,1), (3,2), (3,3)]
+            sage: E = ExtensionType1to1(L, [1,2,3])
+            sage: F = ExtensionType1to1(L, [1,2,3], factor=Word([3]))
+            sage: ar = WordMorphism({1:[1,3],2:[2,3],3:[3]})
+            sage: Z, = E.apply(ar)
+            sage: Z._image_copy(F, ar).factor()
+            word: 33
+            sage: F.apply(ar)[0].factor()
+            word: 33
+        """
+        factor = self._chignons[0] * m(preimage._factor) * self._chignons[1]
+        return ExtensionType1to1(self._pairs, alphabet=self._alphabet,
+                chignons=self._chignons, factor=factor,
+                include_factor_in_repr=preimage._include_factor_in_repr)
+
     def apply(self, m, growth_limit=float('inf')):
         r"""
         EXAMPLES::
@@ -1762,13 +2383,49 @@ class ExtensionType1to1(ExtensionType):
             ()
             sage: r.apply(b31)
             ()
+
+        The bitmask and the word implementations give the same images::
+
+            sage: e = ExtensionType1to1([(1,2),(2,3),(3,1),(3,2),(3,3)], [1,2,3])
+            sage: f = lambda T:[(Z._pairs, Z._chignons, Z.factor()) for Z in T]
+            sage: all(f(e._apply_bitmask(m)) == f(e._apply_words(m))
+            ....:     for m in [p0, p1, p2, p3, b23, b13, b31])
+            True
+            sage: E = ExtensionType1to1([(1,2),(2,2),(3,1)], [1,2,3])
+            sage: all(f(E._apply_bitmask(m, 1)) == f(E._apply_words(m, 1))
+            ....:     for m in [p0, p1, p2, p3, b23, b13, b31])
+            True
         """
-        images = m.images()
-        common_suffix = images[0]
-        common_prefix = images[0]
-        for image in images:
-            common_suffix = image.longest_common_suffix(common_suffix)
-            common_prefix = image.longest_common_prefix(common_prefix)
+        if len(self._alphabet) <= 8:
+            return self._apply_bitmask(m, growth_limit)
+        else:
+            return self._apply_words(m, growth_limit)
+
+    def _apply_words(self, m, growth_limit=float('inf')):
+        r"""
+        Return the bispecial extension types of the images of self under
+        the substitution ``m`` computed from the images of the pairs.
+
+        See :meth:`apply`.
+
+        EXAMPLES::
+
+            sage: from slabbe import ExtensionType1to1
+            sage: p0 = WordMorphism({1:[1,2,3],2:[2,3],3:[3]})
+            sage: e = ExtensionType1to1([(1,3),(2,3),(3,1),(3,2),(3,3)], [1,2,3])
+            sage: e._apply_words(p0)
+            ( E(w)   1   2   3
+                1
+                2            X
+                3    X   X   X
+             m(w)=0, ord.,)
+        """
+        images = m.images()
+        common_suffix = images[0]
+        common_prefix = images[0]
+        for image in images:
+            common_suffix = image.longest_common_suffix(common_suffix)
+            common_prefix = image.longest_common_prefix(common_prefix)
         word_pairs = []
         for a,b in self:
             left = common_suffix * m(a)
@@ -1799,6 +2456,86 @@ class ExtensionType1to1(ExtensionType):
                         L.append(e)
         return tuple(L)
 
+    def _apply_bitmask(self, m, growth_limit=float('inf')):
+        r"""
+        Return the bispecial extension types of the images of self under
+        the substitution ``m`` computed with bitwise operations on the rows
+        of :meth:`bitmask`.
+
+        The transition tables of ``m`` are computed once by
+        :func:`apply_tables`. The images are returned in the same order
+        as :meth:`_apply_words`. See :meth:`apply`.
+
+        EXAMPLES::
+
+            sage: from slabbe import ExtensionType1to1
+            sage: p0 = WordMorphism({1:[1,2,3],2:[2,3],3:[3]})
+            sage: e = ExtensionType1to1([(1,3),(2,3),(3,1),(3,2),(3,3)], [1,2,3])
+            sage: e._apply_bitmask(p0)
+            ( E(w)   1   2   3
+                1
+                2            X
+                3    X   X   X
+             m(w)=0, ord.,)
+        """
+        alphabet = tuple(self._alphabet)
+        images = m.images()
+        common_suffix = images[0]
+        common_prefix = images[0]
+        for image in images:
+            common_suffix = image.longest_common_suffix(common_suffix)
+            common_prefix = image.longest_common_prefix(common_prefix)
+        images = tuple(m(a) for a in alphabet)
+        tables = apply_tables(alphabet, images, common_suffix, common_prefix)
+        if tables is None:
+            return self._apply_words(m, growth_limit)
+        left_tables, right_tables = tables
+        n = len(alphabet)
+        rows = self.bitmask()
+        index = dict((a,i) for (i,a) in enumerate(alphabet))
+        positions = [(index[a], index[b]) for (a,b) in self]
+
+        m_factor = m(self._factor)
+        L = []
+        for left_table in left_tables:
+            for right_table in right_tables:
+                level = []
+                for chignon_left, left_mask, left_letters in left_table:
+                    for chignon_right, right_mask, translation in right_table:
+                        new_rows = [0] * n
+                        for i,x in left_letters:
+                            hits = rows[i] & right_mask
+                            if hits:
+                                new_rows[x] |= translation[hits]
+                        if not any(new_rows):
+                            continue
+                        first = next(k for (k,(i,j)) in enumerate(positions)
+                                     if left_mask >> i & 1 and right_mask >> j & 1)
+                        chignons = chignon_left, chignon_right
+                        level.append((first, chignons, new_rows))
+                # the dict of the level is filled in the same order as in
+                # _apply_words to get the same order of output
+                level.sort(key=lambda t:t[0])
+                extensions = {}
+                for _, chignons, new_rows in level:
+                    extensions[chignons] = new_rows
+
+                for chignons, new_rows in extensions.iteritems():
+                    if len(chignons[0]) + len(chignons[1]) > growth_limit:
+                        continue
+                    left_valence = sum(1 for r in new_rows if r)
+                    right_valence = bin(reduce(operator.or_, new_rows)).count('1')
+                    if left_valence < 2 or right_valence < 2:
+                        continue
+                    pairs = [(alphabet[x], alphabet[y]) for x in range(n)
+                             for y in range(n) if new_rows[x] >> y & 1]
+                    factor = chignons[0] * m_factor * chignons[1]
+                    e = ExtensionType1to1(L=pairs, alphabet=self._alphabet,
+                            chignons=chignons, factor=factor,
+                            include_factor_in_repr=self._include_factor_in_repr)
+                    L.append(e)
+        return tuple(L)
+
     def is_ordinaire(self):
         r"""
         EXAMPLES:
@@ -1859,17 +2596,15 @@ class ExtensionType1to1(ExtensionType):
             return False
         elif not self.is_neutral():
             return False
-        left_projection, right_projection = self.left_right_projection()  
-        left_most = [a for (a,v) in left_projection.iteritems() if v > 1]
+        rows = self.bitmask()
+        left_most = [i for (i,row) in enumerate(rows) if row & (row - 1)]
         if len(left_most) != 1: 
             return False
-        right_most = [b for (b,v) in right_projection.iteritems() if v > 1]
+        right_most = [j for j in range(len(rows))
+                      if sum(row >> j & 1 for row in rows) > 1]
         if len(right_most) != 1: 
             return False
-        #print left_most,right_most
-        if (left_most[0],right_most[0]) not in self._pairs:
-            return False
-        return True
+        return bool(rows[left_most[0]] >> right_most[0] & 1)
 
     def cardinality(self):
         r"""
@@ -1905,6 +2640,28 @@ class ExtensionType1to1(ExtensionType):
             {1, 2, 3}
         """
         return set(b for a,b in self)
+    def left_valence(self):
+        r"""
+        EXAMPLES::
+
+            sage: from slabbe import ExtensionType1to1
+            sage: L = [(1,3), (2,3), (3,1), (3,2), (3,3)]
+            sage: E = ExtensionType1to1(L, [1,2,3])
+            sage: E.left_valence()
+            3
+        """
+        return sum(1 for row in self.bitmask() if row)
+    def right_valence(self):
+        r"""
+        EXAMPLES::
+
+            sage: from slabbe import ExtensionType1to1
+            sage: L = [(1,3), (2,3), (3,1), (3,2), (3,3)]
+            sage: E = ExtensionType1to1(L, [1,2,3])
+            sage: E.right_valence()
+            3
+        """
+        return bin(reduce(operator.or_, self.bitmask(), 0)).count('1')
     def palindromic_extensions(self):
         r"""
         EXAMPLES::
@@ -2024,6 +2781,7 @@ class ExtensionTypeLong(ExtensionType):
         self._chignons = tuple(chignons)
         self._factor = factor
         self._factors_length_k = factors_length_k
+        self._factors_other_lengths = {}
         if empty is None:
             self._empty = self.is_chignons_empty()
         else:
@@ -2049,7 +2807,9 @@ class ExtensionTypeLong(ExtensionType):
         Returns the set of factors of length k of the language.
 
         This is computed from the extension type if it was not provided at
-        the construction.
+        the construction. Factors of other lengths are computed from the
+        extension type if the word is empty and from the factors provided
+        for smaller lengths.
 
         INPUT:
 
@@ -2067,18 +2827,34 @@ class ExtensionTypeLong(ExtensionType):
             sage: sorted(E.factors_length_k())
             [word: 12, word: 21, word: 22, word: 23, word: 31]
 
-        It stores the value and can not compute for other lengths::
+        It stores the value and can compute other lengths when possible::
 
             sage: E = ExtensionTypeLong(L, (1,2,3))
             sage: sorted(E.factors_length_k(3))
             [word: 121, word: 122, word: 123, word: 212, word: 221, word: 231, word: 312]
             sage: sorted(E.factors_length_k())
             [word: 121, word: 122, word: 123, word: 212, word: 221, word: 231, word: 312]
+            sage: sorted(E.factors_length_k(2))
+            [word: 12, word: 21, word: 22, word: 23, word: 31]
+            sage: sorted(E.factors_length_k())
+            [word: 121, word: 122, word: 123, word: 212, word: 221, word: 231, word: 312]
             sage: sorted(E.factors_length_k(4))
             Traceback (most recent call last):
             ...
             NotImplementedError: can't compute factors of length k for this word
 
+        For a nonempty word, only smaller lengths can be computed::
+
+            sage: F = [(1,1,1), (1,2,1), (1,1,3), (3,1,2), (2,1,1), (1,1,2), (1,3,1)]
+            sage: E = ExtensionTypeLong(L, (1,2,3), factor=Word([1]),
+            ....:                       factors_length_k=map(Word, F), empty=False)
+            sage: sorted(E.factors_length_k(2))
+            [word: 11, word: 12, word: 13, word: 21, word: 31]
+            sage: E.factors_length_k(4)
+            Traceback (most recent call last):
+            ...
+            NotImplementedError: can't compute factors of length k for this word
+
         ::
 
             sage: L = [(1, 2), (3, 2), (1, 3), (3, 3), (3, 1), (2, 3), (1, 1)]
@@ -2100,10 +2876,25 @@ class ExtensionTypeLong(ExtensionType):
             assert self.is_empty(), "can't compute factor of length k for nonempty word"
             assert not k is None, "you must provide a value for k to compute them"
             self._factors_length_k = set(w for a,b in self._pairs for w in (a*b).factor_iterator(k))
-        if not k is None and (not self._factors_length_k or
-                next(iter(self._factors_length_k)).length() != k):
+        F = self._factors_length_k
+        if k is None:
+            return F
+        if not F:
             raise NotImplementedError("can't compute factors of length k for this word")
-        return self._factors_length_k
+        length = next(iter(F)).length()
+        if length == k:
+            return F
+        if k not in self._factors_other_lengths:
+            if self.is_empty():
+                G = set(w for a,b in self._pairs for w in (a*b).factor_iterator(k))
+            elif k < length:
+                G = set(w for f in F for w in f.factor_iterator(k))
+            else:
+                G = None
+            if not G:
+                raise NotImplementedError("can't compute factors of length k for this word")
+            self._factors_other_lengths[k] = G
+        return self._factors_other_lengths[k]
 
     def is_valid(self):
         r"""
@@ -2216,14 +3007,86 @@ class ExtensionTypeLong(ExtensionType):
         """
         return self._chignons + (self.multiplicity(),)
 
+    def canonical_key(self):
+        r"""
+        Return a compact hashable encoding of self made of the sorted
+        pairs, the chignons and the multiplicity.
+
+        It also contains what the images of self depend on: the factors of
+        length k, whether self is empty and the factor when it is of length
+        at most one. The images of two extension types having the same
+        canonical key under a substitution are equal up to their factor,
+        see :func:`apply_with_memo`.
+
+        EXAMPLES::
+
+            sage: from slabbe import ExtensionTypeLong
+            sage: L = [((2, 2), (1,)), ((2, 3), (1,)), ((2, 1), (2,)), ((1,
+            ....:    2), (1,)), ((1, 2), (2,)), ((1, 2), (3,)), ((3, 1), (2,))]
+            sage: E = ExtensionTypeLong(L, (1,2,3))
+            sage: K = E.canonical_key()
+            sage: K[0]
+            (((1, 2), (1,)),
+             ((1, 2), (2,)),
+             ((1, 2), (3,)),
+             ((2, 1), (2,)),
+             ((2, 2), (1,)),
+             ((2, 3), (1,)),
+             ((3, 1), (2,)))
+            sage: K[1:3]
+            (((), ()), 0)
+            sage: K == ExtensionTypeLong(reversed(L), (1,2,3)).canonical_key()
+            True
+        """
+        pairs = tuple(sorted((tuple(a), tuple(b)) for (a,b) in self._pairs))
+        chignons = tuple(tuple(c) for c in self._chignons)
+        F = self._factors_length_k
+        if F is not None:
+            F = frozenset(tuple(f) for f in F)
+        factor = tuple(self._factor) if len(self._factor) <= 1 else None
+        return (pairs, chignons, self.multiplicity(), F, self._empty, factor)
+
+    def _image_copy(self, preimage, m):
+        r"""
+        Return a copy of self, an image of an extension type under ``m``,
+        as the image of ``preimage``.
+
+        INPUT:
+
+        - ``preimage`` -- extension type with the same canonical key as the
+          one self is the image of
+        - ``m`` -- substitution
+
+        EXAMPLES::
+
+            sage: from slabbe import ExtensionTypeLong
+            sage: L = [((2, 2), (1,)), ((2, 3), (1,)), ((2, 1), (2,)), ((1,
+            ....:    2), (1,)), ((1, 2), (2,)), ((1, 2), (3,)), ((3, 1), (2,))]
+            sage: E = ExtensionTypeLong(L, (1,2,3))
+            sage: b12 = WordMorphism({1:[1,2],2:[2],3:[3]})
+            sage: Z = E.apply(b12)[0]
+            sage: Z._image_copy(E, b12).factor() == Z.factor()
+            True
+        """
+        factor = self._chignons[0] * m(preimage._factor) * self._chignons[1]
+        empty = preimage.is_empty() and map(len, self._chignons) == [0,0]
+        return ExtensionTypeLong(self._pairs, alphabet=self._alphabet,
+                chignons=self._chignons, factor=factor,
+                factors_length_k=self._factors_length_k, empty=empty,
+                include_factor_in_repr=preimage._include_factor_in_repr)
+
     def letters_before_and_after(self, factors):
         r"""
         Returns a pair of dict giving the words letters that goes before
         the left extensions and after the right extensions.
 
+        The factors are indexed by their prefixes and suffixes with
+        :class:`FactorIndex`, so that the letters before and after each
+        extension are found in time linear in the output.
+
         INPUT:
 
-        - ``factors`` -- factors of length k
+        - ``factors`` -- factors of length k, or :class:`FactorIndex`
 
         OUTPUT:
 
@@ -2279,20 +3142,22 @@ class ExtensionTypeLong(ExtensionType):
               word: 2: {word: 11},
               word: 3: {word: 12}})
         """
+        if not isinstance(factors, FactorIndex):
+            factors = FactorIndex(factors)
         possible_before = defaultdict(set)
         for left in self.left_word_extensions():
-            for f in factors:
-                len_inter = min(f.length()-1, left.length())
+            for k in factors.lengths():
+                len_inter = min(k-1, left.length())
                 inter = left[:len_inter]
-                if inter.is_suffix(f):
-                    possible_before[left].add(f[:-len_inter])
+                for p in factors.prefixes_before(inter, k):
+                    possible_before[left].add(p)
         possible_after = defaultdict(set)
         for right in self.right_word_extensions():
-            for f in factors:
-                len_inter = min(f.length()-1, right.length())
-                inter = f[:len_inter]
-                if inter.is_suffix(right):
-                    possible_after[right].add(f[len_inter:])
+            for k in factors.lengths():
+                len_inter = min(k-1, right.length())
+                inter = right[right.length()-len_inter:]
+                for q in factors.suffixes_after(inter, k):
+                    possible_after[right].add(q)
         return dict(possible_before), dict(possible_after)
 
     def apply(self, m, l=2, r=1, growth_limit=float('inf')):
@@ -2610,6 +3475,406 @@ class ExtensionTypeLong(ExtensionType):
         """
         return self.extension_type_1to1().palindromic_extensions()
 ######################################
+# Index of factors
+######################################
+class FactorIndex(object):
+    r"""
+    Index of a set of factors by their prefixes and suffixes.
+
+    The index of a given length of prefixes or suffixes is built at the
+    first query and each query is answered in time linear in the size of
+    the output.
+
+    INPUT:
+
+    - ``factors`` -- iterable of words, possibly of different lengths
+
+    EXAMPLES::
+
+        sage: from slabbe.bispecial_extension_type import FactorIndex
+        sage: F = FactorIndex(map(Word, [(1,2,1), (1,2,2), (2,2,1), (3,1,2)]))
+        sage: F
+        Factor index of 4 factors of lengths [3]
+        sage: sorted(F.prefixes_before(Word([2,1]), 3))
+        [word: 1, word: 2]
+        sage: sorted(F.suffixes_after(Word([1,2]), 3))
+        [word: 1, word: 2]
+    """
+    def __init__(self, factors):
+        r"""
+        EXAMPLES::
+
+            sage: from slabbe.bispecial_extension_type import FactorIndex
+            sage: F = FactorIndex([Word([1,2]), Word([2,2,1])])
+            sage: F.lengths()
+            [2, 3]
+        """
+        self._factors = defaultdict(set)
+        for f in factors:
+            self._factors[f.length()].add(f)
+        self._factors = dict(self._factors)
+        self._ending_with = {}
+        self._starting_with = {}
+
+    def __repr__(self):
+        r"""
+        EXAMPLES::
+
+            sage: from slabbe.bispecial_extension_type import FactorIndex
+            sage: FactorIndex([Word([1,2]), Word([2,2,1])])
+            Factor index of 2 factors of lengths [2, 3]
+        """
+        n = sum(len(F) for F in self._factors.values())
+        return "Factor index of {} factors of lengths {}".format(n, self.lengths())
+
+    def lengths(self):
+        r"""
+        Return the sorted list of the lengths of the factors.
+
+        EXAMPLES::
+
+            sage: from slabbe.bispecial_extension_type import FactorIndex
+            sage: FactorIndex([Word([1,2]), Word([2,2,1])]).lengths()
+            [2, 3]
+        """
+        return sorted(self._factors)
+
+    def prefixes_before(self, u, k):
+        r"""
+        Return the words ``p`` such that ``p*u`` is a factor of length
+        ``k``.
+
+        INPUT:
+
+        - ``u`` -- word
+        - ``k`` -- integer, length of the factors
+
+        EXAMPLES::
+
+            sage: from slabbe.bispecial_extension_type import FactorIndex
+            sage: F = FactorIndex(map(Word, [(1,2,1), (1,2,2), (2,2,1)]))
+            sage: sorted(F.prefixes_before(Word([2,1]), 3))
+            [word: 1, word: 2]
+            sage: sorted(F.prefixes_before(Word([1]), 3))
+            [word: 12, word: 22]
+            sage: F.prefixes_before(Word([1]), 4)
+            []
+        """
+        s = u.length()
+        key = (k, s)
+        if key not in self._ending_with:
+            d = defaultdict(list)
+            for f in self._factors.get(k, []):
+                if s <= k:
+                    d[tuple(f[k-s:])].append(f[:-s])
+            self._ending_with[key] = dict(d)
+        return self._ending_with[key].get(tuple(u), [])
+
+    def suffixes_after(self, u, k):
+        r"""
+        Return the words ``q`` such that ``u*q`` is a factor of length
+        ``k``.
+
+        INPUT:
+
+        - ``u`` -- word
+        - ``k`` -- integer, length of the factors
+
+        EXAMPLES::
+
+            sage: from slabbe.bispecial_extension_type import FactorIndex
+            sage: F = FactorIndex(map(Word, [(1,2,1), (1,2,2), (2,2,1)]))
+            sage: sorted(F.suffixes_after(Word([1,2]), 3))
+            [word: 1, word: 2]
+            sage: sorted(F.suffixes_after(Word([2]), 3))
+            [word: 21]
+        """
+        s = u.length()
+        key = (k, s)
+        if key not in self._starting_with:
+            d = defaultdict(list)
+            for f in self._factors.get(k, []):
+                if s <= k:
+                    d[tuple(f[:s])].append(f[s:])
+            self._starting_with[key] = dict(d)
+        return self._starting_with[key].get(tuple(u), [])
+
+######################################
+# Cache of results on disk
+######################################
+class BispecialCache(object):
+    r"""
+    Cache on disk of the results of the explorations of bispecial
+    extension types.
+
+    Each result is stored in its own file, as a compressed pickle, whose
+    name is a hash of the content of the query: the canonical key and the
+    factor of the extension type, the images of the substitutions, the
+    words of length 2 of the language and the other parameters.
+
+    INPUT:
+
+    - ``directory`` -- string or None (default: ``None``), if None, the
+      directory ``bispecial_extension_type`` of ``DOT_SAGE`` is used
+
+    EXAMPLES::
+
+        sage: from slabbe.bispecial_extension_type import BispecialCache
+        sage: cache = BispecialCache(tmp_dir())
+        sage: cache
+        Bispecial cache of 0 results in ...
+        sage: key = cache.key('test', 3, Word([1,2]))
+        sage: key in cache
+        False
+        sage: cache[key] = [1, 2, 3]
+        sage: key in cache
+        True
+        sage: cache[key]
+        [1, 2, 3]
+        sage: cache.clear()
+        sage: len(cache)
+        0
+    """
+    _extension = '.pickle.gz'
+
+    def __init__(self, directory=None):
+        r"""
+        EXAMPLES::
+
+            sage: from slabbe.bispecial_extension_type import BispecialCache
+            sage: BispecialCache(tmp_dir())
+            Bispecial cache of 0 results in ...
+        """
+        if directory is None:
+            from sage.env import DOT_SAGE
+            directory = os.path.join(DOT_SAGE, 'bispecial_extension_type')
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._directory = directory
+
+    def __repr__(self):
+        r"""
+        EXAMPLES::
+
+            sage: from slabbe.bispecial_extension_type import BispecialCache
+            sage: BispecialCache(tmp_dir())
+            Bispecial cache of 0 results in ...
+        """
+        return "Bispecial cache of {} results in {}".format(len(self),
+                                                            self._directory)
+
+    def __len__(self):
+        r"""
+        EXAMPLES::
+
+            sage: from slabbe.bispecial_extension_type import BispecialCache
+            sage: len(BispecialCache(tmp_dir()))
+            0
+        """
+        return len(self._filenames())
+
+    def _filenames(self):
+        r"""
+        Return the list of the files of the stored results.
+
+        EXAMPLES::
+
+            sage: from slabbe.bispecial_extension_type import BispecialCache
+            sage: BispecialCache(tmp_dir())._filenames()
+            []
+        """
+        return [os.path.join(self._directory, f)
+                for f in os.listdir(self._directory)
+                if f.endswith(self._extension)]
+
+    def _filename(self, key):
+        r"""
+        EXAMPLES::
+
+            sage: from slabbe.bispecial_extension_type import BispecialCache
+            sage: cache = BispecialCache(tmp_dir())
+            sage: cache._filename('abc')
+            '.../abc.pickle.gz'
+        """
+        return os.path.join(self._directory, key + self._extension)
+
+    def key(self, *data):
+        r"""
+        Return the hash of the content of the data.
+
+        INPUT:
+
+        - ``*data`` -- extension types, substitutions, dict, languages,
+          words, tuples, sets, integers or strings
+
+        EXAMPLES::
+
+            sage: from slabbe.bispecial_extension_type import BispecialCache
+            sage: from slabbe.bispecial_extension_type import ExtensionType1to1
+            sage: cache = BispecialCache(tmp_dir())
+            sage: E = ExtensionType1to1([(1,3), (2,3), (3,1), (3,2), (3,3)], [1,2,3])
+            sage: F = ExtensionType1to1([(3,3), (2,3), (3,1), (3,2), (1,3)], [1,2,3])
+            sage: cache.key(E, 4) == cache.key(F, 4)
+            True
+            sage: cache.key(E, 4) == cache.key(E, 5)
+            False
+            sage: len(cache.key(E, 4))
+            40
+        """
+        return cache_key(*data)
+
+    def __contains__(self, key):
+        r"""
+        EXAMPLES::
+
+            sage: from slabbe.bispecial_extension_type import BispecialCache
+            sage: cache = BispecialCache(tmp_dir())
+            sage: 'abc' in cache
+            False
+        """
+        return os.path.exists(self._filename(key))
+
+    def get(self, key, default=None):
+        r"""
+        Return the stored result or ``default`` if there is none.
+
+        EXAMPLES::
+
+            sage: from slabbe.bispecial_extension_type import BispecialCache
+            sage: cache = BispecialCache(tmp_dir())
+            sage: cache.get('abc', 'nothing')
+            'nothing'
+        """
+        if key not in self:
+            return default
+        return self[key]
+
+    def __getitem__(self, key):
+        r"""
+        EXAMPLES::
+
+            sage: from slabbe.bispecial_extension_type import BispecialCache
+            sage: cache = BispecialCache(tmp_dir())
+            sage: cache['abc']
+            Traceback (most recent call last):
+            ...
+            KeyError: 'abc'
+        """
+        import cPickle, zlib
+        if key not in self:
+            raise KeyError(key)
+        with open(self._filename(key), 'rb') as f:
+            return cPickle.loads(zlib.decompress(f.read()))
+
+    def __setitem__(self, key, value):
+        r"""
+        EXAMPLES::
+
+            sage: from slabbe.bispecial_extension_type import BispecialCache
+            sage: cache = BispecialCache(tmp_dir())
+            sage: cache['abc'] = {1:2}
+            sage: cache['abc']
+            {1: 2}
+        """
+        import cPickle, zlib
+        data = zlib.compress(cPickle.dumps(value, protocol=2))
+        filename = self._filename(key)
+        # write in a temporary file first so that a result is never
+        # read partially written
+        tmp = filename + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.rename(tmp, filename)
+
+    def clear(self):
+        r"""
+        Remove all the stored results.
+
+        EXAMPLES::
+
+            sage: from slabbe.bispecial_extension_type import BispecialCache
+            sage: cache = BispecialCache(tmp_dir())
+            sage: cache['abc'] = 3
+            sage: len(cache)
+            1
+            sage: cache.clear()
+            sage: len(cache)
+            0
+        """
+        for filename in self._filenames():
+            os.remove(filename)
+
+def cache_key(*data):
+    r"""
+    Return the hash of the content of the data.
+
+    The keys are the same for a :class:`BispecialCache` on disk or a
+    dict in memory.
+
+    INPUT:
+
+    - ``*data`` -- extension types, substitutions, dict, languages,
+      words, tuples, sets, integers or strings
+
+    EXAMPLES::
+
+        sage: from slabbe.bispecial_extension_type import cache_key
+        sage: len(cache_key('test', 3, Word([1,2])))
+        40
+        sage: cache_key('test', 3, Word([1,2])) == cache_key('test', 3, (1,2))
+        True
+    """
+    import hashlib
+    return hashlib.sha1(repr(content_encoding(data))).hexdigest()
+
+def content_encoding(data):
+    r"""
+    Return an encoding of the content of the data made of tuples,
+    integers and strings.
+
+    INPUT:
+
+    - ``data`` -- extension type, substitution, dict, language, word,
+      tuple, list, set or hashable
+
+    EXAMPLES::
+
+        sage: from slabbe.bispecial_extension_type import content_encoding
+        sage: from slabbe.bispecial_extension_type import ExtensionType1to1
+        sage: E = ExtensionType1to1([(1,3), (2,3), (3,1), (3,2), (3,3)], [1,2,3])
+        sage: content_encoding(E)
+        ('ExtensionType1to1', (484, ((), ()), 0, (1, 2, 3)), ())
+        sage: content_encoding({'b':WordMorphism({1:[1,2],2:[2]}), 'a':3})
+        (('a', 3), ('b', ((1, (1, 2)), (2, (2,)))))
+        sage: content_encoding(set([3,1,2]))
+        (1, 2, 3)
+        sage: from slabbe.language import languages
+        sage: content_encoding(languages.Brun())[1][:3]
+        ((123, 123), (123, 132), (123, 312))
+    """
+    if isinstance(data, ExtensionType):
+        return (data.__class__.__name__,
+                content_encoding(data.canonical_key()),
+                tuple(data.factor()))
+    elif isinstance(data, WordMorphism):
+        return tuple((a, tuple(data(a))) for a in sorted(data.domain().alphabet()))
+    elif isinstance(data, FiniteWord_class):
+        return tuple(data)
+    elif isinstance(data, dict):
+        return tuple(sorted((content_encoding(k), content_encoding(v))
+                            for (k,v) in data.items()))
+    elif isinstance(data, (set, frozenset)):
+        return tuple(sorted(content_encoding(a) for a in data))
+    elif isinstance(data, (tuple, list)):
+        return tuple(content_encoding(a) for a in data)
+    elif hasattr(data, 'words_of_length_iterator'):
+        # only the words of length 2 of a language are used
+        words = data.words_of_length_iterator(2)
+        return ('Language', tuple(sorted(tuple(w) for w in words)))
+    else:
+        return data
+
+######################################
 # methods that should be in Sage
 ######################################
 def longest_common_prefix(L):
@@ -2723,6 +3988,243 @@ def recursively_enumerated_set_to_digraph(R, max_depth=float('inf')):
     E = [(u,v) for u in it for v in successors(u)]
     return DiGraph(E, format='list_of_edges', loops=True, multiedges=True)
 
+######################################
+# Children under a language
+######################################
+def letters_before(language):
+    r"""
+    Return the dictionary of the letters that can go before each letter
+    in the language.
+
+    INPUT:
+
+    - ``language`` -- the language of substitutions
+
+    EXAMPLES::
+
+        sage: from slabbe.bispecial_extension_type import letters_before
+        sage: from slabbe.language import languages
+        sage: D = letters_before(languages.Brun())
+        sage: sorted(D[123])
+        [123, 132, 231]
+    """
+    before = defaultdict(list)
+    for w in language.words_of_length_iterator(2): 
+        before[w[1]].append(w[0])
+    return dict(before)
+
+def children_under_language(E, previous, before, substitutions_dict,
+        keep_empty=False, growth_limit=float('inf')):
+    r"""
+    Return the list of pairs (substitution key, extension type) obtained
+    by applying to ``E`` the substitutions that can go before the
+    ``previous`` one.
+
+    INPUT:
+
+    - ``E`` -- extension type
+    - ``previous`` -- the previous substitution key
+    - ``before`` -- dict, the letters that can go before each letter, see
+      :func:`letters_before`
+    - ``substitutions_dict`` - dict of substitutions
+    - ``keep_empty`` -- (default: False) whether to keep images that
+      are empty
+    - ``growth_limit`` -- integer (default: ``float('inf')``), the
+      maximal growth in length of the bispecial extended images
+
+    EXAMPLES::
+
+        sage: from slabbe.bispecial_extension_type import ExtensionTypeLong
+        sage: from slabbe.bispecial_extension_type import letters_before, children_under_language
+        sage: from slabbe.mult_cont_frac import Brun
+        sage: from slabbe.language import languages
+        sage: S = Brun().substitutions()
+        sage: data = [((2, 1), (2,)), ((3, 1), (2,)), ((2, 2), (3,)), ((1,
+        ....:     2), (1,)), ((1, 2), (2,)), ((1, 2), (3,)), ((2, 3), (1,))]
+        sage: E1 = ExtensionTypeLong(data, (1,2,3))
+        sage: before = letters_before(languages.Brun())
+        sage: L = children_under_language(E1, 123, before, S)
+        sage: all(a in [123, 132, 231] for (a,Z) in L)
+        True
+        sage: len(L) == sum(1 for a in before[123] for Z in E1.apply(S[a])
+        ....:               if not Z.is_empty())
+        True
+    """
+    rep = []
+    for a in before[previous]:
+        for Z in E.apply(substitutions_dict[a], growth_limit=growth_limit):
+            if keep_empty or not Z.is_empty():
+                rep.append((a,Z))
+    return rep
+
+@cached_function
+def apply_tables(alphabet, images, common_suffix, common_prefix):
+    r"""
+    Return the transition tables of a substitution used to compute the
+    images of extension types with bitmasks.
+
+    The left word of the letter `a` is ``common_suffix * m(a)`` and its
+    right word is ``m(a) * common_prefix``. For each length `i`, the left
+    table gives for each left chignon of length `i-1` the mask of the
+    letters whose left word ends with it and the pairs of indices of such
+    a letter and of the letter at position `-i` of its left word. For
+    each length `j`, the right table gives for each right chignon of
+    length `j` the mask of the letters whose right word starts with it
+    and the list mapping each mask of such letters to the mask of the
+    letters at position `j` of their right words.
+
+    INPUT:
+
+    - ``alphabet`` -- tuple of at most 8 letters
+    - ``images`` -- tuple, the images of the letters of the alphabet
+    - ``common_suffix`` -- word, the common suffix of the images
+    - ``common_prefix`` -- word, the common prefix of the images
+
+    OUTPUT:
+
+    pair of lists (left tables, right tables) or None if a letter of
+    an image is not in the alphabet
+
+    EXAMPLES::
+
+        sage: from slabbe.bispecial_extension_type import apply_tables
+        sage: p0 = WordMorphism({1:[1,2,3],2:[2,3],3:[3]})
+        sage: images = tuple(p0(a) for a in (1,2,3))
+        sage: left, right = apply_tables((1,2,3), images, Word([3]), Word())
+        sage: left[1]
+        [(word: 3, 7, [(0, 1), (1, 1), (2, 2)])]
+        sage: [(c, mask, T[7]) for (c, mask, T) in right[0]]
+        [(word: , 7, 7)]
+    """
+    index = dict((a,i) for (i,a) in enumerate(alphabet))
+    if any(b not in index for image in images for b in image):
+        return None
+    n = len(alphabet)
+    lefts = [common_suffix * image for image in images]
+    rights = [image * common_prefix for image in images]
+
+    left_tables = []
+    for i in range(1, max(map(len, lefts))+1):
+        d = {}
+        chignons = []
+        for a,w in enumerate(lefts):
+            if len(w) < i:
+                continue
+            chignon = w[len(w)-i+1:]
+            if chignon not in d:
+                d[chignon] = [0, []]
+                chignons.append(chignon)
+            d[chignon][0] |= 1 << a
+            d[chignon][1].append((a, index[w[-i]]))
+        left_tables.append([(c, d[c][0], d[c][1]) for c in chignons])
+
+    right_tables = []
+    for j in range(max(map(len, rights))):
+        d = {}
+        chignons = []
+        for b,w in enumerate(rights):
+            if len(w) <= j:
+                continue
+            chignon = w[:j]
+            if chignon not in d:
+                d[chignon] = [0, [0]*n]
+                chignons.append(chignon)
+            d[chignon][0] |= 1 << b
+            d[chignon][1][b] = 1 << index[w[j]]
+        table = []
+        for c in chignons:
+            mask, letter_bits = d[c]
+            translation = [0] * (1 << n)
+            for k in range(1, 1 << n):
+                low = k & -k
+                translation[k] = translation[k ^ low] | letter_bits[low.bit_length()-1]
+            table.append((c, mask, translation))
+        right_tables.append(table)
+    return left_tables, right_tables
+
+def apply_with_memo(E, m, memo, growth_limit=float('inf')):
+    r"""
+    Return the images of an extension type under a substitution sharing the
+    computation among the extension types with the same canonical key.
+
+    The images are computed once for each canonical key and substitution,
+    the substitution being indexed by its images. For another extension
+    type with the same canonical key, only the factors of the stored images
+    are updated.
+
+    INPUT:
+
+    - ``E`` -- extension type
+    - ``m`` -- substitution
+    - ``memo`` -- dict, the images already computed
+    - ``growth_limit`` -- integer (default: ``float('inf')``), the
+      maximal growth in length of the bispecial extended images
+
+    EXAMPLES::
+
+        sage: from slabbe import ExtensionType1to1
+        sage: from slabbe.bispecial_extension_type import apply_with_memo
+        sage: L = [(1,2),(2,3),(3,1),(3,2),(3,3)]
+        sage: E = ExtensionType1to1(L, [1,2,3])
+        sage: F = ExtensionType1to1(L, [1,2,3], factor=Word([3,3]))
+        sage: p0 = WordMorphism({1:[1,2,3],2:[2,3],3:[3]})
+        sage: memo = {}
+        sage: [Z.factor() for Z in apply_with_memo(E, p0, memo)]
+        [word: 3, word: 23]
+        sage: [Z.factor() for Z in apply_with_memo(F, p0, memo)]
+        [word: 333, word: 2333]
+        sage: len(memo)
+        1
+        sage: apply_with_memo(F, p0, memo) == F.apply(p0)
+        True
+
+    TESTS:
+
+    The memo may be shared by different substitutions::
+
+        sage: p1 = WordMorphism({1:[1,2],2:[2],3:[3,1,2]})
+        sage: apply_with_memo(F, p1, memo) == F.apply(p1)
+        True
+        sage: len(memo)
+        2
+    """
+    k = (E.canonical_key(), content_encoding(m), growth_limit)
+    images = memo.get(k)
+    if images is None:
+        images = memo[k] = E.apply(m, growth_limit=growth_limit)
+        return images
+    return tuple(Z._image_copy(E, m) for Z in images)
+
+def depth_statistics(depth, extension_types):
+    r"""
+    Return the statistics of a list of extension types.
+
+    INPUT:
+
+    - ``depth`` -- integer
+    - ``extension_types`` -- list of extension types
+
+    EXAMPLES::
+
+        sage: from slabbe import ExtensionType1to1
+        sage: from slabbe.bispecial_extension_type import depth_statistics
+        sage: E = ExtensionType1to1([(1,3), (2,3), (3,1), (3,2), (3,3)], [1,2,3])
+        sage: F = ExtensionType1to1([(1,2), (3,3)], [1,2,3])
+        sage: depth_statistics(4, [E, F, E])
+        DepthStatistics(depth=4, size=3, information=Counter({'ord.': 2, 'weak': 1}),
+        multiplicity=Counter({0: 2, -1: 1}), connected=2)
+    """
+    information = Counter()
+    multiplicity = Counter()
+    connected = 0
+    for E in extension_types:
+        information[E.information()] += 1
+        multiplicity[E.multiplicity()] += 1
+        if E.is_connected_fast():
+            connected += 1
+    return DepthStatistics(depth, len(extension_types), information,
+                           multiplicity, connected)
+
 ######################################
 # Set of extension type of the same age
 ######################################
@@ -2781,12 +4283,16 @@ def remove_extension_types_subsets(extensions):
 
 def rec_enum_set_under_language_joined_from_pairs(pairs, language,
         substitutions_dict, keep_equal_length=False, keep_unique=False,
-        label='history', growth_limit=float('inf'), filter_fn=None):
+        label='history', growth_limit=float('inf'), filter_fn=None,
+        memo=None):
     r"""
     Return the recursively enumerated set of extension type generated
     by a language of substitutions where the extension type of the same
     age and joined.
 
+    The images of the extension types with the same canonical key are
+    computed only once, see :func:`apply_with_memo`.
+
     INPUT:
 
     - ``pairs`` -- list of pairs of (extension type, previous substitution key)
@@ -2802,6 +4308,8 @@ def rec_enum_set_under_language_joined_from_pairs(pairs, language,
     - ``growth_limit`` -- integer (default: ``float('inf')``), the
       maximal growth in length of the bispecial extended images
     - ``filter_fn`` -- function (default: ``None``)
+    - ``memo`` -- dict (default: ``None``), the images already
+      computed, if None, a new dict is used
 
     EXAMPLES::
 
@@ -2884,12 +4392,23 @@ def rec_enum_set_under_language_joined_from_pairs(pairs, language,
         sage: R.to_digraph()                 # long time (15s)
         Looped multi-digraph on 129 vertices
 
+    Sharing the images among two enumerated sets::
+
+        sage: memo = {}
+        sage: R = rec_enum_set_under_language_joined_from_pairs(pairs,
+        ....:    LBrun, S, growth_limit=1, memo=memo)
+        sage: nodes = [V for d in range(3) for V in R.elements_of_depth_iterator(d)]
+        sage: n = len(memo)
+        sage: R = rec_enum_set_under_language_joined_from_pairs(pairs,
+        ....:    LBrun, S, growth_limit=1, memo=memo)
+        sage: nodes == [V for d in range(3) for V in R.elements_of_depth_iterator(d)]
+        True
+        sage: n == len(memo)
+        True
     """
-    # what can go before each letter
-    before = defaultdict(list)
-    for w in language.words_of_length_iterator(2): 
-        before[w[1]].append(w[0])
-    before = dict(before)
+    if memo is None:
+        memo = {}
+    before = letters_before(language)
 
     def child(V):
         ExtIN,w = V
@@ -2897,8 +4416,9 @@ def rec_enum_set_under_language_joined_from_pairs(pairs, language,
         if filter_fn and not filter_fn(ExtIN):
             return rep
         for a in before[w[0]]:
+            m = substitutions_dict[a]
             ExtOUT = [Z for ext in ExtIN 
-                        for Z in ext.apply(substitutions_dict[a], growth_limit=growth_limit)
+                        for Z in apply_with_memo(ext, m, memo, growth_limit)
                         if keep_equal_length or not len(ext.factor())==len(Z.factor())]
             ExtOUT = remove_extension_types_subsets(ExtOUT)
             if keep_unique:
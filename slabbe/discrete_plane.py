@@ -43,7 +43,7 @@ TODO:
 #                  http://www.gnu.org/licenses/
 #*****************************************************************************
 from sage.rings.real_mpfr import RealField
-from sage.functions.other import ceil, sqrt
+from sage.functions.other import ceil, floor, sqrt
 from sage.modules.free_module_element import vector
 from sage.misc.cachefunc import cached_method
 from slabbe.discrete_subset import DiscreteSubset
@@ -154,6 +154,18 @@ class DiscreteHyperplane(DiscreteSubset):
             [(-1, -1, -1)]
             sage: all(p in P for p in P.roots())
             True
+
+        In higher dimension::
+
+            sage: from slabbe import DiscreteHyperplane
+            sage: H = DiscreteHyperplane([2,3,5,7], 7, mu=100)
+            sage: H.roots()
+            [(0, 0, 0, -14)]
+            sage: it = iter(H)
+            sage: next(it)
+            (0, 0, 0, -14)
+            sage: all(next(it) in H for _ in range(100))
+            True
         """
         p = self.an_element()
         p = self._space(p)
@@ -201,6 +213,12 @@ class DiscreteHyperplane(DiscreteSubset):
             sage: L.an_element()
             (0, 0)
 
+        In dimension other than 2 and 3, the inputs ``x`` and ``y`` are
+        ignored::
+
+            sage: H = DiscreteHyperplane([1,sqrt(2),sqrt(3),pi,e], 10, mu=50)
+            sage: H.an_element()
+            (0, 0, 0, -15, 0)
         """
         dimension = len(self._v)
         if dimension == 2:
@@ -208,7 +226,72 @@ class DiscreteHyperplane(DiscreteSubset):
         elif dimension == 3:
             return self._an_element_3d(x=x,y=y)
         else:
-            raise NotImplementedError("implemented only for dimension(=%s) 2 or 3" % dimension)
+            return self._an_element_greedy()
+
+    def _an_element_greedy(self):
+        r"""
+        Returns an element in self found by a greedy descent on the
+        coordinates.
+
+        Starting from the origin, the coordinates are changed one at a
+        time in decreasing order of the absolute value of the entries of
+        the normal vector, each time reducing the value `p \cdot v + \mu`
+        into the interval `[0, |v_i|)`, until it lies in `[0, \omega)`. It
+        always succeeds if `\omega` is at least the smallest nonzero
+        `|v_i|`, in particular for connected discrete hyperplanes.
+
+        EXAMPLES::
+
+            sage: from slabbe import DiscreteHyperplane
+            sage: H = DiscreteHyperplane([1,3,7,9], 20, mu=13)
+            sage: H._an_element_greedy()
+            (0, 0, 0, 0)
+            sage: H = DiscreteHyperplane([2,3,5,7], 7, mu=100)
+            sage: H._an_element_greedy()
+            (0, 0, 0, -14)
+
+        ::
+
+            sage: H = DiscreteHyperplane([1,sqrt(2),sqrt(3),pi,e], 10, mu=50, prec=100)
+            sage: p = H._an_element_greedy()
+            sage: p
+            (0, 0, 0, -15, 0)
+            sage: p in H and p.is_immutable()
+            True
+
+        ::
+
+            sage: H = DiscreteHyperplane([3,-5,7,-11,13], 3, mu=-1000)
+            sage: H._an_element_greedy()
+            (0, 0, 0, 0, 77)
+
+        TESTS::
+
+            sage: H = DiscreteHyperplane([2,4,6,8], 1, mu=1)
+            sage: H._an_element_greedy()
+            Traceback (most recent call last):
+            ...
+            ValueError: unable to find an element in Set of points x in ZZ^4
+            satisfying: 0 <= (2, 4, 6, 8) . x + 1 < 1
+        """
+        RF = RealField(prec=53)
+        dimension = len(self._v)
+        order = sorted(range(dimension), key=lambda i: -abs(RF(self._v[i])))
+        p = self._space(0)
+        value = self._mu
+        for i in order:
+            if 0 <= value < self._omega:
+                break
+            a = self._v[i]
+            if a == 0:
+                continue
+            x = ceil(-value / a) if a > 0 else floor(-value / a)
+            p[i] = x
+            value += x * a
+        if not p in self:
+            raise ValueError("unable to find an element in {}".format(self))
+        p.set_immutable()
+        return p
 
     def _an_element_3d(self, x=0, y=0):
         r"""
@@ -235,22 +318,12 @@ class DiscreteHyperplane(DiscreteSubset):
         #print xnew, ynew, znew
         #print vector((xnew, ynew, znew)) in self
         #print vector((x,y,ceil(right)-1)) in self
-        v = vector((xnew, ynew, znew))
-        if v in self:
-            v.set_immutable()
-            return v
-        else:
-            print "%s not in the plane" % v
-            print "trying similar points"
-            v = vector((xnew, ynew, znew-1))
-            if v in self:
-                v.set_immutable()
-                return v
-            v = vector((xnew, ynew, znew+1))
+        for z in [znew, znew-1, znew+1]:
+            v = vector((xnew, ynew, z))
             if v in self:
                 v.set_immutable()
                 return v
-        raise ValueError("%s not in the plane" % v)
+        return self._an_element_greedy()
 
         # minimum = - floor(self._mu)
         # maximum = ceil(self._omega - self._mu) - 1
@@ -110,6 +110,7 @@ TODO:
 #                  http://www.gnu.org/licenses/
 #*****************************************************************************
 import itertools
+import heapq
 from copy import copy
 from sage.functions.other import sqrt
 from sage.matrix.constructor import matrix
@@ -131,6 +132,7 @@ from sage.plot.line import line
 from sage.plot.text import text
 from sage.plot.plot3d.platonic import cube
 from slabbe.tikz_picture import TikzPicture
+from slabbe.lru_cache import LRUCache
 
 sqrt2 = sqrt(2)
 sqrt3 = sqrt(3)
@@ -164,6 +166,205 @@ def convex_boundary(L):
     #assert isinstance(good, sage.plot.polygon.Polygon), "good not polygon"
     #return zip(good.xdata, good.ydata)
 ################################################
+# Batch TikZ output
+################################################
+def _batches(iterable, size):
+    r"""
+    Return an iterator over the lists of ``size`` consecutive elements of
+    an iterable (the last one may be shorter).
+
+    EXAMPLES::
+
+        sage: from slabbe.discrete_subset import _batches
+        sage: list(_batches(range(7), 3))
+        [[0, 1, 2], [3, 4, 5], [6]]
+    """
+    it = iter(iterable)
+    while True:
+        batch = list(itertools.islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+def projected_coordinates(points, projmat=None):
+    r"""
+    Return the tikz coordinates of a list of points after projection.
+
+    The projection of all points is done with a single numpy matrix
+    product instead of one Sage matrix-vector product per point.
+
+    INPUT:
+
+    - ``points`` -- list of points of the same dimension
+    - ``projmat`` -- matrix (default: ``None``), projection matrix, if
+      None, no projection is done.
+
+    OUTPUT:
+
+        list of strings
+
+    EXAMPLES::
+
+        sage: from slabbe.discrete_subset import projected_coordinates, M3to2
+        sage: L = [vector((0,0,0)), vector((1,0,0)), vector((0,1,1))]
+        sage: projected_coordinates(L)
+        ['(0, 0, 0)', '(1, 0, 0)', '(0, 1, 1)']
+        sage: projected_coordinates(L, M3to2)
+        ['(0.00000, 0.00000)', '(-0.86603, -0.50000)', '(0.86603, 0.50000)']
+        sage: projected_coordinates([], M3to2)
+        []
+    """
+    if projmat is None:
+        return ["(%s)" % ", ".join(map(str, p)) for p in points]
+    if not points:
+        return []
+    import numpy
+    A = numpy.array(points, dtype=float)
+    M = numpy.array(projmat, dtype=float)
+    B = A.dot(M.T)
+    # adding 0.0 turns negative zeros into zeros
+    B += 0.0
+    return ["(%s)" % ", ".join("%.5f" % a for a in row) for row in B]
+
+def merge_collinear_edges(edges, color=None):
+    r"""
+    Merge consecutive unit edges lying on the same line.
+
+    The edges must be pairs of points `(p, p+e_i)` where `e_i` is a
+    canonical vector, as returned by ``DiscreteSubset.edges_iterator``. Only
+    edges of the same color are merged. All the edges are loaded in memory.
+
+    INPUT:
+
+    - ``edges`` -- iterable of edges
+    - ``color`` -- function (default: ``None``), (u,v) -> color of the
+      edge (u,v)
+
+    OUTPUT:
+
+        iterator of triples (start, end, color)
+
+    EXAMPLES::
+
+        sage: from slabbe.discrete_subset import merge_collinear_edges
+        sage: V = FreeModule(ZZ, 2)
+        sage: E = [((0,0),(1,0)), ((1,0),(2,0)), ((3,0),(4,0)), ((0,0),(0,1))]
+        sage: E = [(V(p),V(q)) for (p,q) in E]
+        sage: sorted(merge_collinear_edges(E))
+        [((0, 0), (0, 1), None), ((0, 0), (2, 0), None), ((3, 0), (4, 0), None)]
+
+    ::
+
+        sage: c = lambda u,v: 'red' if u[0] == 0 else 'blue'
+        sage: sorted(merge_collinear_edges(E, color=c))
+        [((0, 0), (0, 1), 'red'),
+         ((0, 0), (1, 0), 'red'),
+         ((1, 0), (2, 0), 'blue'),
+         ((3, 0), (4, 0), 'blue')]
+    """
+    lines = {}
+    for (p, q) in edges:
+        c = None if color is None else color(p, q)
+        i = next(j for j,(a,b) in enumerate(itertools.izip(p, q)) if a != b)
+        key = (i, tuple(p[:i]), tuple(p[i+1:]), c)
+        lines.setdefault(key, []).append(p[i])
+    for key in sorted(lines):
+        i, before, after, c = key
+        L = sorted(lines[key])
+        start = L[0]
+        for a, b in itertools.izip(L, L[1:] + [None]):
+            if b != a + 1:
+                p = vector(before + (start,) + after)
+                q = vector(before + (a+1,) + after)
+                yield (p, q, c)
+                start = b
+
+################################################
+# Bounded membership cache
+################################################
+class MembershipCache(LRUCache):
+    r"""
+    Least recently used cache for the values of a membership predicate.
+
+    Points are keyed by the tuple of their coordinates, so that tuples,
+    mutable and immutable vectors share the same entry.
+
+    INPUT:
+
+    - ``maxsize`` -- positive integer (default: ``2^16``), maximal number of
+      points kept in the cache
+
+    EXAMPLES::
+
+        sage: from slabbe.discrete_subset import MembershipCache
+        sage: cache = MembershipCache(maxsize=2)
+        sage: predicate = lambda p: sum(p) > 0
+        sage: cache(predicate, (1,0))
+        True
+        sage: cache(predicate, vector((1,0)))
+        True
+        sage: cache(predicate, (-1,0))
+        False
+        sage: cache.info()
+        CacheInfo(hits=1, misses=2, maxsize=2, currsize=2)
+
+    The least recently used point is discarded first::
+
+        sage: cache(predicate, (0,3))
+        True
+        sage: sorted(cache._data)
+        [(-1, 0), (0, 3)]
+
+    TESTS::
+
+        sage: MembershipCache(0)
+        Traceback (most recent call last):
+        ...
+        ValueError: maxsize (=0) must be positive
+    """
+    def __init__(self, maxsize=2**16):
+        r"""
+        Constructor.
+
+        EXAMPLES::
+
+            sage: from slabbe.discrete_subset import MembershipCache
+            sage: MembershipCache(10).info()
+            CacheInfo(hits=0, misses=0, maxsize=10, currsize=0)
+        """
+        LRUCache.__init__(self, maxsize)
+
+    def __call__(self, predicate, p):
+        r"""
+        Return ``predicate(p)``, computing it only if ``p`` is not in the
+        cache.
+
+        INPUT:
+
+        - ``predicate`` -- function ZZ^d -> {False, True}
+        - ``p`` -- point in the space
+
+        EXAMPLES::
+
+            sage: from slabbe.discrete_subset import MembershipCache
+            sage: cache = MembershipCache()
+            sage: cache(lambda p: p[0] == 0, (0,4))
+            True
+            sage: _ = [cache(lambda p:True, (i%3,)) for i in range(10)]
+            sage: cache.info()
+            CacheInfo(hits=7, misses=4, maxsize=65536, currsize=4)
+        """
+        key = tuple(p)
+        value = self._get(key)
+        if value is None:
+            self._counters['misses'] += 1
+            value = predicate(p)
+            self._store(key, value)
+        else:
+            self._counters['hits'] += 1
+        return value
+
+################################################
 # Discret subsets of ZZ^d
 ################################################
 class DiscreteSubset(SageObject):
@@ -255,9 +456,12 @@ class DiscreteSubset(SageObject):
             self._predicate = predicate
         if edge_predicate is None:
             self._edge_predicate = lambda p,s: p in self and s in self
+            self._default_edges = True
         else:
             self._edge_predicate = edge_predicate
+            self._default_edges = False
         self._iterator = iterator
+        self._membership_cache = None
         if roots is None:
             self._roots = None
         else:
@@ -433,7 +637,94 @@ class DiscreteSubset(SageObject):
             sage: vector((1,2,2)) in p
             False
         """
-        return self._predicate(p)
+        if self._membership_cache is None:
+            return self._predicate(p)
+        return self._membership_cache(self._predicate, p)
+
+    def enable_membership_cache(self, maxsize=2**16):
+        r"""
+        Cache the result of ``p in self`` for the most recently tested
+        points.
+
+        This is useful when the predicate is expensive (for instance a
+        discrete hyperplane with high precision real numbers) since the
+        methods ``children``, ``d_neighbors``, ``edges_iterator`` and
+        ``has_edge`` test the same points many times during a traversal.
+
+        INPUT:
+
+        - ``maxsize`` -- positive integer (default: ``2^16``), maximal
+          number of points kept in the cache
+
+        EXAMPLES::
+
+            sage: from slabbe import DiscretePlane
+            sage: P = DiscretePlane([1,pi,7], 1+pi+7, mu=0, prec=200)
+            sage: P.enable_membership_cache(maxsize=1000)
+            sage: it = iter(P)
+            sage: [next(it) for _ in range(5)]
+            [(0, 0, 0), (1, 0, 0), (0, 1, 0), (0, 0, 1), (-1, 1, 0)]
+
+        The predicate is evaluated fewer times than the number of
+        membership tests::
+
+            sage: P = DiscretePlane([1,pi,7], 1+pi+7, mu=0, prec=200)
+            sage: P.enable_membership_cache(maxsize=1000)
+            sage: it = P.edges_iterator()
+            sage: _ = [next(it) for _ in range(10)]
+            sage: info = P.membership_cache_info()
+            sage: info.hits > 0
+            True
+            sage: info.currsize == info.misses
+            True
+
+        Enabling it again resets the cache::
+
+            sage: P.enable_membership_cache(maxsize=10)
+            sage: P.membership_cache_info()
+            CacheInfo(hits=0, misses=0, maxsize=10, currsize=0)
+        """
+        self._membership_cache = MembershipCache(maxsize)
+
+    def disable_membership_cache(self):
+        r"""
+        Stop caching the membership tests and free the cache.
+
+        EXAMPLES::
+
+            sage: from slabbe import DiscreteSubset
+            sage: D = DiscreteSubset(dimension=2)
+            sage: D.enable_membership_cache()
+            sage: D.disable_membership_cache()
+            sage: D.membership_cache_info() is None
+            True
+        """
+        self._membership_cache = None
+
+    def membership_cache_info(self):
+        r"""
+        Return the statistics of the membership cache.
+
+        OUTPUT:
+
+            named tuple ``(hits, misses, maxsize, currsize)`` or ``None``
+            if the cache is not enabled
+
+        EXAMPLES::
+
+            sage: from slabbe import DiscreteSubset
+            sage: D = DiscreteSubset(dimension=2)
+            sage: D.membership_cache_info() is None
+            True
+            sage: D.enable_membership_cache(maxsize=10)
+            sage: (0,0) in D, (0,0) in D, vector((0,0)) in D
+            (True, True, True)
+            sage: D.membership_cache_info()
+            CacheInfo(hits=2, misses=1, maxsize=10, currsize=1)
+        """
+        if self._membership_cache is None:
+            return None
+        return self._membership_cache.info()
 
     def has_edge(self, p, s):
         r"""
@@ -782,6 +1073,182 @@ class DiscreteSubset(SageObject):
         t = RecursivelyEnumeratedSet(seeds=roots, successors=self.children, structure='symmetric')
         return t.graded_component_iterator()
 
+    def has_level_value(self):
+        r"""
+        Return whether self has a method ``level_value``.
+
+        EXAMPLES::
+
+            sage: from slabbe import DiscreteSubset, DiscretePlane
+            sage: DiscreteSubset(dimension=2).has_level_value()
+            False
+            sage: DiscretePlane([1,3,7], 11).has_level_value()
+            True
+        """
+        return hasattr(self, 'level_value')
+
+    def level_set_iterator(self, level_value=None, stop=None, max_descent=None):
+        r"""
+        Return an iterator over the level sets of self in increasing order
+        of level value.
+
+        Contrary to :meth:`level_iterator` which grades the points by their
+        distance to the roots, the points are graded by the value of a
+        function (typically a linear form). Each point is visited once and
+        put in a bucket indexed by its level value. The buckets are
+        expanded in increasing order of level value and the children of a
+        point may be of any level value.
+
+        A level is yielded only when no point remaining in a bucket can
+        still add a point to it. If ``max_descent`` is ``None``, this is
+        known only after all points were visited, hence self must be
+        finite. Otherwise, every point `p` of self must be reachable from
+        the roots by a path whose points have level value at most the level
+        value of `p` plus ``max_descent``. Then the levels are yielded as
+        soon as they are smaller than the smallest level value of the
+        buckets minus ``max_descent`` and self may be infinite if its levels
+        are finite.
+
+        INPUT:
+
+        - ``level_value`` -- function (default: ``None``), ZZ^d -> level
+          value, if None, the method ``level_value`` of self is used
+        - ``stop`` -- integer (default: ``None``), number of levels after
+          which to stop, if None, all levels are returned
+        - ``max_descent`` -- number (default: ``None``), bound on the
+          descent of the level value along the paths from the roots
+          described above, if None, self must be finite
+
+        OUTPUT:
+
+            iterator of pairs (level value, list of points)
+
+        EXAMPLES::
+
+            sage: from slabbe import ChristoffelGraph, DiscreteBox
+            sage: C = ChristoffelGraph((2,5))
+            sage: b = DiscreteBox([0,2],[0,2])
+            sage: I = C & b
+            sage: for (level, L) in I.level_set_iterator(): print level, sorted(L)
+            0 [(0, 0), (1, 1), (2, 2)]
+            2 [(1, 0), (2, 1)]
+            3 [(0, 2)]
+            4 [(2, 0)]
+            5 [(0, 1), (1, 2)]
+
+        Stopping after two levels::
+
+            sage: for (level, L) in I.level_set_iterator(stop=2): print level, sorted(L)
+            0 [(0, 0), (1, 1), (2, 2)]
+            2 [(1, 0), (2, 1)]
+
+        Using another function::
+
+            sage: it = b.level_set_iterator(level_value=sum)
+            sage: [(level, len(L)) for (level, L) in it]
+            [(0, 1), (1, 2), (2, 3), (3, 2), (4, 1)]
+
+        The set may be infinite if the descent of the level value is
+        bounded::
+
+            sage: from slabbe import DiscretePlane
+            sage: P = DiscretePlane([1,3,7], 11)
+            sage: norm = lambda p: sum(abs(a) for a in p)
+            sage: it = P.level_set_iterator(norm, stop=3, max_descent=0)
+            sage: for (level, L) in it: print level, sorted(L)
+            0 [(0, 0, 0)]
+            1 [(0, 0, 1), (0, 1, 0), (1, 0, 0)]
+            2 [(-1, 0, 1), (-1, 1, 0), (0, -1, 1), (0, 1, 1), (0, 2, 0), (1, 0, 1), (1, 1, 0), (2, 0, 0)]
+
+        ::
+
+            sage: from slabbe import DiscreteSubset
+            sage: D = DiscreteSubset(dimension=2)
+            sage: norm = lambda p: abs(p[0]) + abs(p[1])
+            sage: it = D.level_set_iterator(norm, stop=3, max_descent=0)
+            sage: for (level, L) in it: print level, sorted(L)
+            0 [(0, 0)]
+            1 [(-1, 0), (0, -1), (0, 1), (1, 0)]
+            2 [(-2, 0), (-1, -1), (-1, 1), (0, -2), (0, 2), (1, -1), (1, 1), (2, 0)]
+
+        TESTS::
+
+            sage: D = DiscreteSubset.from_subset([(0,0)])
+            sage: list(D.level_set_iterator())
+            Traceback (most recent call last):
+            ...
+            ValueError: a level_value function must be provided
+            sage: list((b & b).level_set_iterator())
+            Traceback (most recent call last):
+            ...
+            ValueError: a level_value function must be provided
+
+        The level value of the Christoffel window descends along the paths
+        from the roots::
+
+            sage: list(I.level_set_iterator(max_descent=0))
+            Traceback (most recent call last):
+            ...
+            ValueError: the point (1, 1) of level value 0 is reached after yielding the level value 0, max_descent (=0) is too small
+        """
+        if level_value is None:
+            if not self.has_level_value():
+                raise ValueError("a level_value function must be provided")
+            level_value = self.level_value
+        if stop is not None and stop <= 0:
+            return
+        seen = set()
+        buckets = {}
+        pending = []     # heap of the level values of the buckets
+        visited = {}
+        finished = []    # heap of the level values visited and not yielded
+        last = None
+        n = 0
+        for p in self.roots():
+            if p in seen:
+                continue
+            seen.add(p)
+            level = level_value(p)
+            if level not in buckets:
+                buckets[level] = []
+                heapq.heappush(pending, level)
+            buckets[level].append(p)
+        while pending:
+            level = heapq.heappop(pending)
+            L = buckets.pop(level)
+            i = 0
+            while i < len(L):
+                p = L[i]
+                i += 1
+                for q in self.children(p):
+                    if q in seen:
+                        continue
+                    seen.add(q)
+                    q_level = level_value(q)
+                    if last is not None and q_level <= last:
+                        raise ValueError("the point {} of level value {} is "
+                                "reached after yielding the level value {}, "
+                                "max_descent (={}) is too small".format(q,
+                                    q_level, last, max_descent))
+                    if q_level == level:
+                        L.append(q)
+                    elif q_level in buckets:
+                        buckets[q_level].append(q)
+                    else:
+                        buckets[q_level] = [q]
+                        heapq.heappush(pending, q_level)
+            if level not in visited:
+                visited[level] = []
+                heapq.heappush(finished, level)
+            visited[level].extend(L)
+            while finished and (not pending or (max_descent is not None
+                                and finished[0] < pending[0] - max_descent)):
+                last = heapq.heappop(finished)
+                yield last, visited.pop(last)
+                n += 1
+                if n == stop:
+                    return
+
     def edges_iterator(self):
         r"""
         Returns an iterator over the pair of points in self that are
@@ -819,6 +1286,145 @@ class DiscreteSubset(SageObject):
                 if self.has_edge(s, p):
                     yield (s, p)
 
+    def has_default_edges(self):
+        r"""
+        Return whether the edges of self are all the pairs of points of
+        self whose difference is a canonical vector.
+
+        EXAMPLES::
+
+            sage: from slabbe import DiscreteSubset, DiscreteBox, ChristoffelGraph
+            sage: DiscreteSubset(dimension=2).has_default_edges()
+            True
+            sage: C = ChristoffelGraph((2,5))
+            sage: C.has_default_edges()
+            False
+            sage: b = DiscreteBox([-5,5],[-5,5])
+            sage: (b & b).has_default_edges()
+            True
+            sage: (b & C).has_default_edges()
+            False
+        """
+        return self._default_edges
+
+    def to_csr(self, box=None):
+        r"""
+        Return the points of self and the adjacency matrix of its edges
+        in compressed sparse row format.
+
+        The neighbors of all the points are found at once with numpy using
+        a sorted array of integer keys encoding the points. The predicate
+        ``has_edge`` is called on each candidate edge only if the edges of
+        self are not the default ones (see :meth:`has_default_edges`).
+
+        INPUT:
+
+        - ``box`` -- DiscreteBox, list of intervals or ``None`` (default:
+          ``None``), if not None, the intersection of self with the box is
+          considered, otherwise self must be finite
+
+        OUTPUT:
+
+            tuple (numpy array of the points of shape (n,d), symmetric
+            scipy csr matrix of shape (n,n))
+
+        EXAMPLES::
+
+            sage: from slabbe import DiscreteBox
+            sage: b = DiscreteBox([-1,1],[-1,1])
+            sage: points, A = b.to_csr()
+            sage: points.shape
+            (9, 2)
+            sage: A.nnz
+            24
+            sage: (A - A.T).nnz
+            0
+            sage: from scipy.sparse.csgraph import connected_components
+            sage: connected_components(A)[0]
+            1
+
+        The edge predicate is respected::
+
+            sage: from slabbe import ChristoffelGraph
+            sage: C = ChristoffelGraph((2,5))
+            sage: points, A = C.to_csr(box=[[-5,5],[-5,5]])
+            sage: points.shape
+            (121, 2)
+            sage: I = C & DiscreteBox([-5,5],[-5,5])
+            sage: A.nnz == 2 * len(list(I.edges_iterator()))
+            True
+
+        The points are in the order of the iteration::
+
+            sage: from slabbe import DiscretePlane
+            sage: P = DiscretePlane([2,3,5], 4)
+            sage: points, A = P.to_csr()
+            sage: points
+            array([[ 0,  0,  0],
+                   [ 1,  0,  0],
+                   [ 0,  1,  0],
+                   [-1,  1,  0]])
+            sage: A.toarray()
+            array([[0, 1, 1, 0],
+                   [1, 0, 0, 0],
+                   [1, 0, 0, 1],
+                   [0, 0, 1, 0]]...)
+
+        TESTS::
+
+            sage: from slabbe import DiscreteSubset
+            sage: points, A = DiscreteSubset.from_subset([]).to_csr()
+            sage: points.shape, A.shape
+            ((0, 3), (0, 0))
+        """
+        import numpy
+        from scipy.sparse import csr_matrix
+        if box is None:
+            S = self
+        elif isinstance(box, DiscreteSubset):
+            S = self & box
+        else:
+            S = self & DiscreteBox(*box)
+        d = self.dimension()
+        L = list(S)
+        n = len(L)
+        points = numpy.array(L, dtype=numpy.int64).reshape(n, d)
+        rows = []
+        cols = []
+        if n > 0:
+            # encode the points (and their neighbors) by integer keys
+            shift = points.min(axis=0) - 1
+            spans = points.max(axis=0) - shift + 2
+            if numpy.prod(spans.astype(float)) >= 2**62:
+                raise OverflowError("the bounding box of self is too large")
+            strides = numpy.ones(d, dtype=numpy.int64)
+            for i in range(d-1):
+                strides[i+1] = strides[i] * spans[i]
+            keys = (points - shift).dot(strides)
+            order = numpy.argsort(keys)
+            sorted_keys = keys[order]
+            indices = numpy.arange(n)
+            for i in range(d):
+                neighbor_keys = keys + strides[i]
+                pos = numpy.searchsorted(sorted_keys, neighbor_keys)
+                pos[pos == n] = 0
+                found = sorted_keys[pos] == neighbor_keys
+                source = indices[found]
+                target = order[pos[found]]
+                if not S.has_default_edges():
+                    keep = [S.has_edge(L[a], L[b]) for (a,b) in itertools.izip(source, target)]
+                    keep = numpy.array(keep, dtype=bool)
+                    source = source[keep]
+                    target = target[keep]
+                rows.append(source)
+                cols.append(target)
+        rows = numpy.concatenate(rows + [numpy.zeros(0, dtype=numpy.int64)])
+        cols = numpy.concatenate(cols + [numpy.zeros(0, dtype=numpy.int64)])
+        data = numpy.ones(2*len(rows), dtype=numpy.int8)
+        A = csr_matrix((data, (numpy.concatenate((rows, cols)),
+                               numpy.concatenate((cols, rows)))), shape=(n, n))
+        return points, A
+
     def projection_matrix(self, m='isometric', oblique=None):
         r"""
         Return a projection matrix.
@@ -1202,7 +1808,8 @@ class DiscreteSubset(SageObject):
             raise ValueError("this method is currently implemented only for "
                              "objects living in 2 or 3 dimensions")
 
-    def tikz_edges(self, style='very thick', color='blue', projmat=None):
+    def tikz_edges(self, style='very thick', color='blue', projmat=None,
+            merge_collinear=False):
         r"""
         Returns the mesh of the object. The mesh is the union of segments
         joining two adjacents points.
@@ -1214,6 +1821,9 @@ class DiscreteSubset(SageObject):
           of all edges or a function : (u,v) -> color of the edge (u,v)
         - ``projmat`` - matrix (default: ``None``), projection matrix, if
           None, no projection is done.
+        - ``merge_collinear`` - bool (default: ``False``), whether to merge
+          consecutive edges of the same color lying on the same line into
+          one segment
 
         EXAMPLES::
 
@@ -1247,21 +1857,82 @@ class DiscreteSubset(SageObject):
             \draw[very thick, blue] (0.00000, 0.00000) -- (0.86603, -0.50000);
             \draw[very thick, blue] (1.73205, 0.00000) -- (0.86603, -0.50000);
 
+        Merging collinear edges::
+
+            sage: from slabbe import DiscreteBox
+            sage: b = DiscreteBox([0,2],[0,1])
+            sage: b.tikz_edges(merge_collinear=True)
+            \draw[very thick, blue] (0, 0) -- (2, 0);
+            \draw[very thick, blue] (0, 1) -- (2, 1);
+            \draw[very thick, blue] (0, 0) -- (0, 1);
+            \draw[very thick, blue] (1, 0) -- (1, 1);
+            \draw[very thick, blue] (2, 0) -- (2, 1);
+        """
+        lines = self._tikz_edges_lines(style=style, color=color,
+                projmat=projmat, merge_collinear=merge_collinear)
+        return LatexExpr(''.join(lines))
+
+    def _tikz_edges_lines(self, style='very thick', color='blue',
+            projmat=None, merge_collinear=False, names=None,
+            batch_size=10000):
+        r"""
+        Return an iterator over the lines of tikz code of the edges.
+
+        The edges are projected by batches using numpy.
+
+        INPUT:
+
+        - ``style`` - string (default: ``'very thick'``)
+        - ``color`` - string or callable (default: ``'blue'``), the color
+          of all edges or a function : (u,v) -> color of the edge (u,v)
+        - ``projmat`` - matrix (default: ``None``), projection matrix, if
+          None, no projection is done.
+        - ``merge_collinear`` - bool (default: ``False``), whether to merge
+          collinear edges
+        - ``names`` - dict (default: ``None``), if not None, each distinct
+          coordinate is defined once as a named tikz coordinate and the
+          dict (coordinate -> name) is updated
+        - ``batch_size`` - integer (default: ``10000``)
+
+        EXAMPLES::
+
+            sage: from slabbe import DiscretePlane
+            sage: p = DiscretePlane([2,3,5], 4)
+            sage: names = {}
+            sage: for line in p._tikz_edges_lines(names=names): print line,
+            \coordinate (p0) at (0, 0, 0);
+            \coordinate (p1) at (1, 0, 0);
+            \draw[very thick, blue] (p0) -- (p1);
+            \coordinate (p2) at (0, 1, 0);
+            \draw[very thick, blue] (p0) -- (p2);
+            \coordinate (p3) at (-1, 1, 0);
+            \draw[very thick, blue] (p3) -- (p2);
+            sage: sorted(names.values())
+            ['(p0)', '(p1)', '(p2)', '(p3)']
         """
-        s = ''
         if isinstance(color, str):
             color_f = lambda u,v: color
         else:
             color_f = color
-        for (p, q) in self.edges_iterator():
-            c = color_f(p,q)
-            if projmat:
-                p = projmat * p
-                q = projmat * q
-                p = "(" + ", ".join("%.5f" % a for a in p) + ")"
-                q = "(" + ", ".join("%.5f" % a for a in q) + ")"
-            s += "\\draw[%s, %s] %s -- %s;\n" % (style, c,  p, q)
-        return LatexExpr(s)
+        if merge_collinear:
+            edges = merge_collinear_edges(self.edges_iterator(), color_f)
+        else:
+            edges = ((p, q, color_f(p,q)) for (p, q) in self.edges_iterator())
+        for batch in _batches(edges, batch_size):
+            n = len(batch)
+            points = [p for (p,q,c) in batch] + [q for (p,q,c) in batch]
+            coords = projected_coordinates(points, projmat)
+            for i, (_, _, c) in enumerate(batch):
+                a = coords[i]
+                b = coords[n+i]
+                if names is not None:
+                    for x in (a, b):
+                        if x not in names:
+                            names[x] = "(p%s)" % len(names)
+                            yield "\\coordinate %s at %s;\n" % (names[x], x)
+                    a = names[a]
+                    b = names[b]
+                yield "\\draw[%s, %s] %s -- %s;\n" % (style, c, a, b)
 
     def tikz_points(self, size='0.8mm', label=None, label_pos='right',
             fill='black', options="", filter=None,
@@ -1330,25 +2001,54 @@ class DiscreteSubset(SageObject):
             \node[circle,fill=black,draw=black,minimum size=0.8mm,inner sep=0pt,] at (1, -1, 1) {};
             \node[circle,fill=black,draw=black,minimum size=0.8mm,inner sep=0pt,] at (2, 0, 1) {};
         """
+        lines = self._tikz_points_lines(size=size, label=label,
+                label_pos=label_pos, fill=fill, options=options,
+                filter=filter, projmat=projmat)
+        return LatexExpr(''.join(lines))
+
+    def _tikz_points_lines(self, size='0.8mm', label=None, label_pos='right',
+            fill='black', options="", filter=None, projmat=None, names=None,
+            batch_size=10000):
+        r"""
+        Return an iterator over the lines of tikz code of the points.
+
+        The points are projected by batches using numpy.
+
+        INPUT:
+
+        See :meth:`tikz_points` for the first inputs.
+
+        - ``names`` - dict (default: ``None``), if not None, points whose
+          coordinate is in the dict (coordinate -> name) are drawn at the
+          named coordinate and points having the same coordinate as a
+          previous one are not drawn
+        - ``batch_size`` - integer (default: ``10000``)
+
+        EXAMPLES::
+
+            sage: from slabbe import DiscreteSubset
+            sage: s = DiscreteSubset.from_subset([(0,0,0), (1,1,1)])
+            sage: names = {'(0.00000, 0.00000)':'(p0)'}
+            sage: it = s._tikz_points_lines(projmat=matrix(2,[1,-1,0,0,1,-1]), names=names)
+            sage: for line in it: print line,
+            \node[circle,fill=black,draw=black,minimum size=0.8mm,inner sep=0pt,] at (p0) {};
+        """
         it = iter(self)
         if filter:
             it = itertools.ifilter(filter, it)
-        s = ''
-        if projmat:
-            for pt in it:
-                pt2d = projmat * pt
-                pt2d = "(%.5f, %.5f)" % tuple(pt2d)
-                s += '\\node[circle,fill=%s,draw=black,' % fill
-                s += 'minimum size=%s,inner sep=0pt,%s] at %s {};\n' % (size, options, pt2d)
-                if label:
-                    s += '\\node[%s] at %s {$%s$};\n' % (label_pos, pt2d, label(pt))
-        else:
-            for pt in it:
-                s += '\\node[circle,fill=%s,draw=black,' % fill
-                s += 'minimum size=%s,inner sep=0pt,%s] at %s {};\n' % (size, options, pt)
+        drawn = set()
+        for batch in _batches(it, batch_size):
+            coords = projected_coordinates(batch, projmat)
+            for pt, x in itertools.izip(batch, coords):
+                if names is not None:
+                    if x in drawn and not label:
+                        continue
+                    drawn.add(x)
+                    x = names.get(x, x)
+                yield ('\\node[circle,fill=%s,draw=black,minimum size=%s,'
+                       'inner sep=0pt,%s] at %s {};\n' % (fill, size, options, x))
                 if label:
-                    s += '\\node[%s] at %s {$%s$};\n' % (label_pos, pt, label(pt))
-        return LatexExpr(s)
+                    yield '\\node[%s] at %s {$%s$};\n' % (label_pos, x, label(pt))
 
     def tikz_noprojection(self, projmat=None, scale=1, clip=[], edges=True,
             points=True, axes=False, point_kwds={}, edge_kwds={}, axes_kwds={}, extra_code=''):
@@ -1530,6 +2230,120 @@ class DiscreteSubset(SageObject):
         s += '\\end{tikzpicture}\n'
         return TikzPicture(s)
 
+    def tikz_to_file(self, filename, projmat=M3to2, scale=1, edges=True,
+            points=True, merge_collinear=False, dedup=False, point_kwds={},
+            edge_kwds={}, extra_code='', buffering=2**20):
+        r"""
+        Write the tikz code of self into a standalone latex file.
+
+        Contrary to :meth:`tikz`, the code is never built as one string in
+        memory: the edges and points are projected by batches using numpy
+        and the lines are written through a buffered file.
+
+        INPUT:
+
+        - ``filename`` -- string, the output filename
+        - ``projmat`` -- (default: M3to2) 2 x dim projection matrix where
+          dim is the dimension of self, if None, no projection is done
+        - ``scale`` -- real number (default: 1), scaling constant for the
+          whole figure
+        - ``edges`` - bool (default: ``True``), whether to draw edges
+        - ``points`` - bool (default: ``True``), whether to draw points
+        - ``merge_collinear`` - bool (default: ``False``), whether to merge
+          consecutive edges of the same color lying on the same line into
+          one segment
+        - ``dedup`` - bool (default: ``False``), whether to define each
+          distinct coordinate only once (as a named tikz coordinate) and
+          to draw only once the points having the same projection
+        - ``point_kwds`` - dict (default: ``{}``)
+        - ``edge_kwds`` - dict (default: ``{}``)
+        - ``extra_code`` -- string (default: ``''``), extra tikz code to add
+        - ``buffering`` -- integer (default: ``2^20``), size of the buffer
+          of the file
+
+        OUTPUT:
+
+            string, the filename
+
+        EXAMPLES::
+
+            sage: from slabbe import DiscretePlane
+            sage: from sage.misc.temporary_file import tmp_filename
+            sage: p = DiscretePlane([2,3,5], 4)
+            sage: filename = tmp_filename('tikz_', '.tex')
+            sage: _ = p.tikz_to_file(filename)
+            sage: print open(filename).read()
+            \documentclass[tikz]{standalone}
+            \usepackage{amsmath}
+            \begin{document}
+            \begin{tikzpicture}
+            [scale=1]
+            \draw[very thick, blue] (0.00000, 0.00000) -- (-0.86603, -0.50000);
+            \draw[very thick, blue] (0.00000, 0.00000) -- (0.86603, -0.50000);
+            \draw[very thick, blue] (1.73205, 0.00000) -- (0.86603, -0.50000);
+            \node[circle,fill=black,draw=black,minimum size=0.8mm,inner sep=0pt,] at (0.00000, 0.00000) {};
+            \node[circle,fill=black,draw=black,minimum size=0.8mm,inner sep=0pt,] at (-0.86603, -0.50000) {};
+            \node[circle,fill=black,draw=black,minimum size=0.8mm,inner sep=0pt,] at (0.86603, -0.50000) {};
+            \node[circle,fill=black,draw=black,minimum size=0.8mm,inner sep=0pt,] at (1.73205, 0.00000) {};
+            \end{tikzpicture}
+            \end{document}
+
+        With named coordinates::
+
+            sage: _ = p.tikz_to_file(filename, dedup=True)
+            sage: print open(filename).read()
+            \documentclass[tikz]{standalone}
+            \usepackage{amsmath}
+            \begin{document}
+            \begin{tikzpicture}
+            [scale=1]
+            \coordinate (p0) at (0.00000, 0.00000);
+            \coordinate (p1) at (-0.86603, -0.50000);
+            \draw[very thick, blue] (p0) -- (p1);
+            \coordinate (p2) at (0.86603, -0.50000);
+            \draw[very thick, blue] (p0) -- (p2);
+            \coordinate (p3) at (1.73205, 0.00000);
+            \draw[very thick, blue] (p3) -- (p2);
+            \node[circle,fill=black,draw=black,minimum size=0.8mm,inner sep=0pt,] at (p0) {};
+            \node[circle,fill=black,draw=black,minimum size=0.8mm,inner sep=0pt,] at (p1) {};
+            \node[circle,fill=black,draw=black,minimum size=0.8mm,inner sep=0pt,] at (p2) {};
+            \node[circle,fill=black,draw=black,minimum size=0.8mm,inner sep=0pt,] at (p3) {};
+            \end{tikzpicture}
+            \end{document}
+
+        Merging collinear edges makes the file smaller::
+
+            sage: from slabbe import DiscreteTube
+            sage: I = DiscretePlane([1,3,7], 11) & DiscreteTube([-5,5],[-5,5])
+            sage: _ = I.tikz_to_file(filename)
+            sage: a = len(open(filename).readlines())
+            sage: _ = I.tikz_to_file(filename, merge_collinear=True)
+            sage: b = len(open(filename).readlines())
+            sage: b < a
+            True
+        """
+        names = {} if dedup else None
+        header = TikzPicture('')._latex_file_header_lines()
+        with open(filename, 'w', buffering) as f:
+            for line in header:
+                f.write(line + '\n')
+            f.write('\\begin{document}\n')
+            f.write('\\begin{tikzpicture}\n')
+            if projmat is None and self.dimension() == 3:
+                f.write(self.tikz_projection_scale('isometric', scale))
+            else:
+                f.write('[scale=%s]\n' % scale)
+            if edges:
+                f.writelines(self._tikz_edges_lines(projmat=projmat,
+                    merge_collinear=merge_collinear, names=names, **edge_kwds))
+            if points:
+                f.writelines(self._tikz_points_lines(projmat=projmat,
+                    names=names, **point_kwds))
+            f.write(extra_code)
+            f.write('\\end{tikzpicture}\n')
+            f.write('\\end{document}\n')
+        return filename
+
 class Intersection(DiscreteSubset):
     r"""
     Intersection
@@ -1621,6 +2435,18 @@ class Intersection(DiscreteSubset):
             <class 'slabbe.discrete_subset.Intersection'>
             sage: type(Intersection([DiscreteSubset(dimension=4)]))
             <class 'slabbe.discrete_subset.Intersection'>
+
+        A point is in the intersection if it is in all objects::
+
+            sage: d3 = DiscreteSubset(dimension=3)
+            sage: p = DiscretePlane([1,pi,7], 1+pi+7, mu=0)
+            sage: I = p & d3
+            sage: vector((0,0,0)) in I
+            True
+            sage: vector((0,0,1)) in I
+            True
+            sage: vector((0,0,2)) in I
+            False
         """
         for o in objets:
             if not isinstance(o, DiscreteSubset):
@@ -1630,7 +2456,8 @@ class Intersection(DiscreteSubset):
         if not all(o.dimension() == dimension for o in objets):
             raise ValueError("Intersection not defined for objects not of the same dimension")
         self._objets = objets
-        DiscreteSubset.__init__(self, dimension=dimension)
+        predicate = lambda p: all(p in o for o in objets)
+        DiscreteSubset.__init__(self, dimension=dimension, predicate=predicate)
     @cached_method
     def roots(self):
         r"""
@@ -1670,25 +2497,6 @@ class Intersection(DiscreteSubset):
         s += '\n'.join(map(str, self._objets))
         return s
 
-    def __contains__(self, p):
-        r"""
-        Returns True if the point p is in self.
-
-        INPUT:
-
-        - ``p`` - point in the space
-
-        EXAMPLES::
-
-            sage: from slabbe import DiscretePlane, DiscreteSubset
-            sage: d3 = DiscreteSubset(dimension=3)
-            sage: p = DiscretePlane([1,pi,7], 1+pi+7, mu=0)
-            sage: I = p & d3
-            sage: vector((0,0,0)) in I
-            True
-        """
-        return all(p in o for o in self._objets)
-
     def has_edge(self, p, s):
         r"""
         Returns whether it has the edge (p, s) where s-p is a canonical
@@ -1737,6 +2545,73 @@ class Intersection(DiscreteSubset):
         """
         return all(o.has_edge(p,s) for o in self._objets)
 
+    def has_default_edges(self):
+        r"""
+        Return whether the edges of self are all the pairs of points of
+        self whose difference is a canonical vector.
+
+        EXAMPLES::
+
+            sage: from slabbe import DiscretePlane, DiscreteBox, ChristoffelGraph
+            sage: p = DiscretePlane([1,3,7], 11)
+            sage: b = DiscreteBox([-5,5],[-5,5],[-5,5])
+            sage: (p & b).has_default_edges()
+            True
+            sage: C = ChristoffelGraph((2,3,5))
+            sage: (C & b).has_default_edges()
+            False
+        """
+        return all(o.has_default_edges() for o in self._objets)
+
+    def level_value(self, p):
+        r"""
+        Return the level value of a point p according to the first object
+        having a level value.
+
+        INPUT:
+
+        - ``p`` - point in the space
+
+        EXAMPLES::
+
+            sage: from slabbe import ChristoffelGraph, DiscreteBox
+            sage: C = ChristoffelGraph((2,5))
+            sage: b = DiscreteBox([-5,5],[-5,5])
+            sage: I = b & C
+            sage: I.level_value(vector((1,1)))
+            0
+            sage: I.level_value(vector((1,0)))
+            2
+
+        TESTS::
+
+            sage: (b & b).level_value(vector((1,0)))
+            Traceback (most recent call last):
+            ...
+            NotImplementedError: no object of the intersection has a level value
+        """
+        for o in self._objets:
+            if o.has_level_value():
+                return o.level_value(p)
+        raise NotImplementedError("no object of the intersection has a level value")
+
+    def has_level_value(self):
+        r"""
+        Return whether one of the objects of the intersection has a level
+        value.
+
+        EXAMPLES::
+
+            sage: from slabbe import ChristoffelGraph, DiscreteBox
+            sage: C = ChristoffelGraph((2,5))
+            sage: b = DiscreteBox([-5,5],[-5,5])
+            sage: (b & C).has_level_value()
+            True
+            sage: (b & b).has_level_value()
+            False
+        """
+        return any(o.has_level_value() for o in self._objets)
+
     def __and__(self, other):
         r"""
         Return the intersection of self and other.
@@ -1800,8 +2675,6 @@ class Intersection(DiscreteSubset):
             sage: tube = DiscreteTube([-6.4, 6.4], [-5.2, 5.2])
             sage: I = tube & P
             sage: I.an_element()
-            (0, 0, 0) not in the plane
-            trying similar points
             (0, 0, 1)
 
         """
@@ -23,9 +23,137 @@ EXAMPLES::
 #  the License, or (at your option) any later version.
 #                  http://www.gnu.org/licenses/
 #*****************************************************************************
-from sage.combinat.words.words import InfiniteWords
+from sage.combinat.words.words import InfiniteWords, FiniteWords
 from sage.rings.semirings.non_negative_integer_semiring import NN
 
+def kmp_failure_function(u):
+    r"""
+    Return the failure function of the Knuth-Morris-Pratt algorithm for u.
+
+    The `i`-th entry is the length of the longest proper border of the
+    prefix of length `i+1` of u.
+
+    INPUT:
+
+    - ``u`` -- finite word or tuple
+
+    EXAMPLES::
+
+        sage: from slabbe.infinite_word import kmp_failure_function
+        sage: kmp_failure_function(Word('abacab'))
+        [0, 0, 1, 0, 1, 2]
+        sage: kmp_failure_function(Word('aaaa'))
+        [0, 1, 2, 3]
+    """
+    u = tuple(u)
+    fail = [0] * len(u)
+    k = 0
+    for i in range(1, len(u)):
+        while k > 0 and u[i] != u[k]:
+            k = fail[k-1]
+        if u[i] == u[k]:
+            k += 1
+        fail[i] = k
+    return fail
+
+def occurrences_iterator(self, u):
+    r"""
+    Return an iterator over the starting positions of the occurrences of
+    u in self.
+
+    The word is read only once, letter by letter, so that this works for
+    infinite words.
+
+    INPUT:
+
+    - ``self`` -- finite or infinite word (or any iterable)
+    - ``u`` -- nonempty finite word
+
+    EXAMPLES::
+
+        sage: from slabbe.infinite_word import occurrences_iterator
+        sage: w = words.ThueMorseWord()
+        sage: it = occurrences_iterator(w, Word([0,1,1]))
+        sage: [next(it) for _ in range(5)]
+        [0, 6, 12, 20, 24]
+        sage: list(occurrences_iterator(Word('aaaa'), Word('aa')))
+        [0, 1, 2]
+
+    TESTS::
+
+        sage: list(occurrences_iterator(Word('aaaa'), Word()))
+        Traceback (most recent call last):
+        ...
+        ValueError: u(=word: ) must be nonempty
+    """
+    if len(u) == 0:
+        raise ValueError("u(={}) must be nonempty".format(u))
+    u = tuple(u)
+    n = len(u)
+    fail = kmp_failure_function(u)
+    k = 0
+    for i,a in enumerate(self):
+        while k > 0 and a != u[k]:
+            k = fail[k-1]
+        if a == u[k]:
+            k += 1
+        if k == n:
+            yield i - n + 1
+            k = fail[k-1]
+
+def return_words_iterator(self, u):
+    r"""
+    Return an iterator over the return words to u in self as tuples of
+    letters.
+
+    The occurrences of u are found by a single linear scan of self
+    (Knuth-Morris-Pratt) and only the letters since the last occurrence
+    of u are kept in memory.
+
+    INPUT:
+
+    - ``self`` -- finite or infinite word
+    - ``u`` -- nonempty finite word
+
+    EXAMPLES::
+
+        sage: from slabbe.infinite_word import return_words_iterator
+        sage: w = words.ThueMorseWord()
+        sage: it = return_words_iterator(w, Word([0]))
+        sage: [next(it) for _ in range(6)]
+        [(0, 1, 1), (0, 1), (0,), (0, 1, 1), (0,), (0, 1)]
+
+    It agrees with the method of finite words::
+
+        sage: p = w[:1000]
+        sage: u = Word([0,1,1])
+        sage: list(return_words_iterator(p, u)) == map(tuple, p.return_words_iterator(u))
+        True
+    """
+    if len(u) == 0:
+        raise ValueError("u(={}) must be nonempty".format(u))
+    u = tuple(u)
+    n = len(u)
+    fail = kmp_failure_function(u)
+    k = 0
+    found = False
+    buf = []
+    for a in self:
+        buf.append(a)
+        while k > 0 and a != u[k]:
+            k = fail[k-1]
+        if a == u[k]:
+            k += 1
+        if k == n:
+            k = fail[k-1]
+            start = len(buf) - n
+            if found:
+                yield tuple(buf[:start])
+            found = True
+            del buf[:start]
+        elif not found and len(buf) > 2*n:
+            del buf[:len(buf)-n]
+
 def derived_sequence(self, u, coding=False):
     r"""
     Return the derived sequence of according to the return words to a factor of
@@ -33,7 +161,7 @@ def derived_sequence(self, u, coding=False):
 
     INPUT:
 
-    - ``u`` -- finite word, the length of the nonempty prefix
+    - ``u`` -- nonempty finite word
     - ``coding`` -- boolean (default: ``False``), whether to
       include the return word coding dictionnary
 
@@ -78,11 +206,35 @@ def derived_sequence(self, u, coding=False):
             sage: prefix = w[:1000]
             sage: prefix.return_words_derivate(prefix[:1])
             word: 1231321232131231321312321231321232131232...
+
+    The return words are found by a single linear scan so that derived
+    sequences can be iterated::
+
+        sage: w = words.FibonacciWord([0,1])
+        sage: for _ in range(10): w = derived_sequence(w, w[:1])
+        sage: w
+        word: 0100101001001010010100100101001001010010...
+
+    The coding dictionary is filled as the derived sequence is computed::
+
+        sage: w = words.ThueMorseWord()
+        sage: derived, D = derived_sequence(w, w[:2], True)
+        sage: derived[:10]
+        word: 0123013201
+        sage: D
+        {word: 01: 3, word: 010: 1, word: 011: 0, word: 0110: 2}
     """
+    F = FiniteWords(self.parent().alphabet())
     D = {}
-    it = (D.setdefault(w, len(D)) for w in self.return_words_iterator(u))
+    def codes():
+        code = {}
+        for r in return_words_iterator(self, u):
+            if r not in code:
+                code[r] = len(code)
+                D[F(r)] = code[r]
+            yield code[r]
     W = InfiniteWords(alphabet=NN)
-    w = W(it, datatype='iter')
+    w = W(codes(), datatype='iter')
     if coding:
         return w, D
     else:
@@ -1,5 +1,11 @@
 r"""
 Kolakoski word (datatype)
+
+REFERENCES:
+
+.. [N12] Johan Nilsson, A space-efficient algorithm for calculating the
+   digit distribution in the Kolakoski sequence, Journal of Integer
+   Sequences 15 (2012), Article 12.6.7.
 """
 #*****************************************************************************
 #       Copyright (C) 2011-2014 Sebastien Labbe <slabqc@gmail.com>
@@ -12,6 +18,670 @@ Kolakoski word (datatype)
 #*****************************************************************************
 import itertools
 
+DEF MAX_DEPTH = 256
+
+cdef class KolakoskiGenerator(object):
+    r"""
+    Generator of the Kolakoski word using a tree of generators [N12]_.
+
+    Let `S` be the Kolakoski word without its first letter. The word `S`
+    is the sequence of its own run lengths, its runs alternating between
+    the letters 2 and 1. Hence `S` is generated by a generator which asks
+    the length of its next run to another generator of `S` and so on. The
+    level `k` generator is created when it is needed for the first time
+    and it is called about `1.5^{-k}` times per letter. Hence, the memory
+    used is `O(\log n)` where `n` is the number of letters generated and
+    the time is `O(n)`. No counter can overflow: the only unbounded value
+    is the position which is a Python integer.
+
+    The state of the generator can be saved and restored, see
+    :meth:`state`.
+
+    INPUT:
+
+    - ``state`` -- tuple (default: ``None``), a state returned by the
+      method :meth:`state`, if None, the generator starts at the beginning
+      of the Kolakoski word
+
+    EXAMPLES::
+
+        sage: from slabbe.kolakoski_word_pyx import KolakoskiGenerator
+        sage: G = KolakoskiGenerator()
+        sage: [next(G) for _ in range(20)]
+        [1, 2, 2, 1, 1, 2, 1, 2, 2, 1, 2, 2, 1, 1, 2, 1, 1, 2, 2, 1]
+        sage: G.position()
+        20
+
+    Checkpoint and restart::
+
+        sage: s = G.state()
+        sage: s
+        (20, (1, 1, 2, 2, 1, 2), (0, 1, 0, 0, 1, 0))
+        sage: H = KolakoskiGenerator(s)
+        sage: [next(G) for _ in range(100)] == [next(H) for _ in range(100)]
+        True
+
+    Pickle is supported::
+
+        sage: H = loads(dumps(G))
+        sage: H.position()
+        120
+        sage: [next(G) for _ in range(100)] == [next(H) for _ in range(100)]
+        True
+
+    TESTS::
+
+        sage: KolakoskiGenerator((4, (1, 2), (0,)))
+        Traceback (most recent call last):
+        ...
+        ValueError: invalid state (=(4, (1, 2), (0,)))
+    """
+    cdef unsigned char _letter[MAX_DEPTH]
+    cdef unsigned char _rem[MAX_DEPTH]
+    cdef int _depth
+    cdef object _position
+
+    def __init__(self, state=None):
+        r"""
+        Constructor. See documentation of KolakoskiGenerator for more
+        details.
+
+        EXAMPLES::
+
+            sage: from slabbe.kolakoski_word_pyx import KolakoskiGenerator
+            sage: G = KolakoskiGenerator()
+            sage: G.state()
+            (0, (2,), (2,))
+        """
+        cdef int k
+        if state is None:
+            self._position = 0
+            self._depth = 1
+            self._letter[0] = 2
+            self._rem[0] = 2
+        else:
+            position, letters, rems = state
+            if not (0 < len(letters) == len(rems) <= MAX_DEPTH and
+                    position >= 0 and
+                    all(a in (1, 2) for a in letters) and
+                    all(r in (0, 1) for r in rems[1:]) and
+                    rems[0] in (0, 1, 2)):
+                raise ValueError("invalid state (={})".format(state))
+            self._position = position
+            self._depth = len(letters)
+            for k in range(self._depth):
+                self._letter[k] = letters[k]
+                self._rem[k] = rems[k]
+
+    cdef int _next_letter(self) nogil:
+        r"""
+        Return the next letter of the Kolakoski word without its first
+        letter or -1 if the maximal depth is reached.
+        """
+        cdef int k = 0, j, r
+        while k < self._depth and self._rem[k] == 0:
+            k += 1
+        if k == self._depth:
+            if k == MAX_DEPTH:
+                return -1
+            # the first letter 2 of a new generator was already used
+            # implicitly as the length of the first run of the level below
+            self._letter[k] = 2
+            self._rem[k] = 1
+            self._depth += 1
+        self._rem[k] -= 1
+        r = self._letter[k]
+        for j from k > j >= 0:
+            self._letter[j] = 3 - self._letter[j]
+            self._rem[j] = r - 1
+            r = self._letter[j]
+        return r
+
+    def __iter__(self):
+        r"""
+        EXAMPLES::
+
+            sage: from slabbe.kolakoski_word_pyx import KolakoskiGenerator
+            sage: G = KolakoskiGenerator()
+            sage: iter(G) is G
+            True
+        """
+        return self
+
+    def __next__(self):
+        r"""
+        Return the next letter.
+
+        EXAMPLES::
+
+            sage: from slabbe.kolakoski_word_pyx import KolakoskiGenerator
+            sage: G = KolakoskiGenerator()
+            sage: next(G), next(G), next(G)
+            (1, 2, 2)
+        """
+        cdef int r
+        if self._position == 0:
+            r = 1
+        else:
+            r = self._next_letter()
+            if r < 0:
+                raise OverflowError("maximal depth (={}) of the generator tree "
+                                    "reached".format(MAX_DEPTH))
+        self._position += 1
+        return r
+
+    def skip(self, n):
+        r"""
+        Skip the next ``n`` letters.
+
+        INPUT:
+
+        - ``n`` -- nonnegative integer (possibly larger than `2^{64}`)
+
+        EXAMPLES::
+
+            sage: from slabbe.kolakoski_word_pyx import KolakoskiGenerator
+            sage: G = KolakoskiGenerator()
+            sage: G.skip(10^6)
+            sage: G.position()
+            1000000
+            sage: next(G)
+            2
+
+        TESTS::
+
+            sage: G.skip(-1)
+            Traceback (most recent call last):
+            ...
+            ValueError: n (=-1) must be nonnegative
+        """
+        cdef unsigned long long i, chunk
+        cdef int r = 0
+        if n < 0:
+            raise ValueError("n (={}) must be nonnegative".format(n))
+        if n > 0 and self._position == 0:
+            self._position = 1
+            n -= 1
+        while n > 0:
+            chunk = min(n, 2**62)
+            with nogil:
+                for i in range(chunk):
+                    r = self._next_letter()
+                    if r < 0:
+                        break
+            if r < 0:
+                raise OverflowError("maximal depth (={}) of the generator tree "
+                                    "reached".format(MAX_DEPTH))
+            self._position += chunk
+            n -= chunk
+
+    def block(self, length, packed=False):
+        r"""
+        Return the next ``length`` letters in a numpy array.
+
+        The array is filled in C without creating any Python object per
+        letter.
+
+        INPUT:
+
+        - ``length`` -- nonnegative integer
+        - ``packed`` -- bool (default: ``False``), if True, each letter is
+          stored in one bit (0 for the letter 1 and 1 for the letter 2) in
+          the order of ``numpy.unpackbits``
+
+        OUTPUT:
+
+            numpy array of dtype uint8
+
+        EXAMPLES::
+
+            sage: from slabbe.kolakoski_word_pyx import KolakoskiGenerator
+            sage: G = KolakoskiGenerator()
+            sage: G.block(10)
+            array([1, 2, 2, 1, 1, 2, 1, 2, 2, 1], dtype=uint8)
+            sage: G.block(10)
+            array([2, 2, 1, 1, 2, 1, 1, 2, 2, 1], dtype=uint8)
+            sage: G.position()
+            20
+
+        ::
+
+            sage: G = KolakoskiGenerator()
+            sage: A = G.block(20, packed=True)
+            sage: A
+            array([101, 178,  96], dtype=uint8)
+            sage: import numpy
+            sage: numpy.unpackbits(A)[:20] + 1
+            array([1, 2, 2, 1, 1, 2, 1, 2, 2, 1, 2, 2, 1, 1, 2, 1, 1, 2, 2, 1], dtype=uint8)
+        """
+        import numpy
+        cdef Py_ssize_t i = 0, n = length
+        cdef int r = 0
+        cdef bint is_packed = packed
+        cdef unsigned char[:] buf
+        if n < 0:
+            raise ValueError("length (={}) must be nonnegative".format(length))
+        if is_packed:
+            A = numpy.zeros((n + 7) // 8, dtype=numpy.uint8)
+        else:
+            A = numpy.empty(n, dtype=numpy.uint8)
+        if n == 0:
+            return A
+        buf = A
+        if self._position == 0:
+            # the first letter 1 is not produced by the generator tree
+            if not is_packed:
+                buf[0] = 1
+            i = 1
+        with nogil:
+            while i < n:
+                r = self._next_letter()
+                if r < 0:
+                    break
+                if not is_packed:
+                    buf[i] = r
+                elif r == 2:
+                    buf[i >> 3] |= 128 >> (i & 7)
+                i += 1
+        if r < 0:
+            raise OverflowError("maximal depth (={}) of the generator tree "
+                                "reached".format(MAX_DEPTH))
+        self._position += n
+        return A
+
+    def count_ones(self, length):
+        r"""
+        Return the number of letters 1 among the next ``length`` letters
+        and their discrepancy.
+
+        The discrepancy is the maximum over the prefixes `w` of the next
+        ``length`` letters of `||w|_1 - |w|_2|`. No letter is stored.
+
+        INPUT:
+
+        - ``length`` -- nonnegative integer
+
+        OUTPUT:
+
+            tuple (number of 1, discrepancy)
+
+        EXAMPLES::
+
+            sage: from slabbe.kolakoski_word_pyx import KolakoskiGenerator
+            sage: G = KolakoskiGenerator()
+            sage: G.count_ones(20)
+            (10, 2)
+            sage: G = KolakoskiGenerator()
+            sage: G.count_ones(1000)
+            (502, 6)
+            sage: G.position()
+            1000
+        """
+        cdef unsigned long long i = 0, n = length, ones = 0
+        cdef long long disc = 0, max_disc = 0
+        cdef int r = 0
+        if n > 0 and self._position == 0:
+            ones = disc = max_disc = 1
+            i = 1
+        with nogil:
+            while i < n:
+                r = self._next_letter()
+                if r < 0:
+                    break
+                if r == 1:
+                    ones += 1
+                    disc += 1
+                else:
+                    disc -= 1
+                if disc > max_disc:
+                    max_disc = disc
+                elif -disc > max_disc:
+                    max_disc = -disc
+                i += 1
+        if r < 0:
+            raise OverflowError("maximal depth (={}) of the generator tree "
+                                "reached".format(MAX_DEPTH))
+        self._position += n
+        return ones, max_disc
+
+    def position(self):
+        r"""
+        Return the index of the next letter in the Kolakoski word.
+
+        EXAMPLES::
+
+            sage: from slabbe.kolakoski_word_pyx import KolakoskiGenerator
+            sage: G = KolakoskiGenerator()
+            sage: G.position()
+            0
+            sage: G.skip(2^70)        # not tested (takes too long)
+            sage: G.position()        # not tested
+            1180591620717411303424
+        """
+        return self._position
+
+    def state(self):
+        r"""
+        Return the state of the generator.
+
+        OUTPUT:
+
+            tuple (position, letters, remaining lengths) where letters
+            and remaining lengths are tuples giving for each level of the
+            tree the current letter and the number of times it must still
+            be repeated
+
+        EXAMPLES::
+
+            sage: from slabbe.kolakoski_word_pyx import KolakoskiGenerator
+            sage: G = KolakoskiGenerator()
+            sage: G.skip(20)
+            sage: G.state()
+            (20, (1, 1, 2, 2, 1, 2), (0, 1, 0, 0, 1, 0))
+        """
+        cdef int k
+        letters = tuple(self._letter[k] for k in range(self._depth))
+        rems = tuple(self._rem[k] for k in range(self._depth))
+        return (self._position, letters, rems)
+
+    def __reduce__(self):
+        r"""
+        Pickle support
+
+        TESTS::
+
+            sage: from slabbe.kolakoski_word_pyx import KolakoskiGenerator
+            sage: G = KolakoskiGenerator()
+            sage: G.__reduce__()
+            (<type 'slabbe.kolakoski_word_pyx.KolakoskiGenerator'>,
+             ((0, (2,), (2,)),))
+        """
+        return self.__class__, (self.state(),)
+
+def kolakoski_block(start, length, packed=False):
+    r"""
+    Return the factor of length ``length`` starting at index ``start`` of
+    the Kolakoski word in a numpy array.
+
+    INPUT:
+
+    - ``start`` -- nonnegative integer
+    - ``length`` -- nonnegative integer
+    - ``packed`` -- bool (default: ``False``), if True, each letter is
+      stored in one bit (0 for the letter 1 and 1 for the letter 2) in the
+      order of ``numpy.unpackbits``
+
+    OUTPUT:
+
+        numpy array of dtype uint8
+
+    EXAMPLES::
+
+        sage: from slabbe.kolakoski_word_pyx import kolakoski_block
+        sage: kolakoski_block(0, 10)
+        array([1, 2, 2, 1, 1, 2, 1, 2, 2, 1], dtype=uint8)
+        sage: kolakoski_block(1000, 10)
+        array([1, 2, 1, 1, 2, 2, 1, 2, 2, 1], dtype=uint8)
+        sage: kolakoski_block(0, 20, packed=True)
+        array([101, 178,  96], dtype=uint8)
+        sage: A = kolakoski_block(0, 10^8)       # long time
+    """
+    G = KolakoskiGenerator()
+    G.skip(start)
+    return G.block(length, packed=packed)
+
+def count_ones(start, length):
+    r"""
+    Return the number of letters 1 in the factor of length ``length``
+    starting at index ``start`` of the Kolakoski word and its discrepancy.
+
+    The discrepancy is the maximum over the prefixes `w` of the factor of
+    `||w|_1 - |w|_2|`. No letter is stored.
+
+    INPUT:
+
+    - ``start`` -- nonnegative integer
+    - ``length`` -- nonnegative integer
+
+    OUTPUT:
+
+        tuple (number of 1, discrepancy)
+
+    EXAMPLES::
+
+        sage: from slabbe.kolakoski_word_pyx import count_ones
+        sage: count_ones(0, 20)
+        (10, 2)
+        sage: count_ones(100, 1000)
+        (504, 8)
+        sage: ones, disc = count_ones(0, 10^9)    # not tested (a few seconds)
+    """
+    G = KolakoskiGenerator()
+    G.skip(start)
+    return G.count_ones(length)
+
+cdef Py_ssize_t _runs_length(unsigned char* T, Py_ssize_t a, Py_ssize_t b) nogil:
+    r"""
+    Return the sum of ``T[a:b]``.
+    """
+    cdef Py_ssize_t t, s = 0
+    for t in range(a, b):
+        s += T[t]
+    return s
+
+cdef Py_ssize_t _runs_ones(unsigned char* T, Py_ssize_t a, Py_ssize_t b) nogil:
+    r"""
+    Return the number of letters 1 in the runs of lengths ``T[a:b]``, the
+    run of index `t` being made of the letter 2 if `t` is even and 1
+    otherwise.
+    """
+    cdef Py_ssize_t t, s = 0
+    for t in range(a | 1, b, 2):
+        s += T[t]
+    return s
+
+cdef void _runs_expand(unsigned char* T, Py_ssize_t a, Py_ssize_t b,
+                       unsigned char* out, Py_ssize_t c) nogil:
+    r"""
+    Write the runs of lengths ``T[a:b]`` in ``out`` starting at index
+    ``c``, the run of index `t` being made of the letter 2 if `t` is even
+    and 1 otherwise.
+    """
+    cdef Py_ssize_t t
+    cdef unsigned char letter
+    for t in range(a, b):
+        letter = 2 - (t & 1)
+        out[c] = letter
+        c += 1
+        if T[t] == 2:
+            out[c] = letter
+            c += 1
+
+def _chunk_length(unsigned char[:] T, Py_ssize_t a, Py_ssize_t b):
+    r"""
+    Return the sum of ``T[a:b]`` computed without the GIL.
+
+    EXAMPLES::
+
+        sage: from slabbe.kolakoski_word_pyx import _chunk_length
+        sage: import numpy
+        sage: T = numpy.array([2,2,1,1,2], dtype=numpy.uint8)
+        sage: _chunk_length(T, 1, 4)
+        4
+    """
+    cdef Py_ssize_t s = 0
+    if a < b:
+        with nogil:
+            s = _runs_length(&T[0], a, b)
+    return s
+
+def _chunk_ones(unsigned char[:] T, Py_ssize_t a, Py_ssize_t b):
+    r"""
+    Return the number of letters 1 in the runs of lengths ``T[a:b]``
+    computed without the GIL.
+
+    EXAMPLES::
+
+        sage: from slabbe.kolakoski_word_pyx import _chunk_ones
+        sage: import numpy
+        sage: T = numpy.array([2,2,1,1,2], dtype=numpy.uint8)
+        sage: _chunk_ones(T, 0, 5)
+        3
+    """
+    cdef Py_ssize_t s = 0
+    if a < b:
+        with nogil:
+            s = _runs_ones(&T[0], a, b)
+    return s
+
+def _chunk_expand(unsigned char[:] T, Py_ssize_t a, Py_ssize_t b,
+                  unsigned char[:] out, Py_ssize_t c):
+    r"""
+    Write the runs of lengths ``T[a:b]`` in ``out`` starting at index
+    ``c`` without the GIL.
+
+    EXAMPLES::
+
+        sage: from slabbe.kolakoski_word_pyx import _chunk_expand
+        sage: import numpy
+        sage: T = numpy.array([2,2,1,1,2], dtype=numpy.uint8)
+        sage: out = numpy.zeros(8, dtype=numpy.uint8)
+        sage: _chunk_expand(T, 0, 5, out, 0)
+        sage: out
+        array([2, 2, 1, 1, 2, 1, 2, 2], dtype=uint8)
+    """
+    if a < b:
+        with nogil:
+            _runs_expand(&T[0], a, b, &out[0], c)
+
+def kolakoski_parallel(N, n_threads=None, counts=False, seed_length=10**4):
+    r"""
+    Return the prefix of length ``N`` of the Kolakoski word (or its number
+    of letters 1 and 2) computed with many threads.
+
+    Let `S` be the Kolakoski word without its first letter. The word `S`
+    is the sequence of its own run lengths, its runs alternating between
+    the letters 2 and 1. Hence the prefix of `S` made of the runs of
+    lengths `S[0:m]` is computed from `S[0:m]`. Splitting `S[0:m]` into
+    chunks, the position of each chunk in the result is given by the
+    partial sums of the chunk sums, so that all chunks are expanded in
+    parallel by threads running C code without the GIL. Starting from a
+    short prefix computed with :class:`KolakoskiGenerator`, this is repeated
+    until the prefix is long enough. The total work is about three times
+    the work of the sequential algorithm. When ``counts`` is True, the last
+    expansion is not done: the letters are counted from the runs.
+
+    INPUT:
+
+    - ``N`` -- nonnegative integer, length of the prefix
+    - ``n_threads`` -- integer (default: ``None``), number of threads, if
+      None, the number of cpus is used
+    - ``counts`` -- bool (default: ``False``), whether to return the
+      number of letters 1 and 2 in the prefix instead of the prefix
+    - ``seed_length`` -- integer (default: ``10^4``), length of the prefix
+      computed sequentially
+
+    OUTPUT:
+
+        numpy array of dtype uint8 or tuple (number of 1, number of 2)
+
+    EXAMPLES::
+
+        sage: from slabbe.kolakoski_word_pyx import kolakoski_parallel
+        sage: kolakoski_parallel(20, n_threads=2, seed_length=5)
+        array([1, 2, 2, 1, 1, 2, 1, 2, 2, 1, 2, 2, 1, 1, 2, 1, 1, 2, 2, 1], dtype=uint8)
+        sage: kolakoski_parallel(1000, counts=True)
+        (502, 498)
+        sage: kolakoski_parallel(10^6, n_threads=4, counts=True)
+        (499986, 500014)
+
+    It is consistent with the sequential computation::
+
+        sage: from slabbe.kolakoski_word_pyx import kolakoski_block
+        sage: A = kolakoski_parallel(10^6, n_threads=3, seed_length=100)
+        sage: B = kolakoski_block(0, 10^6)
+        sage: (A == B).all()
+        True
+
+    ::
+
+        sage: ones, twos = kolakoski_parallel(10^10, counts=True)   # not tested
+
+    TESTS::
+
+        sage: kolakoski_parallel(0)
+        array([], dtype=uint8)
+        sage: [kolakoski_parallel(n, seed_length=5, counts=True) for n in range(8)]
+        [(0, 0), (1, 0), (1, 1), (1, 2), (2, 2), (3, 2), (3, 3), (4, 3)]
+    """
+    import numpy
+    from multiprocessing import cpu_count
+    from multiprocessing.pool import ThreadPool
+    if N < 0:
+        raise ValueError("N (={}) must be nonnegative".format(N))
+    if N <= seed_length + 1:
+        if counts:
+            ones, _ = count_ones(0, N)
+            return ones, N - ones
+        return kolakoski_block(0, N)
+    if n_threads is None:
+        n_threads = cpu_count()
+    n_chunks = 4 * n_threads
+
+    def chunks(M):
+        return [(M*i//n_chunks, M*(i+1)//n_chunks) for i in range(n_chunks)]
+    def partial_sums(L):
+        offsets = [0]
+        for a in L[:-1]:
+            offsets.append(offsets[-1] + a)
+        return offsets
+
+    # T contains the lengths of the first runs of S
+    G = KolakoskiGenerator()
+    G.skip(1)
+    T = G.block(seed_length)
+    target = N - 1
+    pool = ThreadPool(n_threads)
+    try:
+        while True:
+            bounds = chunks(len(T))
+            lengths = pool.map(lambda ab: _chunk_length(T, ab[0], ab[1]), bounds)
+            offsets = partial_sums(lengths)
+            total = offsets[-1] + lengths[-1]
+            if total >= target:
+                break
+            out = numpy.empty(total, dtype=numpy.uint8)
+            pool.map(lambda abc: _chunk_expand(T, abc[0], abc[1], out, abc[2]),
+                     [(a, b, c) for ((a, b), c) in zip(bounds, offsets)])
+            T = out
+
+        # the runs T[:r] are the smallest prefix covering S[:target]
+        j = next(j for j in range(n_chunks) if offsets[j] + lengths[j] >= target)
+        a, b = bounds[j]
+        cs = numpy.cumsum(T[a:b], dtype=numpy.int64) + offsets[j]
+        i = int(numpy.searchsorted(cs, target))
+        r = a + i + 1
+        excess = int(cs[i]) - target
+        bounds = chunks(r)
+
+        if counts:
+            ones = sum(pool.map(lambda ab: _chunk_ones(T, ab[0], ab[1]), bounds))
+            if excess and (r-1) % 2 == 1:
+                ones -= 1
+            ones += 1
+            return ones, N - ones
+
+        lengths = pool.map(lambda ab: _chunk_length(T, ab[0], ab[1]), bounds)
+        offsets = partial_sums(lengths)
+        out = numpy.empty(N + excess, dtype=numpy.uint8)
+        out[0] = 1
+        pool.map(lambda abc: _chunk_expand(T, abc[0], abc[1], out, abc[2]),
+                 [(a, b, c+1) for ((a, b), c) in zip(bounds, offsets)])
+        return out[:N]
+    finally:
+        pool.close()
+        pool.join()
+
 cdef class WordDatatype_Kolakoski(object):
     r"""
     Word datatype class for the Kolakoski word.
@@ -39,6 +709,10 @@ cdef class WordDatatype_Kolakoski(object):
     cdef public _parent
     cdef public _hash
     cdef public _limit
+    cdef public _checkpoint_stride
+    cdef public _max_checkpoints
+    cdef public _checkpoint_positions
+    cdef public _checkpoint_states
     def __init__(self, parent):
         r"""
         Constructor. See documentation of WordDatatype_Kolakoski for more
@@ -53,6 +727,78 @@ cdef class WordDatatype_Kolakoski(object):
         """
         self._parent = parent
         self._limit = 365583569409
+        self._checkpoint_stride = 2**20
+        self._max_checkpoints = 2**12
+        self._checkpoint_positions = []
+        self._checkpoint_states = []
+
+    def _generator_at(self, n):
+        r"""
+        Return a generator of the Kolakoski word positioned at index ``n``.
+
+        The generator restarts from the nearest checkpoint before ``n``.
+        The checkpoints are states of :class:`KolakoskiGenerator` at the
+        multiples of a stride. They are created lazily when an index
+        beyond the last checkpoint is reached. When there are more than
+        ``_max_checkpoints`` of them, the stride is doubled and every other
+        checkpoint is forgotten, so that the table stays bounded and covers
+        all the indices reached so far.
+
+        INPUT:
+
+        - ``n`` -- nonnegative integer
+
+        EXAMPLES::
+
+            sage: from slabbe.kolakoski_word_pyx import WordDatatype_Kolakoski
+            sage: parent = Words([1,2])
+            sage: K = WordDatatype_Kolakoski(parent)
+            sage: K._checkpoint_stride = 100
+            sage: K._max_checkpoints = 4
+            sage: G = K._generator_at(1000)
+            sage: G.position()
+            1000
+            sage: next(G)
+            1
+            sage: K._checkpoint_positions
+            [400, 800]
+            sage: K._checkpoint_stride
+            400
+
+        The checkpoints are used for the next queries::
+
+            sage: G = K._generator_at(900)
+            sage: G.position()
+            900
+            sage: K._checkpoint_positions
+            [400, 800]
+            sage: [K._generator_at(i).next() for i in range(20)]
+            [1, 2, 2, 1, 1, 2, 1, 2, 2, 1, 2, 2, 1, 1, 2, 1, 1, 2, 2, 1]
+        """
+        from bisect import bisect_right
+        positions = self._checkpoint_positions
+        states = self._checkpoint_states
+        k = bisect_right(positions, n)
+        if k == 0:
+            G = KolakoskiGenerator()
+        else:
+            G = KolakoskiGenerator(states[k-1])
+        while True:
+            stride = self._checkpoint_stride
+            next_checkpoint = (G.position() // stride + 1) * stride
+            if next_checkpoint > n:
+                break
+            G.skip(next_checkpoint - G.position())
+            positions.append(next_checkpoint)
+            states.append(G.state())
+            if len(positions) > self._max_checkpoints:
+                stride *= 2
+                L = [(p,s) for (p,s) in zip(positions, states) if p % stride == 0]
+                positions[:] = [p for (p,s) in L]
+                states[:] = [s for (p,s) in L]
+                self._checkpoint_stride = stride
+        G.skip(n - G.position())
+        return G
 
     def __getitem__(self, n):
         r"""
@@ -64,7 +810,7 @@ cdef class WordDatatype_Kolakoski(object):
 
         INPUT:
 
-        - ``n`` - integer such that `n < 365583569409` or slice
+        - ``n`` - nonnegative integer or slice
 
         OUPUT:
 
@@ -75,10 +821,9 @@ cdef class WordDatatype_Kolakoski(object):
             Assuming ``sizeof(unsigned long long)`` is `8`, i.e. 64 bit,
             when the variable ``i`` is equal to ``365583569408`` then ``f``
             is equal to ``2^64 - 1`` so that the line ``g = f + 1`` in the
-            loop will bust the capacity.  Hence ``__getitem__`` returns bad
-            values beyond ``365583569409``. Maybe the limit is smaller
-            because of other operations in the loop. This still has to be
-            verified.
+            loop will bust the capacity.  Hence, beyond ``365583569409``,
+            the letter is computed with :class:`KolakoskiGenerator` which
+            has no such limit.
 
         EXAMPLES::
 
@@ -109,12 +854,30 @@ cdef class WordDatatype_Kolakoski(object):
 
         TESTS:
 
-        Not yet implemented for too large integers ::
+        Beyond the limit or the stride of the checkpoints, the generator
+        tree is used, restarting from the nearest checkpoint (see
+        :meth:`_generator_at`)::
 
-            sage: K[365583569410]
+            sage: K = WordDatatype_Kolakoski(parent)
+            sage: K[10^7]
+            1
+            sage: K[10^7 + 1]     # fast
+            2
+            sage: K[-1]
             Traceback (most recent call last):
             ...
-            NotImplementedError: when n is larger then 365583569409
+            ValueError: index (=-1) must be nonnegative
+            sage: K[2^20 + 5 : 2^20 + 25] == K[:2^20 + 25][2^20 + 5:]
+            True
+
+        ::
+
+
+            sage: K[365583569410]        # not tested (takes too long)
+            sage: K._limit = 10
+            sage: [K[i] for i in range(20)]
+            [1, 2, 2, 1, 1, 2, 1, 2, 2, 1, 2, 2, 1, 1, 2, 1, 1, 2, 2, 1]
+            sage: K._limit = 365583569409
         """
         cdef unsigned long long e = 0, f = 0, g, m, i
         if isinstance(n, slice):
@@ -131,7 +894,12 @@ cdef class WordDatatype_Kolakoski(object):
                     length = Infinity
                 else: # key.stop > 0
                     length = int(max(0,ceil((key.stop-start)/float(step))))
-                data = itertools.islice(self, start, key.stop, step)
+                if start == 0:
+                    data = itertools.islice(self, None, key.stop, step)
+                else:
+                    stop = None if key.stop is None else max(start, key.stop)
+                    G = self._generator_at(start)
+                    data = itertools.islice(G, 0, stop and stop - start, step)
                 return self._parent(data, length=length)
             else:
                 if key.start is None or key.start < 0:
@@ -141,8 +909,10 @@ cdef class WordDatatype_Kolakoski(object):
                 length = int(max(0,ceil((key.stop-start)/float(step))))
                 data = list(itertools.islice(self, start+1))[key]
                 return self._parent(data, length=length)
-        elif n > self._limit:
-            raise NotImplementedError("when n is larger then %s" % self._limit)
+        elif n < 0:
+            raise ValueError("index (={}) must be nonnegative".format(n))
+        elif n > self._limit or n >= self._checkpoint_stride:
+            return next(self._generator_at(n))
         else:
             if n == 0:
                 e = 1
@@ -160,17 +930,8 @@ cdef class WordDatatype_Kolakoski(object):
         r"""
         Iterator over the Kolakoski sequence.
 
-        This is a cython implementation inspired from the 10 lines of C
-        code written by Dominique Bernardi and shared during Sage Days 28
-        in Orsay, France, in January 2011.
-
-        .. NOTE::
-
-            This iterator is defined not further than `365583569409` terms
-            if ``sizeof(unsigned long long) == 8`` and less in fact (around
-            `10^11`).
-
-        TODO: Define this iterator further then the limit.
+        It uses :class:`KolakoskiGenerator` so that it is not limited by
+        the capacity of a 64 bits counter.
 
         EXAMPLES::
 
@@ -181,15 +942,7 @@ cdef class WordDatatype_Kolakoski(object):
             sage: [it.next() for _ in range(20)]
             [1, 2, 2, 1, 1, 2, 1, 2, 2, 1, 2, 2, 1, 1, 2, 1, 1, 2, 2, 1]
         """
-        yield 1
-        yield 2
-        cdef unsigned long long e = 0, f = 0, g, m
-        while True:
-            g = f + 1
-            m = f ^ g
-            e ^= m / 2
-            f = g + (e & m) / 2
-            yield int(2 - (e & 1))
+        return KolakoskiGenerator()
 
     def __reduce__(self):
         r"""
@@ -50,6 +50,7 @@ AUTHORS:
 import itertools
 from sage.combinat.words.words import Words
 from sage.combinat.finite_state_machine import Automaton
+from sage.misc.cachefunc import cached_method
 
 class Language(object):
     r"""
@@ -125,6 +126,24 @@ class Language(object):
             [1, 2, 4, 8, 16]
         """
         return sum(1 for _ in self.words_of_length_iterator(length))
+
+    def _subset_automaton(self):
+        r"""
+        Return the deterministic automaton recognizing the words of
+        :meth:`words_of_length_iterator`.
+
+        It has a unique state reading every letter. See
+        :meth:`RegularLanguage._subset_automaton` for the output.
+
+        EXAMPLES::
+
+            sage: from slabbe.language import Language
+            sage: F = Language(alphabet=['a', 'b'])
+            sage: F._subset_automaton()
+            (0, {0: [('a', 0), ('b', 0)]}, {0})
+        """
+        delta = {0: [(a, 0) for a in self._alphabet]}
+        return 0, delta, set([0])
 class FiniteLanguage(Language):
     r"""
     Finite language
@@ -281,9 +300,202 @@ class RegularLanguage(Language):
             sage: R = RegularLanguage(alphabet, automaton)
             sage: [list(R.words_of_length_iterator(i)) for i in range(6)]
             [[], [], [], [], [word: abba], []]
+
+        The words are obtained by a depth first search along the
+        transitions of the automaton, so that only prefixes of accepted
+        words are visited::
+
+            sage: from slabbe.language import languages
+            sage: L = languages.ARP()
+            sage: it = L.words_of_length_iterator(10)
+            sage: next(it)
+            word: 1,1,1,1,1,1,1,1,1,1
+
+        TESTS:
+
+        The words are the same as the ones obtained by filtering the full
+        shift::
+
+            sage: from slabbe.language import Language
+            sage: F = Language(L._alphabet)
+            sage: it = F.words_of_length_iterator(3)
+            sage: list(L.words_of_length_iterator(3)) == filter(L._automaton, it)
+            True
+
+        A word accepted from many initial states is enumerated once::
+
+            sage: L = languages.Brun()
+            sage: len(list(L.words_of_length_iterator(5)))
+            486
+        """
+        try:
+            initial, delta, accepting = self._subset_automaton()
+        except ValueError:
+            it = super(RegularLanguage, self).words_of_length_iterator(length)
+            for w in itertools.ifilter(self._automaton, it):
+                yield w
+            return
+        W = Words(self._alphabet)
+        if length == 0:
+            if initial in accepting:
+                yield W([])
+            return
+        prefix = []
+        stack = [iter(delta[initial])]
+        while stack:
+            for a, T in stack[-1]:
+                if len(stack) == length:
+                    if T in accepting:
+                        yield W(prefix + [a])
+                else:
+                    prefix.append(a)
+                    stack.append(iter(delta[T]))
+                    break
+            else:
+                stack.pop()
+                if prefix:
+                    prefix.pop()
+
+    def complexity(self, length):
+        r"""
+        Returns the number of words of given length.
+
+        It is computed from a power of the transfer matrix of the
+        (determinized) automaton.
+
+        INPUT:
+
+        - ``length`` -- integer
+
+        EXAMPLES::
+
+            sage: from slabbe.language import languages
+            sage: L = languages.ARP()
+            sage: map(L.complexity, range(5))
+            [1, 9, 57, 345, 2073]
+            sage: L.complexity(10)
+            96745881
+
+        TESTS::
+
+            sage: from slabbe.language import RegularLanguage
+            sage: alphabet = ['a', 'b']
+            sage: trans = [(0, 1, 'a'), (1, 2, 'b'), (2, 3, 'b'), (3, 4, 'a')]
+            sage: automaton = Automaton(trans, initial_states=[0], final_states=[4])
+            sage: R = RegularLanguage(alphabet, automaton)
+            sage: map(R.complexity, range(6))
+            [0, 0, 0, 0, 1, 0]
+        """
+        try:
+            initial, delta, accepting = self._subset_automaton()
+        except ValueError:
+            return super(RegularLanguage, self).complexity(length)
+        from sage.modules.free_module_element import vector
+        from sage.rings.integer_ring import ZZ
+        M, states = self._transfer_matrix()
+        u = vector(ZZ, [1 if S == initial else 0 for S in states])
+        f = vector(ZZ, [1 if S in accepting else 0 for S in states])
+        return u * M**length * f
+
+    @cached_method
+    def _subset_automaton(self):
+        r"""
+        Return the deterministic automaton obtained by the subset
+        construction, restricted to the sets of states from which an
+        accepting set can be reached.
+
+        OUTPUT:
+
+        tuple (initial, delta, accepting) where initial is a frozenset of
+        labels of states, delta is a dict mapping each set of states to
+        the list of pairs (letter, set of states) in the order of the
+        alphabet and accepting is the set of accepting sets of states.
+
+        EXAMPLES::
+
+            sage: from slabbe.language import RegularLanguage
+            sage: alphabet = ['a', 'b']
+            sage: trans = [(0, 1, 'a'), (1, 2, 'b'), (2, 3, 'b'), (3, 4, 'a')]
+            sage: automaton = Automaton(trans, initial_states=[0], final_states=[4])
+            sage: R = RegularLanguage(alphabet, automaton)
+            sage: initial, delta, accepting = R._subset_automaton()
+            sage: initial
+            frozenset({0})
+            sage: delta[initial]
+            [('a', frozenset({1}))]
+            sage: accepting
+            {frozenset({4})}
+
+        TESTS::
+
+            sage: trans = [(0, 1, 'ab')]
+            sage: automaton = Automaton(trans, initial_states=[0], final_states=[1])
+            sage: RegularLanguage(alphabet, automaton)._subset_automaton()
+            Traceback (most recent call last):
+            ...
+            ValueError: transitions must read exactly one letter
+        """
+        succ = {}
+        for t in self._automaton.iter_transitions():
+            if len(t.word_in) != 1:
+                raise ValueError("transitions must read exactly one letter")
+            D = succ.setdefault(t.from_state.label(), {})
+            D.setdefault(t.word_in[0], set()).add(t.to_state.label())
+        final = set(s.label() for s in self._automaton.final_states())
+        initial = frozenset(s.label() for s in self._automaton.initial_states())
+        delta = {}
+        todo = [initial]
+        while todo:
+            S = todo.pop()
+            if S in delta:
+                continue
+            delta[S] = []
+            for a in self._alphabet:
+                T = frozenset(q for s in S for q in succ.get(s, {}).get(a, ()))
+                if T:
+                    delta[S].append((a, T))
+                    todo.append(T)
+        # keep only the sets of states from which an accepting set is reachable
+        live = set(S for S in delta if not final.isdisjoint(S))
+        accepting = set(live)
+        changed = True
+        while changed:
+            changed = False
+            for S, L in delta.iteritems():
+                if S not in live and any(T in live for (a,T) in L):
+                    live.add(S)
+                    changed = True
+        delta = {S:[(a,T) for (a,T) in L if T in live]
+                 for S, L in delta.iteritems() if S in live or S == initial}
+        return initial, delta, accepting
+
+    @cached_method
+    def _transfer_matrix(self):
+        r"""
+        Return the transfer matrix of the subset automaton and the list of
+        its states indexing the rows and columns.
+
+        EXAMPLES::
+
+            sage: from slabbe.language import languages
+            sage: L = languages.ARP()
+            sage: M, states = L._transfer_matrix()
+            sage: M.dimensions()
+            (7, 7)
+            sage: sorted(M * vector([1]*7))
+            [5, 5, 5, 5, 5, 5, 9]
         """
-        it = super(RegularLanguage, self).words_of_length_iterator(length)
-        return itertools.ifilter(self._automaton, it)
+        from sage.matrix.constructor import matrix
+        from sage.rings.integer_ring import ZZ
+        initial, delta, accepting = self._subset_automaton()
+        states = sorted(delta, key=sorted)
+        index = {S:i for i,S in enumerate(states)}
+        M = matrix(ZZ, len(states))
+        for S, L in delta.iteritems():
+            for (a,T) in L:
+                M[index[S], index[T]] += 1
+        M.set_immutable()
+        return M, states
 
 #####################
 # Language generators
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+r"""
+Bounded least recently used caches
+
+EXAMPLES::
+
+    sage: from slabbe.lru_cache import LRUCache
+    sage: cache = LRUCache(maxsize=2)
+    sage: cache._store('a', 1)
+    sage: cache._store('b', 2)
+    sage: cache._store('c', 3)
+    sage: cache._data.keys()
+    ['b', 'c']
+"""
+#*****************************************************************************
+#       Copyright (C) 2016 Sebastien Labbe <slabqc@gmail.com>
+#
+#  Distributed under the terms of the GNU General Public License (GPL)
+#  as published by the Free Software Foundation; either version 2 of
+#  the License, or (at your option) any later version.
+#                  http://www.gnu.org/licenses/
+#*****************************************************************************
+from collections import OrderedDict, namedtuple
+
+class LRUCache(object):
+    r"""
+    Least recently used cache with hit and miss counters.
+
+    The subclasses define how the values are computed and which counters
+    are reported by :meth:`info` with the class attribute
+    ``_counter_names``.
+
+    INPUT:
+
+    - ``maxsize`` -- positive integer, maximal number of values kept in
+      the cache
+
+    EXAMPLES::
+
+        sage: from slabbe.lru_cache import LRUCache
+        sage: cache = LRUCache(10)
+        sage: cache.info()
+        CacheInfo(hits=0, misses=0, maxsize=10, currsize=0)
+
+    TESTS::
+
+        sage: LRUCache(0)
+        Traceback (most recent call last):
+        ...
+        ValueError: maxsize (=0) must be positive
+    """
+    _counter_names = ('hits', 'misses')
+
+    def __init__(self, maxsize):
+        r"""
+        Constructor.
+
+        EXAMPLES::
+
+            sage: from slabbe.lru_cache import LRUCache
+            sage: LRUCache(3)._maxsize
+            3
+        """
+        if maxsize <= 0:
+            raise ValueError("maxsize (={}) must be positive".format(maxsize))
+        self._maxsize = maxsize
+        self._data = OrderedDict()
+        self._counters = dict.fromkeys(self._counter_names, 0)
+
+    def _get(self, key, default=None):
+        r"""
+        Return the value indexed by ``key`` and mark it as the most
+        recently used, or ``default`` if it is not in the cache.
+
+        EXAMPLES::
+
+            sage: from slabbe.lru_cache import LRUCache
+            sage: cache = LRUCache(2)
+            sage: cache._store('a', 1)
+            sage: cache._store('b', 2)
+            sage: cache._get('a')
+            1
+            sage: cache._get('c') is None
+            True
+            sage: cache._data.keys()
+            ['b', 'a']
+        """
+        data = self._data
+        try:
+            value = data.pop(key)
+        except KeyError:
+            return default
+        data[key] = value
+        return value
+
+    def _store(self, key, value):
+        r"""
+        Add the value indexed by ``key`` as the most recently used,
+        discarding the least recently used one if the cache is full.
+
+        EXAMPLES::
+
+            sage: from slabbe.lru_cache import LRUCache
+            sage: cache = LRUCache(1)
+            sage: cache._store('a', 1)
+            sage: cache._store('b', 2)
+            sage: cache._data.keys()
+            ['b']
+        """
+        data = self._data
+        if key in data:
+            del data[key]
+        elif len(data) >= self._maxsize:
+            old_key, _ = data.popitem(last=False)
+            self._discarded(old_key)
+        data[key] = value
+
+    def _discarded(self, key):
+        r"""
+        Called when the value indexed by ``key`` is discarded.
+
+        EXAMPLES::
+
+            sage: from slabbe.lru_cache import LRUCache
+            sage: LRUCache(1)._discarded('a')
+        """
+        pass
+
+    def info(self):
+        r"""
+        Return the counters, the maximal and current size.
+
+        EXAMPLES::
+
+            sage: from slabbe.lru_cache import LRUCache
+            sage: cache = LRUCache(100)
+            sage: cache._store('a', 1)
+            sage: cache.info()
+            CacheInfo(hits=0, misses=0, maxsize=100, currsize=1)
+        """
+        fields = self._counter_names + ('maxsize', 'currsize')
+        CacheInfo = namedtuple('CacheInfo', fields)
+        values = [self._counters[name] for name in self._counter_names]
+        return CacheInfo(*(values + [self._maxsize, len(self._data)]))
+
+    def clear(self):
+        r"""
+        Empty the cache and reset the counters.
+
+        EXAMPLES::
+
+            sage: from slabbe.lru_cache import LRUCache
+            sage: cache = LRUCache(100)
+            sage: cache._store('a', 1)
+            sage: cache._counters['hits'] += 1
+            sage: cache.clear()
+            sage: cache.info()
+            CacheInfo(hits=0, misses=0, maxsize=100, currsize=0)
+        """
+        self._data.clear()
+        self._counters = dict.fromkeys(self._counter_names, 0)
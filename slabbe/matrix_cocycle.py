@@ -68,11 +68,267 @@ multiplicatif (2 avril 2014)::
 #                  http://www.gnu.org/licenses/
 #*****************************************************************************
 import itertools
+from copy import copy
 from collections import Counter
 from sage.matrix.constructor import matrix
 from sage.misc.cachefunc import cached_method
 from sage.misc.misc_c import prod
 from language import Language, FiniteLanguage
+from slabbe.lru_cache import LRUCache
+
+######################
+# Prefix product cache
+######################
+class PrefixProductCache(LRUCache):
+    r"""
+    Least recently used cache for the products of matrices indexed by
+    words.
+
+    The words are the nodes of a trie so that the longest prefix of a
+    word whose product is in the cache is found in time linear in the
+    length of the word. Besides the product of the whole word, the
+    products of the prefixes whose length is a multiple of ``stride``
+    are kept.
+
+    INPUT:
+
+    - ``maxsize`` -- positive integer (default: ``2^12``), maximal number
+      of products kept in the cache
+    - ``stride`` -- positive integer (default: ``8``), the products of
+      prefixes of length multiple of ``stride`` are cached
+
+    EXAMPLES::
+
+        sage: from slabbe.matrix_cocycle import cocycles, PrefixProductCache
+        sage: C = cocycles.Sorted_Brun()
+        sage: gens = C.gens()
+        sage: ID = C.identity_matrix()
+        sage: cache = PrefixProductCache(maxsize=10, stride=2)
+        sage: cache(gens, ID, [1,2,3,1,2])
+        [0 0 1]
+        [1 1 2]
+        [2 3 6]
+        sage: cache(gens, ID, [1,2,3,1,3]) == C.word_to_matrix([1,2,3,1,3])
+        True
+        sage: cache(gens, ID, [1,2,3,1,2])
+        [0 0 1]
+        [1 1 2]
+        [2 3 6]
+        sage: cache.info()
+        CacheInfo(hits=1, partial_hits=1, misses=1, maxsize=10, currsize=4)
+
+    The longest prefix in the cache is used even if its length is not a
+    multiple of ``stride``::
+
+        sage: cache(gens, ID, [1,2,3,1,3,2]) == C.word_to_matrix([1,2,3,1,3,2])
+        True
+        sage: cache.info()
+        CacheInfo(hits=1, partial_hits=2, misses=1, maxsize=10, currsize=5)
+
+    The least recently used product is discarded first::
+
+        sage: cache = PrefixProductCache(maxsize=2, stride=2)
+        sage: _ = cache(gens, ID, [1,2,3])
+        sage: _ = cache(gens, ID, [3,3])
+        sage: sorted(cache._prefix(node) for node in cache._data)
+        [(1, 2, 3), (3, 3)]
+
+    TESTS::
+
+        sage: PrefixProductCache(0)
+        Traceback (most recent call last):
+        ...
+        ValueError: maxsize (=0) must be positive
+        sage: PrefixProductCache(10, stride=0)
+        Traceback (most recent call last):
+        ...
+        ValueError: stride (=0) must be positive
+    """
+    _counter_names = ('hits', 'partial_hits', 'misses')
+
+    def __init__(self, maxsize=2**12, stride=8):
+        r"""
+        Constructor.
+
+        EXAMPLES::
+
+            sage: from slabbe.matrix_cocycle import PrefixProductCache
+            sage: PrefixProductCache(10).info()
+            CacheInfo(hits=0, partial_hits=0, misses=0, maxsize=10, currsize=0)
+        """
+        if stride <= 0:
+            raise ValueError("stride (={}) must be positive".format(stride))
+        LRUCache.__init__(self, maxsize)
+        self._stride = stride
+        self._init_trie()
+
+    def _init_trie(self):
+        r"""
+        Initialize the trie of the words to its root ``0``.
+
+        The child of the node ``u`` by the letter ``a`` is
+        ``self._child[(u,a)]`` and ``self._parent`` maps a node to the
+        pair ``(u,a)``.
+
+        EXAMPLES::
+
+            sage: from slabbe.matrix_cocycle import PrefixProductCache
+            sage: cache = PrefixProductCache()
+            sage: cache._child, cache._parent, cache._nchildren
+            ({}, {}, {0: 0})
+        """
+        self._child = {}
+        self._parent = {}
+        self._nchildren = {0:0}
+        self._next_node = 1
+        self._discarded_nodes = []
+
+    def _prefix(self, node):
+        r"""
+        Return the word of the node as a tuple.
+
+        EXAMPLES::
+
+            sage: from slabbe.matrix_cocycle import cocycles, PrefixProductCache
+            sage: C = cocycles.Sorted_Brun()
+            sage: cache = PrefixProductCache()
+            sage: _ = cache(C.gens(), C.identity_matrix(), [1,2,2])
+            sage: [cache._prefix(node) for node in cache._data]
+            [(1, 2, 2)]
+        """
+        L = []
+        while node:
+            node, a = self._parent[node]
+            L.append(a)
+        return tuple(reversed(L))
+
+    def _discarded(self, node):
+        r"""
+        Record that the product of the node was discarded.
+
+        The nodes are removed from the trie by :meth:`_prune` once the
+        products of a word are stored.
+
+        EXAMPLES::
+
+            sage: from slabbe.matrix_cocycle import PrefixProductCache
+            sage: cache = PrefixProductCache()
+            sage: cache._discarded(3)
+            sage: cache._discarded_nodes
+            [3]
+        """
+        self._discarded_nodes.append(node)
+
+    def _prune(self):
+        r"""
+        Remove the nodes of the trie leading to no cached product from
+        the discarded nodes.
+
+        EXAMPLES::
+
+            sage: from slabbe.matrix_cocycle import cocycles, PrefixProductCache
+            sage: C = cocycles.Sorted_Brun()
+            sage: cache = PrefixProductCache(maxsize=1)
+            sage: _ = cache(C.gens(), C.identity_matrix(), [1,2,2])
+            sage: _ = cache(C.gens(), C.identity_matrix(), [3])
+            sage: sorted(cache._parent.values())
+            [(0, 3)]
+        """
+        for node in self._discarded_nodes:
+            while (node and node in self._nchildren and node not in self._data
+                   and not self._nchildren[node]):
+                parent, a = self._parent.pop(node)
+                del self._child[(parent, a)]
+                del self._nchildren[node]
+                self._nchildren[parent] -= 1
+                node = parent
+        self._discarded_nodes = []
+
+    def __call__(self, gens, identity, w):
+        r"""
+        Return the product of the matrices ``gens[a]`` for the letters
+        ``a`` of ``w``.
+
+        INPUT:
+
+        - ``gens`` -- dict of matrices
+        - ``identity`` -- the identity matrix
+        - ``w`` -- word
+
+        EXAMPLES::
+
+            sage: from slabbe.matrix_cocycle import cocycles, PrefixProductCache
+            sage: C = cocycles.Sorted_Brun()
+            sage: cache = PrefixProductCache()
+            sage: cache(C.gens(), C.identity_matrix(), [])
+            [1 0 0]
+            [0 1 0]
+            [0 0 1]
+        """
+        t = tuple(w)
+        n = len(t)
+        child = self._child
+        # the nodes of the prefixes of t in the trie
+        path = []
+        node = 0
+        for a in t:
+            node = child.get((node, a))
+            if node is None:
+                break
+            path.append(node)
+        # the longest prefix whose product is cached
+        M = identity
+        start = 0
+        for k in range(len(path), 0, -1):
+            P = self._get(path[k-1])
+            if P is not None:
+                M = P
+                start = k
+                break
+        if start == n and n:
+            self._counters['hits'] += 1
+            return M
+        elif start:
+            self._counters['partial_hits'] += 1
+        else:
+            self._counters['misses'] += 1
+        node = path[-1] if path else 0
+        for i in range(len(path), n):
+            new = self._next_node
+            self._next_node += 1
+            child[(node, t[i])] = new
+            self._parent[new] = (node, t[i])
+            self._nchildren[new] = 0
+            self._nchildren[node] += 1
+            path.append(new)
+            node = new
+        stride = self._stride
+        for i in range(start, n):
+            M = M * gens[t[i]]
+            if (i + 1) % stride == 0 or i + 1 == n:
+                M.set_immutable()
+                self._store(path[i], M)
+        self._prune()
+        return M
+
+    def clear(self):
+        r"""
+        Empty the cache and reset the counters.
+
+        EXAMPLES::
+
+            sage: from slabbe.matrix_cocycle import cocycles, PrefixProductCache
+            sage: C = cocycles.Sorted_Brun()
+            sage: cache = PrefixProductCache(100)
+            sage: _ = cache(C.gens(), C.identity_matrix(), [1,2])
+            sage: cache.clear()
+            sage: cache.info()
+            CacheInfo(hits=0, partial_hits=0, misses=0, maxsize=100, currsize=0)
+            sage: cache._parent
+            {}
+        """
+        LRUCache.clear(self)
+        self._init_trie()
 
 ######################
 # Matrix Cocycle
@@ -130,6 +386,8 @@ class MatrixCocycle(object):
             self._language = Language(sorted(self._gens.keys()))
         else:
             self._language = language
+        self._semi_norm_cache = LRUCache(2**16)
+        self._word_to_matrix_cache = None
 
     def __repr__(self):
         r"""
@@ -212,9 +470,98 @@ class MatrixCocycle(object):
             [1 0 0]
             [0 1 0]
             [0 0 1]
+
+        When the cache is enabled (see
+        :meth:`enable_word_to_matrix_cache`), the product is computed from
+        the longest prefix of ``w`` in the cache::
+
+            sage: C.enable_word_to_matrix_cache()
+            sage: C.word_to_matrix(Word(['A1','P2']))
+            [0 0 1]
+            [1 0 1]
+            [2 1 3]
         """
+        if self._word_to_matrix_cache is not None:
+            return self._word_to_matrix_cache(self._gens,
+                                              self.identity_matrix(), w)
         return prod((self._gens[a] for a in w), z=self.identity_matrix())
 
+    def enable_word_to_matrix_cache(self, maxsize=2**12, stride=8):
+        r"""
+        Cache the products computed by :meth:`word_to_matrix` for the most
+        recently used words and some of their prefixes.
+
+        This is useful when the same codings of orbits, or codings sharing
+        long prefixes, are analysed many times. At most ``maxsize``
+        matrices are kept.
+
+        INPUT:
+
+        - ``maxsize`` -- positive integer (default: ``2^12``), maximal
+          number of products kept in the cache
+        - ``stride`` -- positive integer (default: ``8``), the products of
+          prefixes of length multiple of ``stride`` are cached
+
+        EXAMPLES::
+
+            sage: from slabbe.mult_cont_frac import Brun
+            sage: from slabbe.matrix_cocycle import cocycles
+            sage: it = Brun().coding_iterator((1,e,pi))
+            sage: L = [next(it) for _ in range(50)]
+            sage: C = cocycles.Brun()
+            sage: C.enable_word_to_matrix_cache()
+            sage: all(C.word_to_matrix(L[:i]) == prod(C.gens()[a] for a in L[:i])
+            ....:     for i in range(1, 50))
+            True
+            sage: C.word_to_matrix_cache_info()
+            CacheInfo(hits=0, partial_hits=48, misses=1, maxsize=4096, currsize=49)
+            sage: _ = C.word_to_matrix(L[:30])
+            sage: C.word_to_matrix_cache_info().hits
+            1
+
+        Enabling it again resets the cache::
+
+            sage: C.enable_word_to_matrix_cache(maxsize=10)
+            sage: C.word_to_matrix_cache_info()
+            CacheInfo(hits=0, partial_hits=0, misses=0, maxsize=10, currsize=0)
+        """
+        self._word_to_matrix_cache = PrefixProductCache(maxsize, stride)
+
+    def disable_word_to_matrix_cache(self):
+        r"""
+        Stop caching the products of :meth:`word_to_matrix` and free the
+        cache.
+
+        EXAMPLES::
+
+            sage: from slabbe.matrix_cocycle import cocycles
+            sage: C = cocycles.Brun()
+            sage: C.enable_word_to_matrix_cache()
+            sage: C.disable_word_to_matrix_cache()
+            sage: C.word_to_matrix_cache_info() is None
+            True
+        """
+        self._word_to_matrix_cache = None
+
+    def word_to_matrix_cache_info(self):
+        r"""
+        Return the statistics of the cache of :meth:`word_to_matrix` or
+        None if it is not enabled.
+
+        EXAMPLES::
+
+            sage: from slabbe.matrix_cocycle import cocycles
+            sage: C = cocycles.Sorted_Brun()
+            sage: C.enable_word_to_matrix_cache()
+            sage: _ = C.word_to_matrix([1,2,3])
+            sage: _ = C.word_to_matrix([1,2,3])
+            sage: C.word_to_matrix_cache_info()
+            CacheInfo(hits=1, partial_hits=0, misses=1, maxsize=4096, currsize=1)
+        """
+        if self._word_to_matrix_cache is None:
+            return None
+        return self._word_to_matrix_cache.info()
+
     def n_words_iterator(self, n):
         r"""
         EXAMPLES::
@@ -241,9 +588,191 @@ class MatrixCocycle(object):
             [0 1 0]  [0 0 1]  [0 0 1]  [0 1 1]  [1 0 1]  [0 1 1]
             [1 1 1], [1 1 1], [1 1 1], [1 1 1], [1 1 1], [1 1 1]
             )
+
+        The products are computed incrementally: the product of each
+        prefix is kept on a stack and reused by the next words sharing
+        that prefix, so that each node of the prefix tree of the language
+        costs one matrix multiplication. The matrices are immutable since
+        they are shared with the products of the next words::
+
+            sage: C = cocycles.ARP()
+            sage: all(m == C.word_to_matrix(w) for w,m in C.n_matrices_iterator(3))
+            True
+            sage: all(m.is_immutable() for w,m in C.n_matrices_iterator(3))
+            True
+
+        TESTS::
+
+            sage: [(w.is_empty(), m.is_one()) for w,m in C.n_matrices_iterator(0)]
+            [(True, True)]
+            sage: w,m = next(C.n_matrices_iterator(2))
+            sage: m[0,0] = 5
+            Traceback (most recent call last):
+            ...
+            ValueError: matrix is immutable; please change a copy instead (i.e., use copy(M) to change a copy of M).
         """
+        # stack[i] is the product of the first i letters of the previous word
+        identity = copy(self.identity_matrix())
+        identity.set_immutable()
+        stack = [identity]
+        previous = []
         for w in self.n_words_iterator(n):
-            yield w, self.word_to_matrix(w)
+            i = 0
+            while i < len(previous) and previous[i] == w[i]:
+                i += 1
+            del stack[i+1:]
+            for a in w[i:]:
+                m = stack[-1] * self._gens[a]
+                m.set_immutable()
+                stack.append(m)
+            previous = w
+            yield w, stack[-1]
+
+    def n_matrices_array(self, n):
+        r"""
+        Return the words of length n and their matrices as a numpy array.
+
+        The products are computed level by level along the deterministic
+        automaton of the language: the products of the prefixes of length
+        `i+1` are obtained from those of length `i` by a single batched
+        multiplication with the generators allowed after each prefix.
+        The entries are int64 as long as they are known to fit on 64 bits
+        and Python integers (dtype object) afterwards.
+
+        INPUT:
+
+        - ``n`` -- integer, length
+
+        OUTPUT:
+
+        tuple (words, array) where words is an iterator over the words in
+        the order of :meth:`n_words_iterator`, built lazily from arrays of
+        indices of letters, and array is a numpy array of shape
+        ``(number of words, d, d)``
+
+        EXAMPLES::
+
+            sage: from slabbe.matrix_cocycle import cocycles
+            sage: ARP = cocycles.Sorted_ARP()
+            sage: words, M = ARP.n_matrices_array(1)
+            sage: list(words)
+            [word: A1, word: A2, word: A3, word: P1, word: P2, word: P3]
+            sage: M[3]
+            array([[0, 1, 0],
+                   [0, 1, 1],
+                   [1, 1, 1]])
+
+        ::
+
+            sage: C = cocycles.ARP()
+            sage: words, M = C.n_matrices_array(4)
+            sage: M.shape
+            (2073, 3, 3)
+            sage: L = zip(words, C.n_matrices_iterator(4))
+            sage: all(u == w and (M[i] == m.numpy()).all()
+            ....:     for (i,(u,(w,m))) in enumerate(L))
+            True
+
+        When the entries may not fit on 64 bits, they are computed over the
+        integers::
+
+            sage: from slabbe.matrix_cocycle import MatrixCocycle
+            sage: C = MatrixCocycle({'a':matrix(2, [2,0,0,2])})
+            sage: C.n_matrices_array(61)[1]
+            array([[[2305843009213693952,                   0],
+                    [                  0, 2305843009213693952]]])
+            sage: words, M = C.n_matrices_array(70)
+            sage: M.dtype
+            dtype('O')
+            sage: M[0,0,0] == 2^70
+            True
+
+        TESTS::
+
+            sage: words, M = C.n_matrices_array(0)
+            sage: list(words)
+            [word: ]
+            sage: M
+            array([[[1, 0],
+                    [0, 1]]])
+        """
+        from sage.combinat.words.words import Words
+        alphabet, indices, P = self._n_matrices_index_array(n)
+        W = Words(alphabet)
+        words = (W([alphabet[k] for k in row]) for row in indices)
+        return words, P
+
+    def _n_matrices_index_array(self, n):
+        r"""
+        Return the alphabet, the words of length n as an array of indices
+        of letters in the alphabet and their matrices as a numpy array.
+
+        See :meth:`n_matrices_array`.
+
+        EXAMPLES::
+
+            sage: from slabbe.matrix_cocycle import cocycles
+            sage: C = cocycles.Sorted_Brun()
+            sage: alphabet, indices, M = C._n_matrices_index_array(2)
+            sage: alphabet
+            [1, 2, 3]
+            sage: indices[:4]
+            array([[0, 0],
+                   [0, 1],
+                   [0, 2],
+                   [1, 0]])
+            sage: M.shape
+            (9, 3, 3)
+        """
+        import numpy
+        alphabet = list(self._language._alphabet)
+        initial, delta, accepting = self._language._subset_automaton()
+        states = list(delta)
+        state_index = {S:i for i,S in enumerate(states)}
+        letter_index = {a:i for i,a in enumerate(alphabet)}
+        # transition[s,a] is the index of the state reached from the state
+        # s by reading the letter a, or -1
+        transition = numpy.empty((len(states), len(alphabet)), dtype=numpy.int64)
+        transition.fill(-1)
+        for S,L in delta.iteritems():
+            for a,T in L:
+                transition[state_index[S], letter_index[a]] = state_index[T]
+        accepted = numpy.array([S in accepting for S in states], dtype=bool)
+
+        G = integer_matrix_array([self._gens[a] for a in alphabet])
+        gmax = float(numpy.abs(G).max())
+        d = G.shape[1]
+        P = numpy.identity(d, dtype=numpy.int64).reshape(1, d, d)
+        state = numpy.array([state_index[initial]])
+        # the prefix j of length i+1 is the prefix parents[i][j] of length
+        # i followed by the letter letters[i][j]
+        parents = []
+        letters = []
+        for i in range(n):
+            if len(P) == 0:
+                return alphabet, numpy.empty((0, n), dtype=numpy.int64), P
+            if P.dtype != object:
+                bound = numpy.abs(P).sum(axis=2, dtype=numpy.float64).max() * gmax
+                if bound >= 2**62:
+                    P = P.astype(object)
+                    G = G.astype(object)
+            T = transition[state]
+            parent, letter = numpy.nonzero(T >= 0)
+            if P.dtype == object:
+                P = (P[parent,:,:,None] * G[letter,None,:,:]).sum(axis=2)
+            else:
+                P = numpy.matmul(P[parent], G[letter])
+            state = T[parent, letter]
+            parents.append(parent)
+            letters.append(letter)
+        keep = numpy.flatnonzero(accepted[state])
+
+        indices = numpy.empty((len(keep), n), dtype=numpy.int64)
+        node = keep
+        for i in reversed(range(n)):
+            indices[:,i] = letters[i][node]
+            node = parents[i][node]
+        return alphabet, indices, P[keep]
 
     def n_matrices_eigenvalues_iterator(self,n):
         r"""
@@ -277,10 +806,78 @@ class MatrixCocycle(object):
         for w,m in self.n_matrices_iterator(n):
             yield w, m.eigenvalues()
 
+    def n_matrices_eigenvectors_array(self, n, verbose=False):
+        r"""
+        Return the right and left Perron eigenvectors of the matrices of
+        level n as numpy arrays.
+
+        The eigenvectors of all matrices are computed at once from the
+        array given by :meth:`n_matrices_array`. Matrices whose dominant
+        eigenvalue is not real are skipped.
+
+        INPUT:
+
+        - ``n`` -- integer, length
+        - ``verbose`` -- boolean (default: ``False``), whether to print
+          the words whose dominant eigenvalue is not real
+
+        OUTPUT:
+
+        tuple (words, right, left) where right and left are numpy arrays
+        of shape ``(len(words), d)``, the eigenvectors being normalized so
+        that their entries sum to 1
+
+        EXAMPLES::
+
+            sage: from slabbe.matrix_cocycle import cocycles
+            sage: C = cocycles.ARP()
+            sage: words, right, left = C.n_matrices_eigenvectors_array(1)
+            sage: words[3], right[3], left[3]
+            (word: 123, array([ 0.,  0.,  1.]), array([ 1.,  0.,  0.]))
+            sage: words, right, left = C.n_matrices_eigenvectors_array(4)
+            sage: right.shape
+            (2073, 3)
+        """
+        words, right, left, real = self._n_matrices_perron_array(n)
+        L = []
+        for (w,b) in itertools.izip(words, real):
+            if b:
+                L.append(w)
+            elif verbose:
+                print "dominant eigenvalue is not real for:", w
+        return L, right[real].real, left[real].real
+
+    def _n_matrices_perron_array(self, n):
+        r"""
+        Return the words of length n, the right and left Perron
+        eigenvectors of their matrices as complex numpy arrays and the
+        boolean array telling whether they are real.
+
+        EXAMPLES::
+
+            sage: from slabbe.matrix_cocycle import cocycles
+            sage: C = cocycles.ARP()
+            sage: words, right, left, real = C._n_matrices_perron_array(1)
+            sage: real.all()
+            True
+        """
+        words, M = self.n_matrices_array(n)
+        eig_right, right = perron_right_eigenvector_array(M)
+        eig_left, left = perron_right_eigenvector_array(M.transpose(0, 2, 1))
+        real = ((eig_right.imag == 0) & (eig_left.imag == 0) &
+                (right.imag == 0).all(axis=1) & (left.imag == 0).all(axis=1))
+        return words, right, left, real
+
     def n_matrices_eigenvectors(self,n, verbose=False):
         r"""
         Return the left and right eigenvectors of the matrices of level n.
 
+        They are computed for all matrices at once with numpy when the
+        generators are integral (see
+        :meth:`n_matrices_eigenvectors_array`). The eigenvectors which
+        are not real are then computed one matrix at a time as complex
+        vectors.
+
         EXAMPLES::
 
             sage: from slabbe.matrix_cocycle import cocycles
@@ -296,13 +893,53 @@ class MatrixCocycle(object):
              (word: 312, (0.0, 1.0, 0.0), (0.0, 0.0, 1.0)),
              (word: 321, (1.0, 0.0, 0.0), (0.0, 0.0, 1.0))]
         """
+        from sage.modules.free_module_element import vector
+        from sage.rings.real_double import RDF
+        try:
+            words, right, left, real = self._n_matrices_perron_array(n)
+        except ValueError:
+            it = self.n_matrices_iterator(n)
+            return self._eigenvectors_one_by_one(it, verbose)
         R = []
-        for w,m in self.n_matrices_iterator(n):
+        for (w,a,b,is_real) in itertools.izip(words, right, left, real):
+            if is_real:
+                v_right = vector(RDF, a.real)
+                v_left = vector(RDF, b.real)
+                R.append((w, v_right, v_left))
+                if verbose:
+                    print "indices of matrices:", w
+                    print self.word_to_matrix(w)
+                    print "eigenvectors:", v_right, v_left
+            else:
+                it = [(w, self.word_to_matrix(w))]
+                R.extend(self._eigenvectors_one_by_one(it, verbose))
+        return R
+
+    def _eigenvectors_one_by_one(self, it, verbose=False):
+        r"""
+        Return the left and right eigenvectors of the matrices computed
+        one at a time.
+
+        INPUT:
+
+        - ``it`` -- iterable of pairs (word, matrix)
+        - ``verbose`` -- boolean (default: ``False``)
+
+        EXAMPLES::
+
+            sage: from slabbe.matrix_cocycle import cocycles
+            sage: C = cocycles.ARP()
+            sage: C._eigenvectors_one_by_one(C.n_matrices_iterator(1))[0]
+            (word: 1, (1.0, 0.0, 0.0), (0.0, 0.0, 1.0))
+        """
+        R = []
+        for w,m in it:
             try:
                 a,v_right = perron_right_eigenvector(m)
                 b,v_left = perron_right_eigenvector(m.transpose())
             except ValueError:
-                print "problem with :\n",m
+                if verbose:
+                    print "problem with :\n",m
             else:
                 R.append((w, v_right,v_left))
                 if verbose:
@@ -353,10 +990,68 @@ class MatrixCocycle(object):
              word: 222]
 
         """
-        return [w for w in self.n_words_iterator(n) if not self.is_pisot(w)]
+        try:
+            words, pisot = self.n_matrices_pisot_array(n)
+        except ValueError:
+            return [w for w,m in self.n_matrices_iterator(n) if not is_pisot(m)]
+        return [w for (w,b) in itertools.izip(words, pisot) if not b]
+
+    def n_matrices_pisot_array(self, n):
+        r"""
+        Return the words of length n and whether their matrices are Pisot.
+
+        The test is done on the whole array given by
+        :meth:`n_matrices_array`, see :func:`is_pisot_array`.
+
+        INPUT:
+
+        - ``n`` -- integer, length
+
+        OUTPUT:
+
+        tuple (words, array of booleans) where words is an iterator as in
+        :meth:`n_matrices_array`
+
+        EXAMPLES::
+
+            sage: from slabbe.matrix_cocycle import cocycles, is_pisot
+            sage: B = cocycles.Sorted_Brun()
+            sage: words, pisot = B.n_matrices_pisot_array(3)
+            sage: pisot
+            array([False, False,  True, False, False,  True,  True,  True,
+                    True, False, False,  True, False, False,  True,  True,
+                    True,  True,  True,  True,  True,  True,  True,  True,
+                    True,  True,  True], dtype=bool)
+            sage: all(b == B.is_pisot(w) for (w,b) in zip(words, pisot))
+            True
+        """
+        words, M = self.n_matrices_array(n)
+        return words, is_pisot_array(M)
 
-    def n_matrices_semi_norm_iterator(self, n, p=2):
+    def n_matrices_semi_norm_iterator(self, n, p=2, ncpus=1, cache=False,
+            warm_start=False):
         r"""
+        Return an iterator over the words of length n, the semi norm of
+        their matrix on their cylinder and whether it is Pisot.
+
+        INPUT:
+
+        - ``n`` -- positive integer, length
+        - ``p`` -- the norm (default: ``2``)
+        - ``ncpus`` -- positive integer (default: ``1``), number of
+          processes; the words sharing the same prefix of length ``n-1``
+          are sent to the same process, at most ``4*ncpus`` such groups
+          of words are computed at the same time
+        - ``cache`` -- boolean (default: ``False``), whether to reuse and
+          store the computed values in a cache kept by the cocycle and
+          indexed by the matrix and the cone, as many words have the same
+          product; the cache keeps the `2^{16}` most recently used values
+        - ``warm_start`` -- boolean (default: ``False``), whether to start
+          the optimisation of each word from the optimum of its parent
+          word (its prefix of length ``n-1``), when it lies inside the
+          cone; the optimum of the parent word is taken from the cache or
+          computed once for all the words sharing it
+
         EXAMPLES:
 
         For the 1-norm, all matrices contracts the hyperplane::
@@ -413,12 +1108,92 @@ class MatrixCocycle(object):
             P32,P13 0.666665046248 True
             P32,P21 0.666665629351 True
             P32,P31 0.666664488371 True
+
+        The computation can be done in parallel and the values can be
+        reused from the cache::
+
+            sage: C = cocycles.ARP()
+            sage: L = list(C.n_matrices_semi_norm_iterator(1, p=1, ncpus=2, cache=True))
+            sage: for t in L[:5]: print t          # tolerance 0.0001
+            (word: 1, 1.0, False)
+            (word: 2, 1.0, False)
+            (word: 3, 1.0, False)
+            (word: 123, 0.9999885582839877, False)
+            (word: 132, 0.9999854006354785, False)
+            sage: C._semi_norm_cache.info()
+            CacheInfo(hits=0, misses=9, maxsize=65536, currsize=9)
+            sage: list(C.n_matrices_semi_norm_iterator(1, p=1, cache=True)) == L
+            True
+            sage: C._semi_norm_cache.info()
+            CacheInfo(hits=9, misses=9, maxsize=65536, currsize=9)
+
+        Starting each optimisation from the optimum of the parent word::
+
+            sage: it = C.n_matrices_semi_norm_iterator(2, p=1, warm_start=True)
+            sage: w,s,b = next(it)
+            sage: w, s, b         # tolerance 0.0001
+            (word: 1,1, 1.0, False)
         """
         if n == 0:
             raise NotImplementedError
-        for w,m in self.n_matrices_iterator(n):
+        it = self.n_matrices_iterator(n)
+        groups = (list(g) for _,g in itertools.groupby(it, lambda wm:wm[0][:-1]))
+        if cache:
+            cache_dict = self._semi_norm_cache
+        else:
+            cache_dict = LRUCache(self._semi_norm_cache._maxsize)
+        def lookup(w, m, x0):
             cone = m*self.cone(w[-1])
-            yield w, semi_norm_cone(m.transpose(), cone, p=p), self.is_pisot(w)
+            key = (tuple(m.list()), tuple(cone.list()), p)
+            cached = cache_dict._get(key)
+            if cached is not None:
+                return key, cached, True
+            value, x = semi_norm_cone(m.transpose(), cone, p=p, x0=x0,
+                                      argmax=True)
+            return key, (value, x, is_pisot(m)), False
+        def compute(group):
+            R = []
+            x0 = None
+            parent = group[0][0][:-1]
+            if warm_start and len(parent) > 0:
+                key, result, hit = lookup(parent,
+                        self.word_to_matrix(parent), None)
+                R.append((None, key, result, hit))
+                x0 = result[1]
+            for w,m in group:
+                key, result, hit = lookup(w, m, x0)
+                R.append((w, key, result, hit))
+            return R
+        if ncpus == 1:
+            results = itertools.imap(compute, groups)
+        else:
+            from sage.parallel.decorate import parallel
+            @parallel(ncpus=ncpus)
+            def compute_group(i, group):
+                return compute(group)
+            def ordered_results():
+                # a bounded window of groups is computed at the same time
+                window = 4 * ncpus
+                while True:
+                    chunk = list(itertools.islice(groups, window))
+                    if not chunk:
+                        return
+                    done = {}
+                    i = 0
+                    for ((args, kwds), R) in compute_group(list(enumerate(chunk))):
+                        done[args[0]] = R
+                        while i in done:
+                            yield done.pop(i)
+                            i += 1
+            results = ordered_results()
+        for R in results:
+            for w, key, result, hit in R:
+                # the lookups of other processes are counted here
+                cache_dict._counters['hits' if hit else 'misses'] += 1
+                cache_dict._store(key, result)
+                if w is not None:
+                    value, _, pisot = result
+                    yield w, value, pisot
 
     def n_matrices_distorsion_iterator(self, n, p=1):
         r"""
@@ -490,6 +1265,58 @@ class MatrixCocycle(object):
         for w,m in self.n_matrices_iterator(n):
             yield w, m*self.cone(w[-1])
 
+    def n_cylinders_array(self, n):
+        r"""
+        Return the words of length n and their cylinders as a numpy array.
+
+        See :meth:`n_matrices_array`.
+
+        INPUT:
+
+        - ``n`` -- integer, length
+
+        OUTPUT:
+
+        tuple (words, array) as in :meth:`n_matrices_array`
+
+        EXAMPLES::
+
+            sage: from slabbe.matrix_cocycle import cocycles
+            sage: C = cocycles.ARP()
+            sage: words, M = C.n_cylinders_array(1)
+            sage: list(words)[3]
+            word: 123
+            sage: M[3]
+            array([[1, 0, 1],
+                   [1, 1, 1],
+                   [1, 1, 2]])
+
+        TESTS::
+
+            sage: C.n_cylinders_array(0)
+            Traceback (most recent call last):
+            ...
+            ValueError: the length n (=0) must be positive, the cylinders depend on the last letter
+        """
+        if n <= 0:
+            raise ValueError("the length n (={}) must be positive, the "
+                             "cylinders depend on the last letter".format(n))
+        import numpy
+        from sage.combinat.words.words import Words
+        alphabet, indices, P = self._n_matrices_index_array(n)
+        W = Words(alphabet)
+        words = (W([alphabet[k] for k in row]) for row in indices)
+        C = integer_matrix_array([self._cone_dict[a] for a in alphabet])
+        C = C[indices[:,-1]]
+        if P.dtype != object and len(P) > 0:
+            bound = numpy.abs(P).sum(axis=2, dtype=numpy.float64).max()
+            if bound * float(numpy.abs(C).max()) >= 2**62:
+                P = P.astype(object)
+        if P.dtype == object:
+            C = C.astype(object)
+            return words, (P[:,:,:,None] * C[:,None,:,:]).sum(axis=2)
+        return words, numpy.matmul(P, C)
+
     def n_cylinders_edges(self, n):
         r"""
         Return the set of edges of the n-cylinders.
@@ -559,8 +1386,18 @@ class MatrixCocycle(object):
         #G.delete_vertices(to_remove)
         #return G
 
-    def distorsion_max(self, n, p=1):
+    def distorsion_max(self, n, p=1, backend='sage'):
         r"""
+        INPUT:
+
+        - ``n`` -- integer, length
+        - ``p`` -- the norm (default: ``1``)
+        - ``backend`` -- ``'sage'`` or ``'numpy'`` (default: ``'sage'``),
+          if ``'numpy'`` and ``p`` is ``1`` or ``oo``, the matrices are
+          computed with :meth:`n_matrices_array` and the distorsion is
+          computed on the whole array. If the entries do not fit on 64
+          bits, the computation is done with Sage matrices.
+
         EXAMPLES:
 
         Non borné::
@@ -575,7 +1412,30 @@ class MatrixCocycle(object):
             5
             sage: T.distorsion_max(4, p=oo)
             7
+
+        Using numpy arrays::
+
+            sage: T.distorsion_max(4, p=oo, backend='numpy')
+            7
+            sage: T = cocycles.Sorted_ARPMulti(2)
+            sage: T.distorsion_max(3, p=oo, backend='numpy')
+            22/3
+            sage: T.distorsion_max(3, p=1, backend='numpy') == T.distorsion_max(3, p=1)
+            True
+
+        TESTS::
+
+            sage: T.distorsion_max(3, backend='foo')
+            Traceback (most recent call last):
+            ...
+            ValueError: unknown backend (=foo)
         """
+        from sage.rings.infinity import Infinity
+        if backend not in ('sage', 'numpy'):
+            raise ValueError("unknown backend (={})".format(backend))
+        if backend == 'numpy' and p in (1, Infinity):
+            words, M = self.n_matrices_array(n)
+            return distorsion_array_max(M, p=p)
         return max(d for (w,d) in self.n_matrices_distorsion_iterator(n, p=p))
 
     def distorsion_argmax(self, n, p=1):
@@ -947,6 +1807,80 @@ def distorsion(M, p=1):
     norms = [c.norm(p=p) for c in M.columns()]
     return max(norms) / min(norms)
 
+def integer_matrix_array(matrices):
+    r"""
+    Return a numpy array of int64 of shape ``(k, d, d)`` from a list of
+    integral matrices.
+
+    EXAMPLES::
+
+        sage: from slabbe.matrix_cocycle import integer_matrix_array
+        sage: A = matrix(2, [1,1,0,1])
+        sage: B = matrix(QQ, 2, [1,0,1,1])
+        sage: integer_matrix_array([A, B])
+        array([[[1, 1],
+                [0, 1]],
+        <BLANKLINE>
+               [[1, 0],
+                [1, 1]]])
+
+    TESTS::
+
+        sage: integer_matrix_array([matrix(QQ, 2, [1/2,0,0,1])])
+        Traceback (most recent call last):
+        ...
+        ValueError: matrices must have integral entries
+    """
+    import numpy
+    from sage.rings.integer_ring import ZZ
+    L = []
+    for m in matrices:
+        try:
+            m = m.change_ring(ZZ)
+        except TypeError:
+            raise ValueError("matrices must have integral entries")
+        L.append([[int(a) for a in row] for row in m.rows()])
+    return numpy.array(L, dtype=numpy.int64)
+
+def distorsion_array_max(M, p=1):
+    r"""
+    Return the maximal distorsion of the matrices of a numpy array of
+    shape ``(k, d, d)``.
+
+    The ratios are compared as floats and the maximum is computed exactly
+    among the candidates close to the largest one.
+
+    INPUT:
+
+    - ``M`` -- numpy array of integers of shape ``(k, d, d)``
+    - ``p`` -- ``1`` or ``oo`` (default: ``1``), the norm
+
+    EXAMPLES::
+
+        sage: from slabbe.matrix_cocycle import distorsion_array_max
+        sage: import numpy
+        sage: M = numpy.array([[[1,2,3],[4,5,6],[7,8,9]]])
+        sage: distorsion_array_max(M)
+        3/2
+        sage: distorsion_array_max(M, p=oo)
+        9/7
+    """
+    import numpy
+    from sage.rings.rational_field import QQ
+    from sage.rings.infinity import Infinity
+    A = numpy.abs(M)
+    if p == 1:
+        norms = A.sum(axis=1)
+    elif p == Infinity:
+        norms = A.max(axis=1)
+    else:
+        raise ValueError("p(={}) must be 1 or oo".format(p))
+    top = norms.max(axis=1)
+    bottom = norms.min(axis=1)
+    ratio = top.astype(numpy.float64) / bottom.astype(numpy.float64)
+    candidates = numpy.flatnonzero(ratio >= ratio.max() * (1 - 1e-9))
+    return max(QQ((int(top[i]), int(bottom[i]))) for i in candidates)
+
 def is_pisot(m):
     r"""
     EXAMPLES::
@@ -959,6 +1893,51 @@ def is_pisot(m):
     S = sorted((abs(e) for e in m.eigenvalues()), reverse=True)
     return S[0] > 1 and S[1] < 1
 
+def is_pisot_array(M, tol=100):
+    r"""
+    Return whether the matrices of a numpy array are Pisot.
+
+    The eigenvalues are computed as floats for all matrices at once. The
+    matrices having an eigenvalue whose modulus is too close to 1 to
+    conclude are checked exactly with :func:`is_pisot`.
+
+    INPUT:
+
+    - ``M`` -- numpy array of integers of shape ``(k, d, d)``
+    - ``tol`` -- positive real (default: ``100``), a modulus is considered
+      too close to 1 if it is at distance at most ``tol*(eps*|M|)^(1/d)``
+      where ``eps`` is the machine epsilon and ``|M|`` the Frobenius norm,
+      which bounds the error on eigenvalues of non diagonalizable matrices
+
+    OUTPUT:
+
+    numpy array of booleans of length k
+
+    EXAMPLES::
+
+        sage: from slabbe.matrix_cocycle import is_pisot_array
+        sage: import numpy
+        sage: M = numpy.array([[[1,1,1],[0,1,0],[0,0,1]],
+        ....:                  [[1,1,0],[0,0,1],[1,0,0]],
+        ....:                  [[1,2,3],[4,5,6],[7,8,9]]])
+        sage: is_pisot_array(M)
+        array([False,  True, False], dtype=bool)
+    """
+    import numpy
+    from sage.rings.integer_ring import ZZ
+    d = M.shape[1]
+    F = M.astype(numpy.float64)
+    S = numpy.sort(numpy.abs(numpy.linalg.eigvals(F)), axis=1)
+    first = S[:, d-1]
+    second = S[:, d-2]
+    pisot = (first > 1) & (second < 1)
+    norm = numpy.sqrt((F**2).sum(axis=(1,2)))
+    error = tol * (numpy.finfo(numpy.float64).eps * norm) ** (1. / d)
+    borderline = (abs(first - 1) <= error) | (abs(second - 1) <= error)
+    for i in numpy.flatnonzero(borderline):
+        pisot[i] = is_pisot(matrix(ZZ, M[i].tolist()))
+    return pisot
+
 def perron_right_eigenvector(M):
     r"""
     EXAMPLES::
@@ -983,6 +1962,42 @@ def perron_right_eigenvector(M):
         vec_sage = vector(CC, rightv)
     return eig_sage, vec_sage/sum(vec_sage)
 
+def perron_right_eigenvector_array(M):
+    r"""
+    Return the dominant eigenvalues and the associated right eigenvectors
+    of the matrices of a numpy array.
+
+    INPUT:
+
+    - ``M`` -- numpy array of shape ``(k, d, d)``
+
+    OUTPUT:
+
+    tuple (eigenvalues, eigenvectors) of complex numpy arrays of shape
+    ``(k,)`` and ``(k, d)``, the eigenvectors being normalized so that
+    their entries sum to 1
+
+    EXAMPLES::
+
+        sage: from slabbe.matrix_cocycle import perron_right_eigenvector_array
+        sage: import numpy
+        sage: M = numpy.array([[[-11,14],[-26,29]], [[2,1],[1,1]]])
+        sage: eig, vec = perron_right_eigenvector_array(M)
+        sage: eig.real                         # tolerance 0.00001
+        array([ 15.        ,   2.61803399])
+        sage: vec.real                         # tolerance 0.00001
+        array([[ 0.35      ,  0.65      ],
+               [ 0.61803399,  0.38196601]])
+    """
+    import numpy
+    eig, vec = numpy.linalg.eig(M.astype(numpy.float64))
+    index = abs(eig).argmax(axis=1)
+    rows = numpy.arange(M.shape[0])
+    eig = eig[rows, index]
+    vec = vec[rows, :, index]
+    vec = vec / vec.sum(axis=1)[:, numpy.newaxis]
+    return eig, vec
+
 def semi_norm_v(M, v,  p=2, verbose=False):
     r"""
     Return the semi norm on the hyperplane orthogonal to v.
@@ -1014,11 +2029,23 @@ def semi_norm_v(M, v,  p=2, verbose=False):
         print rep, rep.norm(), rep*v
     return -func(rep)
 
-def semi_norm_cone(M, cone,  p=2, verbose=False):
+def semi_norm_cone(M, cone,  p=2, verbose=False, x0=None, argmax=False):
     r"""
     Return the semi norm on the hyperplane orthogonal to v where v lives in
     the cone.
 
+    INPUT:
+
+    - ``M`` -- matrix
+    - ``cone`` -- matrix, the cone is defined by its columns
+    - ``p`` -- the norm (default: ``2``)
+    - ``verbose`` -- boolean (default: ``False``)
+    - ``x0`` -- vector or None (default: ``None``), the starting point of
+      the optimisation, the middle of the cone is used if None or if
+      ``x0`` is not inside the cone
+    - ``argmax`` -- boolean (default: ``False``), whether to return also
+      the vector v where the optimum is reached
+
     EXAMPLES:
 
     For Arnoux-Rauzy, only the 1-norm works::
@@ -1069,6 +2096,12 @@ def semi_norm_cone(M, cone,  p=2, verbose=False):
         0.9999935206958908
         sage: semi_norm_cone(M.transpose(), cone, p=2)   # tolerance 0.00001
         0.7529377601317161
+
+    Starting from a given point and returning the optimum::
+
+        sage: value, v = semi_norm_cone(M.transpose(), cone, p=2, argmax=True)
+        sage: semi_norm_cone(M.transpose(), cone, p=2, x0=v)   # tolerance 0.00001
+        0.7529377601317161
     """
     from sage.modules.free_module_element import vector
     from sage.numerical.optimize import minimize_constrained
@@ -1093,7 +2126,8 @@ def semi_norm_cone(M, cone,  p=2, verbose=False):
     if not all(con(middle) > 0 for con in cons):
         raise ValueError("the middle should be in the cone")
     func = lambda v : - semi_norm_v(M,vector(v),p)
-    x0 = middle
+    if x0 is None or not all(con(vector(x0)) > 0 for con in cons):
+        x0 = middle
     rep = minimize_constrained(func, cons, x0)
     if not all((con(rep) >= 0 or abs(con(rep)) < 1e-7) for con in cons):
         raise ValueError("the answer (={}) should be in the cone".format(rep))
@@ -1101,6 +2135,8 @@ def semi_norm_cone(M, cone,  p=2, verbose=False):
         raise ValueError("the answer (={}) should be positive".format(rep))
     if verbose:
         print "optimal found at ", rep / rep.norm(p)
+    if argmax:
+        return -func(rep), rep
     return -func(rep)
 
 ####################
@@ -125,6 +125,7 @@ PGF_COLORS = ["red", "green", "blue", "cyan", "brown", "gray", "orange", "pink",
 "lime", "olive", "magenta", "purple", "teal", "violet"]
 
 cdef class MCFAlgorithm(object):
+    cdef object _cocycle
     ########################################
     # METHODS IMPLEMENTED IN HERITED CLASSES
     ########################################
@@ -431,6 +432,10 @@ cdef class MCFAlgorithm(object):
     ######################
     def matrix_cocycle(self):
         r"""
+        Return the matrix cocycle of self.
+
+        It is computed once and kept by self.
+
         EXAMPLES::
 
             sage: from slabbe.mult_cont_frac import ARP
@@ -453,15 +458,23 @@ cdef class MCFAlgorithm(object):
             Cocycle with 6 gens over Regular language over 
             [123, 132, 213, 231, 312, 321]
             defined by: Automaton with 6 states
+
+        TESTS::
+
+            sage: B = Brun()
+            sage: B.matrix_cocycle() is B.matrix_cocycle()
+            True
         """
-        from matrix_cocycle import cocycles
-        try:
-            f = getattr(cocycles, self.class_name())
-        except AttributeError:
-            msg = "Matrix cocyle not implemented for {}"
-            msg = msg.format(self.class_name())
-            raise NotImplementedError(msg)
-        return f()
+        if self._cocycle is None:
+            from matrix_cocycle import cocycles
+            try:
+                f = getattr(cocycles, self.class_name())
+            except AttributeError:
+                msg = "Matrix cocyle not implemented for {}"
+                msg = msg.format(self.class_name())
+                raise NotImplementedError(msg)
+            self._cocycle = f()
+        return self._cocycle
 
     def coding_iterator(self, start):
         r"""
@@ -501,7 +514,7 @@ cdef class MCFAlgorithm(object):
             s = P.x + P.y + P.z
             P.x /= s; P.y /= s; P.z /= s
 
-    def n_matrix(self, start, n_iterations):
+    def n_matrix(self, start, n_iterations, cocycle=None):
         r"""
         Return the n-matrix associated to the direction v.
 
@@ -509,6 +522,10 @@ cdef class MCFAlgorithm(object):
 
         - ``start`` -- iterable of three real numbers
         - ``n_iterations`` - integer, number of iterations
+        - ``cocycle`` - matrix cocycle or None (default: ``None``), if
+          None, the cocycle kept by self and given by
+          :meth:`matrix_cocycle` is used and its ``word_to_matrix`` cache
+          is enabled, so that repeated calls share the products
 
         OUTPUT:
 
@@ -521,10 +538,33 @@ cdef class MCFAlgorithm(object):
             [ 31  40   7]
             [ 84 109  19]
             [ 97 126  22]
+
+        The products are reused by the next calls::
+
+            sage: A = ARP()
+            sage: _ = A.n_matrix((1,e,pi), 10)
+            sage: _ = A.n_matrix((1,e,pi), 10)
+            sage: A.matrix_cocycle().word_to_matrix_cache_info().hits
+            1
+
+        Another cocycle may be given::
+
+            sage: C = ARP().matrix_cocycle()
+            sage: C.enable_word_to_matrix_cache()
+            sage: ARP().n_matrix((1,e,pi), 10, cocycle=C)
+            [ 31  40   7]
+            [ 84 109  19]
+            [ 97 126  22]
+            sage: _ = ARP().n_matrix((1,e,pi), 10, cocycle=C)
+            sage: C.word_to_matrix_cache_info().hits
+            1
         """
         it = self.coding_iterator(start)
         L = [next(it) for _ in range(n_iterations)]
-        cocycle = self.matrix_cocycle()
+        if cocycle is None:
+            cocycle = self.matrix_cocycle()
+            if cocycle.word_to_matrix_cache_info() is None:
+                cocycle.enable_word_to_matrix_cache()
         return cocycle.word_to_matrix(L)
 
     def simplex_orbit_iterator(self, start=None, norm_xyz='sup', norm_uvw='1'):
@@ -29,6 +29,7 @@ from sage.combinat.integer_lists.invlex import IntegerListsLex
 from sage.combinat.words.morphism import WordMorphism
 from sage.combinat.words.words import FiniteWords
 import itertools
+import operator
 
 def iter_palindromes(words, length):
     r"""
@@ -174,15 +175,41 @@ def is_left_marked(m):
         sage: is_left_marked(m)
         False
     """
-    images = m.images()
+    return can_be_left_marked(m.images())
+
+def can_be_left_marked(images):
+    r"""
+    Return whether a morphism whose images contain the given images can
+    be left marked.
+
+    When the images are all the images of a morphism, this is whether it
+    is left marked. Otherwise, if it returns ``False``, no morphism
+    having these images among its images is left marked.
+
+    INPUT:
+
+    - ``images`` -- list of nonempty words or tuples
+
+    EXAMPLES::
+
+        sage: from slabbe.word_morphisms import can_be_left_marked
+        sage: can_be_left_marked([Word('00001')])
+        True
+        sage: can_be_left_marked([Word('00001'), Word('00001')])
+        False
+        sage: can_be_left_marked([Word('00001'), Word('10001')])
+        True
+        sage: can_be_left_marked([Word('000001'), Word('010001'), Word('0101')])
+        False
+    """
     N = len(images)
+    if N < 2:
+        return True
     L = map(len, images)
     for i in range(2*max(L)):
         s = len(set(image[i % L[a]] for (a,image) in enumerate(images)))
-        if s == N:
-            return True
-        elif s > 1:
-            return False
+        if s > 1:
+            return s == N
     # is cyclic
     return False
 
@@ -197,8 +224,220 @@ def is_marked(m):
     """
     return is_left_marked(m) and is_left_marked(m.reversal())
 
-def iter_primitive_marked_classP_morphisms(words, n):
+def is_primitive_incidence_rows(rows):
+    r"""
+    Return whether the incidence matrix given by its rows as bitmasks is
+    primitive.
+
+    The bit `j` of ``rows[i]`` is set if the letter `j` occurs in the
+    image of the letter `i`.
+
+    INPUT:
+
+    - ``rows`` -- list of integers
+
+    EXAMPLES::
+
+        sage: from slabbe.word_morphisms import is_primitive_incidence_rows
+        sage: is_primitive_incidence_rows([3, 1])
+        True
+        sage: is_primitive_incidence_rows([2, 1])
+        False
+        sage: is_primitive_incidence_rows([3, 2])
+        False
+    """
+    N = len(rows)
+    full = (1 << N) - 1
+    # the rows of M^k, primitive iff M^k is positive where
+    # k=(N-1)^2+1 is the bound of Wielandt
+    R = [1 << i for i in range(N)]
+    for _ in range((N-1)**2+1):
+        R = [reduce(operator.or_, (rows[b] for b in range(N) if r >> b & 1), 0)
+             for r in R]
+    return all(r == full for r in R)
+
+def can_be_strongly_connected(rows, N):
     r"""
+    Return whether the incidence graph of a morphism on `N` letters whose
+    first images have the given rows can be strongly connected.
+
+    It returns ``False`` if the letters reachable from one of the first
+    letters only go through the first letters without reaching every
+    letter.
+
+    INPUT:
+
+    - ``rows`` -- list of integers, the rows as bitmasks of the first
+      letters
+    - ``N`` -- integer, number of letters
+
+    EXAMPLES::
+
+        sage: from slabbe.word_morphisms import can_be_strongly_connected
+        sage: can_be_strongly_connected([1], 2)
+        False
+        sage: can_be_strongly_connected([3], 2)
+        True
+        sage: can_be_strongly_connected([2, 1], 3)
+        False
+    """
+    j = len(rows)
+    full = (1 << N) - 1
+    for i in range(j):
+        seen = 1 << i
+        todo = [i]
+        while todo:
+            a = todo.pop()
+            if a >= j:
+                break
+            new = rows[a] & ~seen
+            seen |= new
+            todo.extend(b for b in range(N) if new >> b & 1)
+        else:
+            if seen != full:
+                return False
+    return True
+
+def classP_forest(words, n, up_to_permutation=False):
+    r"""
+    Return the forest of the primitive marked classP morphisms.
+
+    The nodes are partial morphisms ``(sizes, images, letters)`` whose
+    images are chosen letter after letter. A partial morphism is pruned
+    as soon as it can not be marked or its incidence graph can not be
+    strongly connected. For images of the form a common letter followed
+    by a palindrome, ``letters`` is the tuple of the common letters still
+    possible, otherwise it is ``None``.
+
+    Up to permutation, a morphism is kept if its images, written as
+    tuples of indices, are lexicographically minimal among its
+    conjugates. A partial morphism with images chosen for the first `j`
+    letters is pruned as soon as a permutation stabilizing these `j`
+    letters already gives smaller images for them.
+
+    INPUT:
+
+    - ``words`` -- finite words
+    - ``n`` -- integer, sum of the lengths of the images
+    - ``up_to_permutation`` -- boolean (default: ``False``), whether to
+      keep only one morphism in each class of conjugacy by a permutation
+      of the alphabet
+
+    OUTPUT:
+
+        RecursivelyEnumeratedSet whose elements are the morphisms
+
+    EXAMPLES::
+
+        sage: from slabbe.word_morphisms import classP_forest
+        sage: F = FiniteWords('ab')
+        sage: R = classP_forest(F, 3)
+        sage: list(R)
+        [WordMorphism: a->ab, b->a, WordMorphism: a->b, b->ba]
+
+    The enumeration can be done in parallel::
+
+        sage: R = classP_forest(F, 8)
+        sage: R.map_reduce(lambda m:1)
+        178
+        sage: R = classP_forest(FiniteWords('abc'), 8)
+        sage: R.map_reduce(lambda m:1)
+        528
+        sage: R = classP_forest(FiniteWords('abc'), 8, up_to_permutation=True)
+        sage: R.map_reduce(lambda m:1)
+        88
+    """
+    alphabet = list(words.alphabet())
+    N = len(alphabet)
+    index = {a:i for (i,a) in enumerate(alphabet)}
+    palindromes = [[tuple(p) for p in iter_palindromes(words, size)]
+                   for size in range(n+1)]
+
+    def rows(images):
+        return [reduce(operator.or_, (1 << index[a] for a in image), 0)
+                for image in images]
+
+    def is_canonical(images):
+        j = len(images)
+        key = tuple(tuple(index[a] for a in image) for image in images)
+        for head in itertools.permutations(range(j)):
+            inverse = [None] * j
+            for (i,k) in enumerate(head):
+                inverse[k] = i
+            for tail in itertools.permutations(range(j, N)):
+                perm = head + tail
+                conjugate = tuple(tuple(perm[k] for k in key[inverse[i]])
+                                  for i in range(j))
+                if conjugate < key:
+                    return False
+        return True
+
+    def is_viable(images):
+        return (can_be_left_marked(images)
+                and can_be_left_marked([image[::-1] for image in images])
+                and can_be_strongly_connected(rows(images), N)
+                and (not up_to_permutation or is_canonical(images)))
+
+    def children(node):
+        sizes, images, letters = node
+        j = len(images)
+        if j == N:
+            return []
+        L = []
+        for p in palindromes[sizes[j]]:
+            new = images + (p,)
+            if letters is None:
+                if is_viable(new):
+                    L.append((sizes, new, None))
+                continue
+            viable = [b for b in letters
+                      if is_viable([(b,)+q for q in new])]
+            if j + 1 < N:
+                if viable:
+                    L.append((sizes, new, tuple(viable)))
+                continue
+            for b in viable:
+                images_b = tuple((b,)+q for q in new)
+                if all(w == w[::-1] for w in images_b):
+                    # already enumerated with palindromic images
+                    continue
+                L.append((sizes, images_b, None))
+        return L
+
+    def post_process(node):
+        sizes, images, letters = node
+        if len(images) < N or letters is not None:
+            return None
+        if not is_primitive_incidence_rows(rows(images)):
+            return None
+        d = {a:words(image) for (a,image) in itertools.izip(alphabet, images)}
+        return WordMorphism(d, codomain=words)
+
+    # images are palindromes
+    roots = [(tuple(sizes), (), None)
+             for sizes in IntegerListsLex(n=n, length=N, min_part=1)]
+    # images are one common letter + palindrome
+    roots.extend((tuple(sizes), (), tuple(alphabet))
+             for sizes in IntegerListsLex(n=n-N, length=N, min_part=0))
+    from sage.sets.recursively_enumerated_set import RecursivelyEnumeratedSet
+    return RecursivelyEnumeratedSet(roots, children, structure='forest',
+            post_process=post_process)
+
+def iter_primitive_marked_classP_morphisms(words, n, up_to_permutation=False):
+    r"""
+    Return an iterator over the primitive marked classP morphisms.
+
+    Partial morphisms which can not be marked or primitive are pruned
+    during the generation, see :func:`classP_forest`.
+
+    INPUT:
+
+    - ``words`` -- finite words
+    - ``n`` -- integer, sum of the lengths of the images
+    - ``up_to_permutation`` -- boolean (default: ``False``), whether to
+      keep only one morphism in each class of conjugacy by a permutation
+      of the alphabet
+
     EXAMPLES::
 
         sage: from slabbe.word_morphisms import iter_primitive_marked_classP_morphisms
@@ -219,15 +458,111 @@ def iter_primitive_marked_classP_morphisms(words, n):
          WordMorphism: a->ab, b->aa,
          WordMorphism: a->bb, b->ba,
          WordMorphism: a->b, b->baa]
+
+    Up to a permutation of the alphabet::
+
+        sage: it = iter_primitive_marked_classP_morphisms(F, 4, up_to_permutation=True)
+        sage: list(it)
+        [WordMorphism: a->aba, b->a,
+         WordMorphism: a->b, b->aba,
+         WordMorphism: a->abb, b->a,
+         WordMorphism: a->ab, b->aa]
+
+    TESTS:
+
+    The pruned generation gives the same morphisms as the filtering of
+    all conjugate classP morphisms::
+
+        sage: from slabbe.word_morphisms import iter_conjugate_classP, is_marked
+        sage: F = FiniteWords('abc')
+        sage: L = [m for m in iter_conjugate_classP(F, 6)
+        ....:      if m.is_primitive() and is_marked(m)]
+        sage: L == list(iter_primitive_marked_classP_morphisms(F, 6))
+        True
     """
-    for m in iter_conjugate_classP(words, n):
-        if m.is_primitive() and is_marked(m):
-            yield m
+    return iter(classP_forest(words, n, up_to_permutation=up_to_permutation))
+
+def images_trie(self):
+    r"""
+    Return the trie of the images of the letters under self.
+
+    Each node is a pair ``(children, keys)`` where ``children`` is a dict
+    mapping a letter to a node and ``keys`` is the list of letters whose
+    image is the word read from the root to the node.
+
+    INPUT:
+
+    - ``self`` -- word morphism
+
+    EXAMPLES::
+
+        sage: from slabbe.word_morphisms import images_trie
+        sage: s = WordMorphism({0:[0,1],1:[1,0],2:[1]})
+        sage: children, keys = images_trie(s)
+        sage: sorted(children)
+        [0, 1]
+        sage: children[1]
+        ({0: ({}, [1])}, [2])
+    """
+    root = ({}, [])
+    for k,v in self._morph.iteritems():
+        node = root
+        for b in v:
+            node = node[0].setdefault(b, ({}, []))
+        node[1].append(k)
+    return root
+
+def prefix_images(trie, w, i):
+    r"""
+    Return the list of pairs ``(k, length)`` such that the image of ``k``
+    is the prefix of length ``length`` of ``w[i:]``.
+
+    The trie is followed from position ``i`` of ``w`` so that the
+    time is linear in the length of the longest image.
+
+    INPUT:
+
+    - ``trie`` -- trie of images, see :func:`images_trie`
+    - ``w`` -- tuple or list of letters
+    - ``i`` -- integer, position in ``w``
+
+    EXAMPLES::
+
+        sage: from slabbe.word_morphisms import images_trie, prefix_images
+        sage: s = WordMorphism({0:[0,1],1:[1,0],2:[1]})
+        sage: T = images_trie(s)
+        sage: w = (0,1,1,0,1)
+        sage: prefix_images(T, w, 0)
+        [(0, 2)]
+        sage: prefix_images(T, w, 2)
+        [(2, 1), (1, 2)]
+        sage: prefix_images(T, w, 4)
+        [(2, 1)]
+        sage: prefix_images(T, w, 5)
+        []
+    """
+    rep = []
+    node = trie
+    j = i
+    len_w = len(w)
+    while True:
+        for k in node[1]:
+            rep.append((k, j-i))
+        if j == len_w:
+            break
+        node = node[0].get(w[j])
+        if node is None:
+            break
+        j += 1
+    return rep
 
 def desubstitute_prefix_code(self, u):
     r"""
     Return the preimage of u under self.
 
+    The images of the letters are read along a trie of the images, see
+    :func:`images_trie`, so that the time is linear in the length of u.
+
     INPUT:
 
     - ``self`` -- word morphism, a prefix code
@@ -261,29 +596,52 @@ def desubstitute_prefix_code(self, u):
         Traceback (most recent call last):
         ...
         ValueError: desubstitution is impossible for u[4:]
+
+    A long word::
+
+        sage: s = WordMorphism({0:[0,1],1:[1,0]})
+        sage: x = s.fixed_point(0)
+        sage: desubstitute_prefix_code(s, x[:2^16]) == x[:2^15]
+        True
     """
     morph = self._morph
+    order = dict((k,t) for (t,k) in enumerate(morph))
+    trie = images_trie(self)
+    w = tuple(u)
     i = 0
-    len_u = len(u)
+    len_u = len(w)
     result = []
     while i < len_u:
-        ui = u[i:]
-        keys = [(k,v) for k,v in morph.iteritems() if v.is_prefix(ui)]
+        keys = prefix_images(trie, w, i)
         if len(keys) > 1:
-            s = ", ".join(["m({})={}".format(k,v) for (k,v) in keys])
+            keys.sort(key=lambda t:order[t[0]])
+            s = ", ".join(["m({})={}".format(k,morph[k]) for (k,_) in keys])
             msg = ("non unique desubstitution, "
                    "{} are prefixes of u[{}:] ".format(s,i))
             raise ValueError(msg)
         if len(keys) == 0:
             raise ValueError("desubstitution is impossible for u[{}:]".format(i))
-        k,v = keys[0]
+        k,length = keys[0]
         result.append(k)
-        i += len(v)
+        i += length
     W = self.domain()
     return W(result)
 
 def desubstitute(self, u):
     r"""
+    Return the list of preimages of u under self.
+
+    The positions of u from which the end of u can be desubstituted are
+    computed first from right to left, reading the images along a trie,
+    see :func:`images_trie`. The enumeration then only visits the
+    branches leading to a preimage and goes along the positions with a
+    unique possible image without creating new nodes.
+
+    INPUT:
+
+    - ``self`` -- word morphism
+    - ``u`` -- word
+
     EXAMPLES:
 
     Unique preimage::
@@ -313,16 +671,52 @@ def desubstitute(self, u):
         sage: L = desubstitute(s, w)
         sage: len(L)
         1024
+
+    Images of different lengths::
+
+        sage: s = WordMorphism({0:[0],1:[0,0]})
+        sage: L = desubstitute(s, Word([0,0,0,0,0]))
+        sage: len(L)
+        8
+        sage: desubstitute(s, Word([0,0,1]))
+        []
+
+    A long word::
+
+        sage: s = WordMorphism({0:[0,1],1:[1,0]})
+        sage: x = s.fixed_point(0)
+        sage: desubstitute(s, x[:2^16]) == [x[:2^15]]
+        True
     """
     morph = self._morph
-    len_u = len(u)
+    order = dict((k,t) for (t,k) in enumerate(morph))
+    trie = images_trie(self)
+    w = tuple(u)
+    len_u = len(w)
+    # viable[i] is the list of pairs (k, length) such that m(k) is a prefix
+    # of u[i:] and u[i+length:] can be desubstituted
+    viable = [None] * (len_u + 1)
+    viable[len_u] = []
+    for i in range(len_u-1, -1, -1):
+        keys = [(k,length) for (k,length) in prefix_images(trie, w, i)
+                if length > 0 and viable[i+length]
+                   or i+length == len_u]
+        keys.sort(key=lambda t:order[t[0]])
+        viable[i] = keys
     def successor(node):
         L,i = node
-        if i == len_u:
-            return []
-        else:
-            ui = u[i:]
-            return [(L+[k],i+len(v)) for k,v in morph.iteritems() if v.is_prefix(ui)]
+        rep = []
+        for k,length in viable[i]:
+            path = L + [k]
+            j = i + length
+            while len(viable[j]) == 1:
+                k2,length2 = viable[j][0]
+                path.append(k2)
+                j += length2
+            rep.append((path, j))
+        return rep
+    if len_u > 0 and not viable[0]:
+        return []
     roots = [([],0)]
     post_process = lambda node:node if node[1]==len_u else None
     from sage.sets.recursively_enumerated_set import RecursivelyEnumeratedSet
@@ -334,7 +728,46 @@ def desubstitute(self, u):
     reduce_init = []
     return R.map_reduce(map_function, reduce_function, reduce_init)
 
-def return_substitution(self, u, coding=False, length=1000):
+def is_closed_return_words(self, u, return_words):
+    r"""
+    Return whether the image under self of each given return word to u
+    is a concatenation of given return words.
+
+    If u is a prefix of self(u) and of the fixed point `x` of self, every
+    return word to u in `x` appears in the decomposition of the image of
+    the first one under a power of self. Therefore, a set of return words
+    to u in `x` containing the first one is complete if and only if it is
+    closed in the above sense.
+
+    INPUT:
+
+    - ``self`` -- word morphism
+    - ``u`` -- nonempty word
+    - ``return_words`` -- iterable of words, return words to u
+
+    EXAMPLES::
+
+        sage: from slabbe.word_morphisms import is_closed_return_words
+        sage: s = WordMorphism({0:[0,1],1:[1,0]})
+        sage: is_closed_return_words(s, Word([0]), [Word([0,1,1]), Word([0,1]), Word([0])])
+        True
+        sage: is_closed_return_words(s, Word([0]), [Word([0,1,1]), Word([0,1])])
+        False
+    """
+    from slabbe.infinite_word import occurrences_iterator
+    u = tuple(u)
+    R = set(tuple(r) for r in return_words)
+    for r in R:
+        w = tuple(self(r)) + u
+        P = list(occurrences_iterator(w, u))
+        if P[0] != 0:
+            return False
+        for p,q in zip(P, P[1:]):
+            if w[p:q] not in R:
+                return False
+    return True
+
+def return_substitution(self, u, coding=False, length=None):
     r"""
     Return the return substitution of self according to factor u.
 
@@ -344,8 +777,10 @@ def return_substitution(self, u, coding=False, length=1000):
     - ``u`` -- word such that u is a prefix of self(u)
     - ``coding`` -- boolean (default: ``False``), whether to
       include the return word coding morphism
-    - ``length`` -- integer (default: ``1000``), compute the first 1000 letters
-      of the derived sequence to make sure every return word are seen
+    - ``length`` -- integer or ``None`` (default: ``None``), if ``None``,
+      the derived sequence is computed until the set of return words seen
+      is closed under self (see :func:`is_closed_return_words`), otherwise
+      its first ``length`` letters are computed
 
     EXAMPLES::
 
@@ -385,13 +820,29 @@ def return_substitution(self, u, coding=False, length=1000):
         True
         sage: theta_u*sigma_u
         WordMorphism: 0->011010, 1->0110, 2->01
+
+    Giving a length computes a fixed prefix of the derived sequence::
+
+        sage: return_substitution(s, Word([0,1]), length=1000)
+        WordMorphism: 0->01, 1->23, 2->013, 3->2
     """
     from slabbe.infinite_word import derived_sequence
     a = u[0]
     x = self.fixed_point(a)
     s, D = derived_sequence(x, u, coding=True)
-    _ = s[length] # make sure that D is complete (exact value 
-                  # is known by J. Leroy and F. Durand)
+    if length is None:
+        # D is complete as soon as it is closed under self
+        it = iter(s)
+        next(it)
+        checked = 0
+        while True:
+            if len(D) > checked:
+                checked = len(D)
+                if is_closed_return_words(self, u, D):
+                    break
+            next(it)
+    else:
+        _ = s[length]
     code_to_return_word = WordMorphism({v:k for k,v in D.iteritems()})
     rep = {}
     for key,value in D.iteritems():